@@ -0,0 +1,135 @@
+"""
+Compact activity calendar stored as a per-year bitset
+
+Layout of the stored bytes: 2 bytes with the first stored year (big-endian)
+followed by YEAR_BYTES bytes per consecutive year. Within a year block bit n
+(little-endian order) is set if the user was active on day n of that year
+(0 = January 1st).
+"""
+from datetime import date, timedelta
+
+YEAR_BYTES = 46  # 366 days rounded up to full bytes
+HEADER_BYTES = 2
+
+
+class ActivityCalendar:
+    """Set of active days with O(1) membership and popcount range queries"""
+
+    def __init__(self, data=b''):
+        data = bytes(data or b'')
+        if data:
+            self.first_year = int.from_bytes(data[:HEADER_BYTES], 'big')
+            self._bits = bytearray(data[HEADER_BYTES:])
+        else:
+            self.first_year = None
+            self._bits = bytearray()
+
+    @classmethod
+    def from_days(cls, days):
+        calendar = cls()
+        for day in days:
+            calendar.add(day)
+        return calendar
+
+    def to_bytes(self):
+        if self.first_year is None:
+            return b''
+        return self.first_year.to_bytes(HEADER_BYTES, 'big') + bytes(self._bits)
+
+    @property
+    def years(self):
+        return len(self._bits) // YEAR_BYTES
+
+    def _position(self, day):
+        """(byte index, bit mask) of given day, None if its year isn't stored"""
+        if self.first_year is None or not 0 <= day.year - self.first_year < self.years:
+            return None
+        offset = day.timetuple().tm_yday - 1
+        return (day.year - self.first_year) * YEAR_BYTES + offset // 8, 1 << (offset % 8)
+
+    def _year_bits(self, year):
+        """Bits of a whole year as an integer, bit n = day n of the year"""
+        if self.first_year is None or not 0 <= year - self.first_year < self.years:
+            return 0
+        start = (year - self.first_year) * YEAR_BYTES
+        return int.from_bytes(self._bits[start:start + YEAR_BYTES], 'little')
+
+    def add(self, day):
+        if self.first_year is None:
+            self.first_year = day.year
+        elif day.year < self.first_year:
+            self._bits[:0] = bytes((self.first_year - day.year) * YEAR_BYTES)
+            self.first_year = day.year
+        missing_years = day.year - self.first_year + 1 - self.years
+        if missing_years > 0:
+            self._bits.extend(bytes(missing_years * YEAR_BYTES))
+
+        index, mask = self._position(day)
+        self._bits[index] |= mask
+
+    def __contains__(self, day):
+        position = self._position(day)
+        if position is None:
+            return False
+        index, mask = position
+        return bool(self._bits[index] & mask)
+
+    def __len__(self):
+        return sum(self._year_bits(self.first_year + i).bit_count() for i in range(self.years))
+
+    def __bool__(self):
+        return any(self._bits)
+
+    def count(self, start, end):
+        """Number of active days between start and end (both inclusive)"""
+        total = 0
+        for year in range(start.year, end.year + 1):
+            first = start.timetuple().tm_yday - 1 if year == start.year else 0
+            last = end.timetuple().tm_yday - 1 if year == end.year else YEAR_BYTES * 8 - 1
+            if last < first:
+                continue
+            total += ((self._year_bits(year) >> first) & ((1 << (last - first + 1)) - 1)).bit_count()
+        return total
+
+    def count_in_year(self, year):
+        return self._year_bits(year).bit_count()
+
+    def count_in_month(self, year, month):
+        first_day = date(year, month, 1)
+        next_month = date(year + month // 12, month % 12 + 1, 1)
+        return self.count(first_day, next_month - timedelta(days=1))
+
+    def last_day(self):
+        """Most recent active day, None if calendar is empty"""
+        for i in range(self.years - 1, -1, -1):
+            year_bits = self._year_bits(self.first_year + i)
+            if year_bits:
+                return date(self.first_year + i, 1, 1) + timedelta(days=year_bits.bit_length() - 1)
+        return None
+
+    def run_ending_at(self, day):
+        """Number of consecutive active days ending on given day (0 if day isn't active)"""
+        run = 0
+        year = day.year
+        offset = day.timetuple().tm_yday - 1
+        while True:
+            bits_up_to_day = self._year_bits(year) & ((1 << (offset + 1)) - 1)
+            # Highest inactive day not after offset ends the run
+            inactive = ~bits_up_to_day & ((1 << (offset + 1)) - 1)
+            if inactive:
+                return run + offset - (inactive.bit_length() - 1)
+
+            # Whole beginning of the year is active, continue from end of previous year
+            run += offset + 1
+            year -= 1
+            offset = date(year, 12, 31).timetuple().tm_yday - 1
+
+    def days(self):
+        """Active days in chronological order"""
+        for i in range(self.years):
+            year_bits = self._year_bits(self.first_year + i)
+            year_start = date(self.first_year + i, 1, 1)
+            while year_bits:
+                lowest = year_bits & -year_bits
+                yield year_start + timedelta(days=lowest.bit_length() - 1)
+                year_bits ^= lowest
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Achievement, UserAchievement
+from .models import User, Achievement, UserAchievement, UserKnowledge
 
 # Register your models here.
 
@@ -19,3 +19,10 @@ class UserAchievementAdmin(admin.ModelAdmin):
     list_display = ['user', 'achievement']
     list_filter = ['achievement']
     search_fields = ['user__username', 'achievement__name']
+
+
+@admin.register(UserKnowledge)
+class UserKnowledgeAdmin(admin.ModelAdmin):
+    list_display = ['user', 'item_type', 'item_id', 'learned_at']
+    list_filter = ['item_type']
+    search_fields = ['user__username']
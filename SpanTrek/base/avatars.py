@@ -0,0 +1,92 @@
+"""
+Avatar thumbnails
+
+Uploaded avatars are never served as uploaded. They are decoded, cropped to a
+square and re-encoded to WebP at AVATAR_SIZES, which drops EXIF and any other
+metadata. Thumbnails are named after a hash of the uploaded bytes
+(avatars/thumbs/<hash>_<size>.webp), so identical uploads share files and
+the URLs never change content. User.avatar_hash points to them, the avatar_url
+template tag picks the size per context.
+"""
+import hashlib
+import io
+import os
+
+from django.conf import settings
+
+# Pixel sizes at 2x of the largest place each size is shown
+AVATAR_SIZES = {
+    'small': 100,   # leaderboard rows
+    'medium': 160,  # settings preview
+    'large': 320,   # profile header and passport photo
+}
+THUMBNAILS_DIR = 'avatars/thumbs'
+WEBP_QUALITY = 82
+
+
+def avatar_hash(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def thumbnail_name(hash_value, size_name):
+    """Path relative to MEDIA_ROOT"""
+    return f'{THUMBNAILS_DIR}/{hash_value}_{AVATAR_SIZES[size_name]}.webp'
+
+
+def thumbnail_url(hash_value, size_name):
+    return f'{settings.MEDIA_URL}{thumbnail_name(hash_value, size_name)}'
+
+
+def thumbnails_exist(hash_value):
+    return all(
+        os.path.exists(os.path.join(settings.MEDIA_ROOT, *thumbnail_name(hash_value, size_name).split('/')))
+        for size_name in AVATAR_SIZES
+    )
+
+
+def create_thumbnails(data):
+    """Write all thumbnails of uploaded image bytes, returns their hash. Raises ValueError for broken images"""
+    # Imported here, only the background worker decodes images
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    hash_value = avatar_hash(data)
+    if thumbnails_exist(hash_value):
+        # Same picture uploaded before
+        return hash_value
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f'Not a valid image: {e}') from e
+
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    for size_name, size in AVATAR_SIZES.items():
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        path = os.path.join(settings.MEDIA_ROOT, *thumbnail_name(hash_value, size_name).split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        thumbnail.save(temp_path, format='WEBP', quality=WEBP_QUALITY)
+        os.replace(temp_path, path)
+
+    return hash_value
+
+
+def process_avatar_upload(user_id, data):
+    """Background task of an avatar upload, points the user to the thumbnails when they are written"""
+    # Imported here to avoid circular import
+    from .models import User
+
+    hash_value = create_thumbnails(data)
+    # Only avatar fields are written, so changes saved by the request meanwhile are kept
+    User.objects.filter(id=user_id).update(avatar_hash=hash_value, avatar=thumbnail_name(hash_value, 'large'))
+    return hash_value
+
+
+def user_avatar_url(user, size_name):
+    """Thumbnail URL of given size, the stored avatar for users without processed uploads"""
+    if user.avatar_hash:
+        return thumbnail_url(user.avatar_hash, size_name)
+    return user.avatar.url if user.avatar else None
@@ -0,0 +1,60 @@
+"""
+Local background worker for work that shouldn't block requests
+
+Tasks run in a small thread pool of the web process, in submission order with
+the default single thread. Nothing is persisted, so a task queued when the
+process stops is lost; tasks must be safe to repeat (e.g. by a management
+command). With the BACKGROUND_TASKS_SYNC setting tasks run immediately in the
+calling thread, which keeps tests deterministic.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """Runs functions outside the request, errors are logged instead of raised"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                max_workers = getattr(settings, 'BACKGROUND_WORKERS', 1)
+                self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='background')
+            return self._executor
+
+    def submit(self, function, *args, **kwargs):
+        """Queue function(*args, **kwargs), returns a Future of its result"""
+        if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+            future = Future()
+            future.set_result(self._run(function, args, kwargs))
+            return future
+        return self._get_executor().submit(self._run, function, args, kwargs)
+
+    def _run(self, function, args, kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            logger.exception('Background task %s failed', getattr(function, '__name__', function))
+            return None
+        finally:
+            # Worker threads open their own database connections, closed like at the end of a request
+            if not getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+                close_old_connections()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+background = BackgroundWorker()
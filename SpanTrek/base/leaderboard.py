@@ -0,0 +1,300 @@
+"""
+Leaderboard rank index kept in sync with User.experience
+
+Users with experience are kept in a sorted set ordered by experience (descending)
+and id, so rank and surrounding users are answered in O(log n) instead of
+loading every ranked user. The set lives in the process memory. LocalSortedSet
+mirrors the Redis sorted set operations, so a Redis backed set can be dropped in.
+
+Every experience change is also written to the LeaderboardChange log (see
+base/signals.py). Before answering, an index applies the changes logged since
+the last one it applied, so every web process serves the same ranks. The whole
+set is rebuilt in the background worker every LEADERBOARD_REFRESH_SECONDS,
+which also drops old log rows, the request only ever reads from the database
+when the process has no set yet.
+"""
+from datetime import timedelta
+import random
+from threading import RLock
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from .background import background
+
+# Enough levels for 2**32 members
+MAX_LEVELS = 32
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        # Number of positions each link skips
+        self.width = [1] * levels
+
+
+class IndexableSkipList:
+    """Sorted keys with O(log n) expected insert, remove, position and positional lookup"""
+
+    def __init__(self, rng=None):
+        self._rng = rng or random.Random()
+        self._head = _Node(None, MAX_LEVELS)
+        self._size = 0
+
+    def _random_levels(self):
+        levels = 1
+        while levels < MAX_LEVELS and self._rng.random() < 0.5:
+            levels += 1
+        return levels
+
+    def _chain(self, key):
+        """Last node before key on every level, with the position of each of them"""
+        chain = [None] * MAX_LEVELS
+        positions = [0] * MAX_LEVELS
+        node, position = self._head, 0
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, key):
+        chain, positions = self._chain(key)
+        new_node = _Node(key, self._random_levels())
+        # 1-based position of the new node
+        position = positions[0] + 1
+        for level in range(len(new_node.next)):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            skipped = position - positions[level]
+            new_node.width[level] = previous.width[level] - skipped + 1
+            previous.width[level] = skipped
+        for level in range(len(new_node.next), MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain, _ = self._chain(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            previous = chain[level]
+            previous.width[level] += node.width[level] - 1
+            previous.next[level] = node.next[level]
+        for level in range(len(node.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def bisect_left(self, key):
+        """Number of keys lower than key"""
+        return self._chain(key)[1][0]
+
+    def slice(self, start, stop):
+        """Keys between positions start (inclusive) and stop (exclusive)"""
+        start, stop = max(0, start), min(self._size, stop)
+        if start >= stop:
+            return []
+        node, remaining = self._head, start + 1
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+    def __len__(self):
+        return self._size
+
+
+class LocalSortedSet:
+    """In-memory stand-in for a Redis sorted set, highest score first, ties by member"""
+
+    def __init__(self):
+        self._keys = IndexableSkipList()
+        self._scores = {}
+
+    def add(self, member, score):
+        if member in self._scores:
+            self.remove(member)
+        self._scores[member] = score
+        self._keys.insert((-score, member))
+
+    def remove(self, member):
+        score = self._scores.pop(member, None)
+        if score is None:
+            return
+        self._keys.remove((-score, member))
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    def rank(self, member):
+        """0-based position of member, None if not in the set"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return self._keys.bisect_left((-score, member))
+
+    def count_above(self, score):
+        """Number of members with strictly higher score"""
+        return self._keys.bisect_left((-score,))
+
+    def range(self, start, stop):
+        """Members between positions start (inclusive) and stop (exclusive)"""
+        return [member for _, member in self._keys.slice(start, stop)]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class LeaderboardIndex:
+    """Rank lookups for users with experience > 0"""
+
+    def __init__(self):
+        self._lock = RLock()
+        self._set = None
+        # Id of the last LeaderboardChange applied to the set
+        self._last_change = 0
+        self._loaded_at = 0
+        self._reloading = False
+
+    def _refresh_seconds(self):
+        return getattr(settings, 'LEADERBOARD_REFRESH_SECONDS', 300)
+
+    def _ranking(self):
+        with self._lock:
+            if self._set is None:
+                self._set, self._last_change = self._build()
+                self._loaded_at = time.monotonic()
+            self._apply_changes()
+            if not self._reloading and time.monotonic() - self._loaded_at > self._refresh_seconds():
+                self._reloading = True
+                background.submit(self.reload)
+            return self._set
+
+    def _build(self):
+        """Set of every ranked user and the id of the last change it includes"""
+        # Importing here to avoid circular import
+        from base.models import LeaderboardChange, User
+
+        # Read first, changes logged while users are read are applied again afterwards
+        last_change = LeaderboardChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        ranking = LocalSortedSet()
+        for user_id, experience in User.objects.filter(experience__gt=0).values_list('id', 'experience'):
+            ranking.add(user_id, experience)
+        return ranking, last_change
+
+    def _apply_changes(self):
+        # Importing here to avoid circular import
+        from base.models import LeaderboardChange
+
+        changes = LeaderboardChange.objects.filter(id__gt=self._last_change).order_by('id').values_list(
+            'id', 'user_id', 'experience'
+        )
+        for change_id, user_id, experience in changes:
+            self._apply(user_id, experience)
+            self._last_change = change_id
+
+    def _apply(self, user_id, experience):
+        if experience > 0:
+            self._set.add(user_id, experience)
+        else:
+            self._set.remove(user_id)
+
+    def reload(self):
+        """Rebuild the set from database, runs in the background worker"""
+        # Importing here to avoid circular import
+        from base.models import LeaderboardChange
+
+        try:
+            ranking, last_change = self._build()
+            with self._lock:
+                self._set, self._last_change = ranking, last_change
+                self._loaded_at = time.monotonic()
+                self._apply_changes()
+
+            # Every process rebuilds long before rows this old could be missing from its set
+            retention = timedelta(seconds=max(self._refresh_seconds() * 10, 3600))
+            LeaderboardChange.objects.filter(changed_at__lt=timezone.now() - retention).delete()
+        finally:
+            self._reloading = False
+
+    def reset(self):
+        """Drop the index, next lookup rebuilds it from database"""
+        with self._lock:
+            self._set = None
+
+    def update(self, user_id, experience):
+        """Apply a change made by this process before it is read back from the log"""
+        with self._lock:
+            # Not loaded yet, the first lookup will read current values anyway
+            if self._set is not None:
+                self._apply(user_id, experience)
+
+    def count(self):
+        """Number of users on the leaderboard"""
+        with self._lock:
+            return len(self._ranking())
+
+    def user_rank(self, user):
+        """Rank shared by users with equal experience, None if user isn't ranked"""
+        with self._lock:
+            ranking = self._ranking()
+            score = ranking.score(user.id)
+            if score is None:
+                return None
+            return ranking.count_above(score) + 1
+
+    def top_users(self, limit=10):
+        with self._lock:
+            user_ids = self._ranking().range(0, limit)
+        return self._users_with_ranks(user_ids, start_index=0)
+
+    def surrounding_users(self, user, size=10):
+        """Up to size users around given user, with display_rank set"""
+        with self._lock:
+            ranking = self._ranking()
+            user_index = ranking.rank(user.id)
+            if user_index is None:
+                return []
+
+            total_users = len(ranking)
+            start_index = max(0, user_index - size // 2)
+            end_index = min(total_users, user_index + size // 2)
+
+            # Extend the window to full size when user is near the top or the bottom
+            if end_index - start_index < size:
+                if start_index == 0:
+                    end_index = min(total_users, start_index + size)
+                elif end_index == total_users:
+                    start_index = max(0, end_index - size)
+
+            user_ids = ranking.range(start_index, end_index)
+        return self._users_with_ranks(user_ids, start_index)
+
+    def _users_with_ranks(self, user_ids, start_index):
+        # Importing here to avoid circular import
+        from base.models import User
+
+        users_by_id = User.objects.in_bulk(user_ids)
+        users = []
+        for i, user_id in enumerate(user_ids):
+            user = users_by_id.get(user_id)
+            if user is None:
+                continue
+            user.display_rank = start_index + i + 1
+            users.append(user)
+        return users
+
+
+leaderboard = LeaderboardIndex()
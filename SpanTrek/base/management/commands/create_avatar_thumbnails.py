@@ -0,0 +1,39 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from base.avatars import create_thumbnails, thumbnail_name
+from base.models import User
+
+
+class Command(BaseCommand):
+    help = 'Create avatar thumbnails for users whose avatar was stored before uploads were processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of users updated per query')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(avatar_hash='').exclude(avatar='').only('id', 'avatar'))
+        # Users sharing a file (e.g. the default avatar) are processed once
+        hashes = {}
+        updated_users = []
+
+        for user in users:
+            if user.avatar.name not in hashes:
+                path = os.path.join(settings.MEDIA_ROOT, *user.avatar.name.split('/'))
+                try:
+                    with open(path, 'rb') as f:
+                        hashes[user.avatar.name] = create_thumbnails(f.read())
+                except (OSError, ValueError) as e:
+                    self.stdout.write(self.style.ERROR(f'Error for {user.avatar.name}: {str(e)}'))
+                    hashes[user.avatar.name] = None
+
+            hash_value = hashes[user.avatar.name]
+            if hash_value:
+                user.avatar_hash = hash_value
+                user.avatar = thumbnail_name(hash_value, 'large')
+                updated_users.append(user)
+
+        User.objects.bulk_update(updated_users, ['avatar_hash', 'avatar'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Created thumbnails for {len(updated_users)} users ({len([h for h in hashes.values() if h])} distinct images)'
+        ))
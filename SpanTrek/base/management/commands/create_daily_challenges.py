@@ -1,27 +1,85 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 from django.core.management.base import BaseCommand
 from base.models import User
+from practice.services import DailyChallengeService
 
 class Command(BaseCommand):
     help = 'Create daily challenges for all users'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of users updated per query')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible challenge selection')
+        parser.add_argument('--jobs', type=int, default=1, help='Number of processes generating selections')
+
     def handle(self, *args, **options):
         """Create daily challenges for all users - runs daily at specified time."""
-        users = User.objects.all()
-        
-        if not users.exists():
+        batch_size = options['batch_size']
+        seed = options['seed']
+        jobs = options['jobs']
+
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+
+        if not user_ids:
             self.stdout.write(self.style.WARNING('No users found'))
             return
-        
+
+        catalogue = DailyChallengeService.load_catalogue()
+        if not catalogue:
+            self.stdout.write(self.style.WARNING('No daily challenges found'))
+            return
+
+        batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+        # Every batch has its own seed, so results don't depend on the number of jobs
+        batch_seeds = [f'{seed}:{i}' if seed is not None else None for i in range(len(batches))]
+        batch_sizes = [len(batch) for batch in batches]
+
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                selections = executor.map(
+                    DailyChallengeService.select_challenges_batch,
+                    [catalogue] * len(batches), batch_sizes, batch_seeds,
+                )
+                success_count = self.write_batches(batches, selections)
+        else:
+            selections = map(
+                DailyChallengeService.select_challenges_batch,
+                [catalogue] * len(batches), batch_sizes, batch_seeds,
+            )
+            success_count = self.write_batches(batches, selections)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Created daily challenges for {success_count} users')
+        )
+
+    def write_batches(self, batches, selections):
+        """Write selections of every batch with a single bulk update of challenge fields only"""
+        today = date.today()
+        total_users = sum(len(batch) for batch in batches)
+        processed_count = 0
         success_count = 0
-        for user in users:
+
+        for batch, batch_selections in zip(batches, selections):
+            users = [
+                User(
+                    id=user_id,
+                    daily_challenges=daily_challenges,
+                    daily_challenges_completed=False,
+                    daily_challenges_creation_date=today,
+                )
+                for user_id, daily_challenges in zip(batch, batch_selections)
+            ]
             try:
-                user.create_daily_challenges()
-                success_count += 1
+                User.objects.bulk_update(
+                    users, ['daily_challenges', 'daily_challenges_completed', 'daily_challenges_creation_date']
+                )
+                success_count += len(users)
             except Exception as e:
                 self.stdout.write(
-                    self.style.ERROR(f'Error for user {user.username}: {str(e)}')
+                    self.style.ERROR(f'Error for users {batch[0]}-{batch[-1]}: {str(e)}')
                 )
-        
-        self.stdout.write(
-            self.style.SUCCESS(f'Created daily challenges for {success_count} users')
-        )
\ No newline at end of file
+
+            processed_count += len(batch)
+            self.stdout.write(f'Processed {processed_count}/{total_users} users')
+
+        return success_count
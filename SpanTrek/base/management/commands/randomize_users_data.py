@@ -4,6 +4,7 @@ from lessons.models import Lesson, Country
 import random
 from datetime import date, timedelta
 from base.services import AchievementService
+from base.activity import ActivityCalendar
 from django.db.models import Case, When, Value, IntegerField
 
 class Command(BaseCommand):
@@ -44,21 +45,21 @@ class Command(BaseCommand):
                 user.experience = random.randint(0, 50*500)
                 user.level = user.experience // 500 + 1
                     
-                # Random streak data
-                user.days_streak = random.randint(0, 15)
-                user.highest_streak = random.randint(user.days_streak, 30)
+                # Random highest streak, current streak is derived from activity days below
+                user.highest_streak = random.randint(0, 30)
                 
                 # Random activity days (last 30 days)
-                user.activity_days = []
+                activity = ActivityCalendar()
                 today = date.today()
                 for i in range(30):
                     activity_date = today - timedelta(days=i)
                     # 40% chance of activity each day
                     if random.random() < 0.4:  
-                        user.activity_days.append(activity_date.isoformat())
+                        activity.add(activity_date)
+                user.activity_calendar = activity.to_bytes()
                 
-                if user.activity_days:
-                    user.last_activity_date = max([date.fromisoformat(d) for d in user.activity_days])
+                # Last activity date and current streak run from generated days
+                user.rebuild_streak_state()
                     
                 
                 # Calculate progress for each landmark in order
@@ -78,9 +79,7 @@ class Command(BaseCommand):
                 user.country_lessons_progress = {'poland': poland_progress} if poland_progress > 0 else {}
                 
                 # Knowledge based on completed lessons
-                user.words_learned = []
-                user.sentences_learned = []
-                user.audio_learned = []
+                user.knowledge.all().delete()
                 user.use_of_spanish = 0
                 if adventure_progress > 0:
                     # Get all lessons in specific order: szczecin, poznan, warsaw to properly get knowledge
@@ -95,26 +94,8 @@ class Command(BaseCommand):
                     )
 
                     for lesson in all_lessons_in_order[:poland_progress]:
-                        # Words
-                        lesson_words = set(vocab.word for vocab in lesson.vocabularies.all())
-                        if not isinstance(user.words_learned, list):
-                            user.words_learned = []
-                        new_words = lesson_words - set(user.words_learned)
-                        user.words_learned.extend(new_words)
-                        
-                        # Sentences
-                        lesson_sentences = set(sentence.sentence for sentence in lesson.sentences.all()) 
-                        if not isinstance(user.sentences_learned, list):
-                            user.sentences_learned = []
-                        new_sentences = lesson_sentences - set(user.sentences_learned)
-                        user.sentences_learned.extend(new_sentences)
-
-                        # Audio
-                        lesson_audios = set(audio.text for audio in lesson.audios.all())
-                        if not isinstance(user.audio_learned, list):
-                            user.audio_learned = []
-                        new_audios = lesson_audios - set(user.audio_learned)
-                        user.audio_learned.extend(new_audios)
+                        # Words, sentences and audio
+                        user.learn_lesson_items(lesson)
                         
                         # Use of Spanish
                         user.use_of_spanish += lesson.use_of_spanish
@@ -134,6 +115,7 @@ class Command(BaseCommand):
                 # Check and award achievements
                 AchievementService.clear_achievements(user)
                 AchievementService.check_and_award_achievements(user)
+                user.save()
                 
                 updated_count += 1
                 
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from base.models import User
+
+class Command(BaseCommand):
+    help = 'Rebuilds streak state (current run of active days) of all users from their activity calendar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of users updated per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        streak_fields = ['last_activity_date', 'streak_start_date', 'days_streak', 'highest_streak']
+
+        users = User.objects.only('id', 'activity_calendar', *streak_fields).order_by('id')
+        
+        updated_count = 0
+        batch = []
+        for user in users.iterator(chunk_size=batch_size):
+            user.rebuild_streak_state()
+            batch.append(user)
+
+            if len(batch) >= batch_size:
+                User.objects.bulk_update(batch, streak_fields)
+                updated_count += len(batch)
+                batch = []
+
+        if batch:
+            User.objects.bulk_update(batch, streak_fields)
+            updated_count += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt streaks for {updated_count} users')
+        )
@@ -0,0 +1,16 @@
+from .unit_of_work import user_unit_of_work
+
+
+class UserWriteBehindMiddleware:
+    """Write changed user fields once per request, see base/unit_of_work.py"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with user_unit_of_work() as unit_of_work:
+            response = self.get_response(request)
+            # Exceptions of views arrive as 500 responses, changes of failed requests may be half applied
+            if response.status_code >= 400:
+                unit_of_work.discard()
+            return response
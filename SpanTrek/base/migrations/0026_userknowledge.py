@@ -0,0 +1,150 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_user_knowledge(apps, schema_editor):
+    """Move learned words/sentences/audio texts from User JSON lists to UserKnowledge rows"""
+    User = apps.get_model("base", "User")
+    UserKnowledge = apps.get_model("base", "UserKnowledge")
+    Vocabulary = apps.get_model("lessons", "Vocabulary")
+    Sentence = apps.get_model("lessons", "Sentence")
+    Audio = apps.get_model("lessons", "Audio")
+
+    # Learned items were stored by text, so map texts to ids once
+    vocabulary_ids, sentence_ids, audio_ids = {}, {}, {}
+    for item_id, word in Vocabulary.objects.values_list("id", "word"):
+        vocabulary_ids.setdefault(word, []).append(item_id)
+    for item_id, sentence in Sentence.objects.values_list("id", "sentence"):
+        sentence_ids.setdefault(sentence, []).append(item_id)
+    for item_id, text in Audio.objects.values_list("id", "text"):
+        audio_ids.setdefault(text, []).append(item_id)
+
+    sources = [
+        ("vocabulary", "words_learned", vocabulary_ids),
+        ("sentence", "sentences_learned", sentence_ids),
+        ("audio", "audio_learned", audio_ids),
+    ]
+
+    knowledge = []
+    for user in User.objects.only("id", "words_learned", "sentences_learned", "audio_learned").iterator():
+        for item_type, field_name, ids_by_text in sources:
+            item_ids = set()
+            for text in getattr(user, field_name) or []:
+                item_ids.update(ids_by_text.get(text, []))
+            knowledge.extend(
+                UserKnowledge(user_id=user.id, item_type=item_type, item_id=item_id)
+                for item_id in item_ids
+            )
+
+    UserKnowledge.objects.bulk_create(knowledge, batch_size=1000, ignore_conflicts=True)
+
+
+def restore_learned_lists(apps, schema_editor):
+    """Rebuild User JSON lists of learned texts from UserKnowledge rows, in the order items were learned"""
+    User = apps.get_model("base", "User")
+    UserKnowledge = apps.get_model("base", "UserKnowledge")
+    Vocabulary = apps.get_model("lessons", "Vocabulary")
+    Sentence = apps.get_model("lessons", "Sentence")
+    Audio = apps.get_model("lessons", "Audio")
+
+    texts = {
+        "vocabulary": dict(Vocabulary.objects.values_list("id", "word")),
+        "sentence": dict(Sentence.objects.values_list("id", "sentence")),
+        "audio": dict(Audio.objects.values_list("id", "text")),
+    }
+    field_names = {"vocabulary": "words_learned", "sentence": "sentences_learned", "audio": "audio_learned"}
+
+    learned = {}
+    rows = UserKnowledge.objects.order_by("user_id", "learned_at", "id").values_list("user_id", "item_type", "item_id")
+    for user_id, item_type, item_id in rows.iterator():
+        # Items deleted from the catalogue have no text left to store
+        text = texts[item_type].get(item_id)
+        if text is None:
+            continue
+        # Dicts keep the first occurrence of texts shared by several items
+        user_texts = learned.setdefault(user_id, {field_name: {} for field_name in field_names.values()})
+        user_texts[field_names[item_type]].setdefault(text)
+
+    users = list(User.objects.filter(id__in=learned).only("id"))
+    for user in users:
+        for field_name, values in learned[user.id].items():
+            setattr(user, field_name, list(values))
+    User.objects.bulk_update(users, list(field_names.values()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0025_remove_user_levels"),
+        ("lessons", "0022_lesson_country_order"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserKnowledge",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "item_type",
+                    models.CharField(
+                        choices=[
+                            ("vocabulary", "Vocabulary"),
+                            ("sentence", "Sentence"),
+                            ("audio", "Audio"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("item_id", models.PositiveBigIntegerField()),
+                (
+                    "learned_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="knowledge",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "item_type", "learned_at"],
+                        name="knowledge_user_type_learned",
+                    ),
+                    models.Index(
+                        fields=["item_type", "item_id"], name="knowledge_item"
+                    ),
+                ],
+                "unique_together": {("user", "item_type", "item_id")},
+            },
+        ),
+        migrations.RunPython(backfill_user_knowledge, restore_learned_lists),
+        migrations.RemoveField(
+            model_name="user",
+            name="audio_learned",
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="sentences_learned",
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="words_learned",
+        ),
+    ]
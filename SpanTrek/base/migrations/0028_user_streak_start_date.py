@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0027_user_user_experience_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="streak_start_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
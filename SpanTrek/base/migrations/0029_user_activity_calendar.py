@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:25
+
+from datetime import date
+
+from django.db import migrations, models
+
+YEAR_BYTES = 46
+
+
+def encode_activity_days(activity_days):
+    """ISO date strings -> per-year bitset in the format of base.activity.ActivityCalendar"""
+    days = sorted({date.fromisoformat(day) for day in activity_days})
+    if not days:
+        return b""
+
+    first_year = days[0].year
+    bits = bytearray((days[-1].year - first_year + 1) * YEAR_BYTES)
+    for day in days:
+        offset = day.timetuple().tm_yday - 1
+        bits[(day.year - first_year) * YEAR_BYTES + offset // 8] |= 1 << (offset % 8)
+    return first_year.to_bytes(2, "big") + bytes(bits)
+
+
+def backfill_activity_calendar(apps, schema_editor):
+    User = apps.get_model("base", "User")
+
+    users = []
+    for user in User.objects.only("id", "activity_days").iterator():
+        user.activity_calendar = encode_activity_days(user.activity_days or [])
+        users.append(user)
+
+    User.objects.bulk_update(users, ["activity_calendar"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0028_user_streak_start_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="activity_calendar",
+            field=models.BinaryField(blank=True, default=bytes),
+        ),
+        migrations.RunPython(backfill_activity_calendar, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="user",
+            name="activity_days",
+        ),
+    ]
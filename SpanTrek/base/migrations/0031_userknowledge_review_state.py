@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def due_when_learned(apps, schema_editor):
+    # Items learned before are due in the order they were learned
+    UserKnowledge = apps.get_model("base", "UserKnowledge")
+    UserKnowledge.objects.update(due_at=models.F("learned_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0030_user_avatar_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userknowledge",
+            name="due_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="userknowledge",
+            name="ease",
+            field=models.FloatField(default=2.5),
+        ),
+        migrations.AddField(
+            model_name="userknowledge",
+            name="interval_days",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="userknowledge",
+            name="repetitions",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(due_when_learned, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="userknowledge",
+            index=models.Index(fields=["user", "due_at"], name="knowledge_user_due"),
+        ),
+        migrations.AddIndex(
+            model_name="userknowledge",
+            index=models.Index(fields=["user", "item_type", "due_at"], name="knowledge_user_type_due"),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0031_userknowledge_review_state"),
+        ("lessons", "0026_lesson_answer_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExerciseResult",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("exercise_number", models.IntegerField()),
+                ("correct", models.BooleanField()),
+                ("answered_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "lesson",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="exercise_results",
+                        to="lessons.lesson",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="exercise_results",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["user", "answered_at"], name="exercise_result_user"),
+                    models.Index(fields=["lesson", "exercise_number"], name="exercise_result_exercise"),
+                ],
+            },
+        ),
+    ]
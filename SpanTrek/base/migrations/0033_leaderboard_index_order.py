@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0032_exerciseresult"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="user",
+            name="user_experience_id",
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["-experience", "id"], name="user_experience_id"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0033_leaderboard_index_order"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("user_id", models.IntegerField()),
+                ("experience", models.IntegerField()),
+                ("changed_at", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,34 +1,50 @@
 from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.utils.text import slugify
-from datetime import date
+from datetime import date, timedelta
 from lessons.models import Landmark, Lesson
-from practice.models import DailyChallenge
+from lessons.services import CatalogueService
+from practice.services import ChallengeEvent, DailyChallengeService
 from .services import AchievementService
-import random
+from .activity import ActivityCalendar
+from .unit_of_work import current_unit_of_work, user_unit_of_work
+import copy
+
+
+def snapshot_value(value):
+    """Copy of a field value that doesn't change when the instance's value is mutated in place"""
+    # Some database backends return binary data as memoryview, which can't be copied
+    if isinstance(value, memoryview):
+        return bytes(value)
+    if isinstance(value, FieldFile):
+        return value.name
+    return copy.deepcopy(value)
 
 
 class User(AbstractUser):
     username = models.CharField(max_length=150, unique=True, blank=False, null=False)
     email = models.EmailField(unique=True, blank=False, null=False)
     avatar = models.ImageField(default='avatars/default_avatar.png', upload_to='avatars/', null=True, blank=True)
+    # Hash naming avatar thumbnails, empty until an upload is processed (see base/avatars.py)
+    avatar_hash = models.CharField(max_length=32, blank=True, default='')
     level = models.IntegerField(default=1)
     experience = models.IntegerField(default=0)
     adventure_progress = models.IntegerField(default=0)
     passports_earned = models.JSONField(default=list, blank=True)
     
-    # Knowledge
-    words_learned = models.JSONField(default=list, blank=True)
-    sentences_learned = models.JSONField(default=list, blank=True)
-    audio_learned = models.JSONField(default=list, blank=True)
+    # Knowledge (learned items are stored in UserKnowledge)
     use_of_spanish = models.IntegerField(default=0)
     
     # Activity 
     days_streak = models.IntegerField(default=0)
     highest_streak = models.IntegerField(default=0)
-    activity_days = models.JSONField(default=list, blank=True)
+    # Per-year bitset of active days, see base/activity.py
+    activity_calendar = models.BinaryField(default=bytes, blank=True)
     last_activity_date = models.DateField(null=True, blank=True)
+    # First day of the run of consecutive active days ending on last_activity_date
+    streak_start_date = models.DateField(null=True, blank=True)
 
     # Default numbers of practice questions 
     default_random_practice_count = models.IntegerField(default=20)  
@@ -48,14 +64,128 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Leaderboard ordering (-experience, id) and keyset pagination
+            models.Index(fields=['-experience', 'id'], name='user_experience_id'),
+        ]
+
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshots of loaded values used to detect which fields changed since loading/last write
+        instance._loaded_values = {
+            name: snapshot_value(value)
+            for name, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        instance._saved_values = dict(instance._loaded_values)
+        return instance
+
+    def _changed_since(self, snapshot):
+        return {
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in snapshot and getattr(self, field.attname) != snapshot[field.attname]
+        }
+
+    def get_changed_fields(self):
+        """Names of fields changed since the user was loaded, None if it wasn't loaded from database"""
+        loaded_values = getattr(self, '_loaded_values', None)
+        if loaded_values is None:
+            return None
+
+        changed_fields = self._changed_since(loaded_values)
+        # Knowledge lives in its own table, learn_lesson_items() records e.g. 'vocabulary_learned'
+        return changed_fields | getattr(self, '_changed_knowledge', set())
+
+    def get_dirty_fields(self):
+        """Names of fields changed since the last write, None if it wasn't loaded from database"""
+        saved_values = getattr(self, '_saved_values', None)
+        if saved_values is None:
+            return None
+        return self._changed_since(saved_values)
+
+    def save(self, *args, **kwargs):
+        # Inside a unit of work plain saves of stored users are written once at its end
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None and not args and not kwargs and not self._state.adding:
+            unit_of_work.register(self)
+            return
+
+        super().save(*args, **kwargs)
+
+        if hasattr(self, '_saved_values'):
+            update_fields = kwargs.get('update_fields')
+            for field in self._meta.concrete_fields:
+                if update_fields is None or field.name in update_fields or field.attname in update_fields:
+                    self._saved_values[field.attname] = snapshot_value(getattr(self, field.attname))
+
+    def flush_changes(self):
+        """Write fields changed since the last write"""
+        dirty_fields = self.get_dirty_fields()
+        if dirty_fields is None:
+            super().save()
+        elif dirty_fields:
+            self.save(update_fields=dirty_fields)
+
+    def learned_ids(self, item_type):
+        """Subquery of ids of learned items of given type (see UserKnowledge.ITEM_TYPES)"""
+        return self.knowledge.filter(item_type=item_type).values('item_id')
+
+    def knowledge_counts(self):
+        """Number of learned items per item type, e.g. {'vocabulary': 12, 'sentence': 4, 'audio': 3}"""
+        if getattr(self, '_knowledge_counts', None) is None:
+            counts = {item_type: 0 for item_type, _ in UserKnowledge.ITEM_TYPES}
+            counts.update(
+                self.knowledge.values_list('item_type').annotate(total=models.Count('id')).order_by()
+            )
+            self._knowledge_counts = counts
+        return self._knowledge_counts
+
+    def learn_lesson_items(self, lesson):
+        """Add lesson's vocabularies, sentences and audios to user's knowledge, returns new items count per type"""
+        lesson_items = {
+            UserKnowledge.VOCABULARY: set(lesson.vocabularies.values_list('id', flat=True)),
+            UserKnowledge.SENTENCE: set(lesson.sentences.values_list('id', flat=True)),
+            UserKnowledge.AUDIO: set(lesson.audios.values_list('id', flat=True)),
+        }
+
+        known_items = models.Q(pk__in=[])
+        for item_type, item_ids in lesson_items.items():
+            known_items |= models.Q(item_type=item_type, item_id__in=item_ids)
+        known = set(self.knowledge.filter(known_items).values_list('item_type', 'item_id'))
+
+        new_knowledge = [
+            UserKnowledge(user=self, item_type=item_type, item_id=item_id)
+            for item_type, item_ids in lesson_items.items()
+            for item_id in item_ids
+            if (item_type, item_id) not in known
+        ]
+        UserKnowledge.objects.bulk_create(new_knowledge, ignore_conflicts=True)
+
+        new_counts = {item_type: 0 for item_type in lesson_items}
+        for knowledge in new_knowledge:
+            new_counts[knowledge.item_type] += 1
+
+        changed_knowledge = {f'{item_type}_learned' for item_type, count in new_counts.items() if count}
+        if changed_knowledge:
+            # Importing here to avoid circular import
+            from practice.sampling import SamplingService
+            SamplingService.invalidate(self.id)
+        self._changed_knowledge = getattr(self, '_changed_knowledge', set()) | changed_knowledge
+        self._knowledge_counts = None
+
+        return new_counts
+
+    @user_unit_of_work()
     def update_progress_after_lesson(self, landmark, lesson_number, lesson_completed_before=False):
         if self.is_authenticated:
             if self.last_activity_date != date.today():
                 self.mark_activity_today()
-                self.calculate_streak()
 
             if self.landmark_lessons_progress.get(landmark, -1) >= lesson_number+1:
                 self.experience += 50
@@ -70,33 +200,14 @@ class User(AbstractUser):
             landmark_obj = Landmark.objects.filter(name=landmark).first()
             lesson = Lesson.objects.filter(landmark=landmark_obj, order=lesson_number).first()
 
-            # Add knowledge from lesson to user's learned lists
-            # Words
-            lesson_words = set(vocab.word for vocab in lesson.vocabularies.all())
-            if not isinstance(self.words_learned, list):
-                self.words_learned = []
-            new_words = lesson_words - set(self.words_learned)
-            self.words_learned.extend(new_words)
-
-            # Sentences
-            lesson_sentences = set(sentence.sentence for sentence in lesson.sentences.all()) 
-            if not isinstance(self.sentences_learned, list):
-                self.sentences_learned = []
-            new_sentences = lesson_sentences - set(self.sentences_learned)
-            self.sentences_learned.extend(new_sentences)
-
-            # Audio files
-            lesson_audios = set(audio.text for audio in lesson.audios.all())
-            if not isinstance(self.audio_learned, list):
-                self.audio_learned = []
-            new_audios = lesson_audios - set(self.audio_learned)
-            self.audio_learned.extend(new_audios)
+            # Add knowledge from lesson to user's learned items
+            self.learn_lesson_items(lesson)
             
             # Use of Spanish
             self.use_of_spanish += lesson.use_of_spanish
 
             # Update country progress (increment by 1, but don't exceed total lessons)
-            country_lessons_counter = Lesson.objects.filter(country=lesson.country).count()
+            country_lessons_counter = CatalogueService.get_stats().country(lesson.country.name)['lessons']
 
             current_progress = self.country_lessons_progress.get(lesson.country.name, 0)
             self.country_lessons_progress[lesson.country.name] = min(
@@ -112,11 +223,16 @@ class User(AbstractUser):
             self.progress_daily_challenges(lesson=lesson)
             self.save()
 
+            # Importing here to avoid circular import
+            from practice.deck import DeckCache
+            # Decks include the new items from the next practice on
+            DeckCache.schedule_refill(self.id)
+
+    @user_unit_of_work()
     def update_progress_after_practice(self, practice_type):
         if self.is_authenticated:
             if self.last_activity_date != date.today():
                 self.mark_activity_today()
-                self.calculate_streak()
             
             self.experience += 25
             self.progress_daily_challenges(practice_type=practice_type)
@@ -128,147 +244,97 @@ class User(AbstractUser):
 
     def award_achievement(self, achievement_name):
         """Award and add an achievement to the user"""
-        achievement_obj = Achievement.objects.filter(name=achievement_name).first()
-        if achievement_obj:
-            # Check if user already has this achievement to prevent duplicates
-            if self.earned_achievements.filter(achievement=achievement_obj).exists():
-                return False  # Achievement already earned
-                
-            self.experience += achievement_obj.experience_award
-            new_user_achievement = UserAchievement.objects.create(
-                user=self,
-                achievement=achievement_obj
-            )
-            self.check_if_new_level()
-            self.save()
-            return True
-        else:
+        # Check if user already has this achievement to prevent duplicates
+        if self.has_achievement(achievement_name):
+            return False
+
+        if not AchievementService.award_achievements(self, [achievement_name]):
             return False
+
+        self.save()
+        return True
         
+    @property
+    def activity(self):
+        """Active days as ActivityCalendar, assign activity_calendar back after changes"""
+        return ActivityCalendar(self.activity_calendar)
+
     def mark_activity_today(self):
         """Mark today as an active day and update streak"""
         today = date.today()
-        today_str = today.isoformat()
         
-        # Don't add duplicate entries for the same day
-        if today_str not in self.activity_days:
-            self.activity_days.append(today_str)
-            self.last_activity_date = today
-            self.calculate_streak()
-            self.save()
+        # Days are recorded in order, so today is already recorded if it's the last active day
+        if self.last_activity_date == today:
+            return
 
-    def calculate_streak(self):
-        """Calculate current streak based on activity_days"""
-        if not self.activity_days:
-            self.days_streak = 0
+        calendar = self.activity
+
+        # Users active before streak state was tracked
+        if self.streak_start_date is None and calendar:
+            self.rebuild_streak_state()
+
+        calendar.add(today)
+        self.activity_calendar = calendar.to_bytes()
+        self.record_streak_activity(today)
+        self.save()
+
+    def record_streak_activity(self, day):
+        """Extend or restart the current run of active days with activity on given day"""
+        if self.last_activity_date == day:
             return
         
-        # Sort dates and convert to date objects
-        sorted_dates = sorted([date.fromisoformat(d) for d in self.activity_days])
-        today = date.today()
-        
-        # Start from today and count backwards
-        current_streak = 0
-        current_date = today
-        
-        # Check if today is in the activity list
-        if today.isoformat() in self.activity_days:
-            current_streak = 1
-            current_date = today
-        elif len(sorted_dates) > 0 and sorted_dates[-1] == today - timezone.timedelta(days=1):
-            # If last activity was yesterday, start streak from yesterday
-            current_date = sorted_dates[-1]
-            current_streak = 1
+        if self.streak_start_date is None or self.last_activity_date != day - timedelta(days=1):
+            self.streak_start_date = day
+        self.last_activity_date = day
+        self.calculate_streak(today=day)
+
+    def rebuild_streak_state(self, today=None):
+        """Rebuild current run of active days from activity calendar"""
+        calendar = self.activity
+        self.last_activity_date = calendar.last_day()
+        if self.last_activity_date is None:
+            self.streak_start_date = None
         else:
-            # No recent activity, streak is 0
+            run_length = calendar.run_ending_at(self.last_activity_date)
+            self.streak_start_date = self.last_activity_date - timedelta(days=run_length - 1)
+
+        self.calculate_streak(today=today)
+
+    def calculate_streak(self, today=None):
+        """Calculate current streak from the current run of active days"""
+        today = today or date.today()
+
+        # Streak continues only if the run ends today or yesterday
+        if (self.last_activity_date is None or self.streak_start_date is None or 
+                self.last_activity_date < today - timedelta(days=1)):
             self.days_streak = 0
             return
         
-        # Count backwards from current_date
-        for i in range(len(sorted_dates) - 1, -1, -1):
-            expected_date = current_date - timezone.timedelta(days=current_streak - 1)
-            if sorted_dates[i] == expected_date:
-                if i == 0:  # First element, no more to check
-                    break
-                # Check if previous day exists
-                prev_expected = expected_date - timezone.timedelta(days=1)
-                if i > 0 and sorted_dates[i - 1] == prev_expected:
-                    current_streak += 1
-                else:
-                    break
-            else:
-                break
-        
+        current_streak = (self.last_activity_date - self.streak_start_date).days + 1
         self.days_streak = current_streak
         
         # Update highest streak if needed
         if current_streak > self.highest_streak:
             self.highest_streak = current_streak
 
-    def create_daily_challenges(self):
-        all_challenges = list(DailyChallenge.objects.all())
-        daily_challenges_count = 3
-        selected_challenges = random.sample(all_challenges, k=daily_challenges_count)
+    def create_daily_challenges(self, catalogue=None):
+        if catalogue is None:
+            catalogue = DailyChallengeService.load_catalogue()
                 
-        self.daily_challenges = [
-            {
-                'code': challenge.code,
-                'description': challenge.description,
-                'progress': 0,
-                'max_progress': challenge.max_progress,
-                'completed': False
-            }
-            for challenge in selected_challenges
-        ]
+        self.daily_challenges = DailyChallengeService.select_challenges(catalogue)
         self.daily_challenges_completed = False
         
         self.save()
         
-    def check_if_new_level(self):
+    def check_if_new_level(self, save=True):
         if self.experience >= self.level * 500:
             self.level += 1
-            self.save()
+            if save:
+                self.save()
         
     def progress_daily_challenges(self, practice_type=None, lesson=None):
-        # Map practice types to challenge prefixes
-        practice_prefixes = {
-            'random': ('RP', 'P'),
-            'vocabulary': ('VP', 'P'), 
-            'sentence': ('SP', 'P'),
-            'listening': ('LP', 'P')
-        }
-        
-        # Get prefixes if practice_type is provided and valid
-        prefixes = practice_prefixes.get(practice_type, ()) if practice_type else ()
-        
-        for challenge in self.daily_challenges:
-            # Experience points challenge
-            if challenge['code'].startswith('EX') and not challenge['completed']:
-                if lesson is not None:
-                    challenge['progress'] += 100
-                elif practice_type in practice_prefixes.keys():
-                    challenge['progress'] += 25
-                
-            # Complete lessons challenge
-            if challenge['code'].startswith('C') and not challenge['completed']:
-                challenge['progress'] += 1
-
-            # Practice challenges
-            if not challenge['completed'] and prefixes and challenge['code'].startswith(prefixes):
-                challenge['progress'] += 1
-
-            # Learn new (vocabularies/sentences/audios) / complete lessons challenge
-            if lesson is not None and challenge['code'].startswith(('C', 'NW', 'NS', 'NA')) and not challenge['completed']:
-                if challenge['code'].startswith('NW'):
-                    challenge['progress'] += lesson.vocabularies.count()
-                elif challenge['code'].startswith('NS'):
-                    challenge['progress'] += lesson.sentences.count()
-                elif challenge['code'].startswith('NA'):
-                    challenge['progress'] += lesson.audios.count()
-
-            # Check if challenge is completed
-            if challenge['progress'] >= challenge['max_progress']:
-                    challenge['completed'] = True
+        event = ChallengeEvent(practice_type=practice_type, lesson=lesson)
+        DailyChallengeService.progress_challenges(self.daily_challenges, event)
         
         # Check if all challenges are completed and award bonus XP
         if not self.daily_challenges_completed:
@@ -277,8 +343,8 @@ class User(AbstractUser):
                 self.experience += 75
                 self.daily_challenges_completed = True
                
-        self.check_if_new_level()
-        AchievementService.check_and_award_achievements(self)
+        self.check_if_new_level(save=False)
+        AchievementService.check_and_award_achievements(self, changed_fields=self.get_changed_fields())
         self.save()
 
 
@@ -303,6 +369,74 @@ class Achievement(models.Model):
         return slugify(self.name)
 
 
+class UserKnowledge(models.Model):
+    """Vocabulary, sentence or audio item learned by a user"""
+    VOCABULARY = 'vocabulary'
+    SENTENCE = 'sentence'
+    AUDIO = 'audio'
+    ITEM_TYPES = [
+        (VOCABULARY, 'Vocabulary'),
+        (SENTENCE, 'Sentence'),
+        (AUDIO, 'Audio'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='knowledge')
+    item_type = models.CharField(max_length=10, choices=ITEM_TYPES)
+    # Id of lessons.Vocabulary, lessons.Sentence or lessons.Audio depending on item_type
+    item_id = models.PositiveBigIntegerField()
+    learned_at = models.DateTimeField(default=timezone.now)
+
+    # Spaced repetition state, see practice/scheduler.py
+    due_at = models.DateTimeField(default=timezone.now)
+    ease = models.FloatField(default=2.5)
+    interval_days = models.IntegerField(default=0)
+    repetitions = models.IntegerField(default=0)
+
+    class Meta:
+        # Also serves "learned items of type X" and "is item Y learned" lookups
+        unique_together = ('user', 'item_type', 'item_id')
+        indexes = [
+            models.Index(fields=['user', 'item_type', 'learned_at'], name='knowledge_user_type_learned'),
+            models.Index(fields=['item_type', 'item_id'], name='knowledge_item'),
+            # Most due items for random and per type practice decks
+            models.Index(fields=['user', 'due_at'], name='knowledge_user_due'),
+            models.Index(fields=['user', 'item_type', 'due_at'], name='knowledge_user_type_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.item_type} {self.item_id}"
+
+
+class ExerciseResult(models.Model):
+    """Answer to a lesson exercise checked by the lesson answers API"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exercise_results')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='exercise_results')
+    # 1-based step of lesson_sequence
+    exercise_number = models.IntegerField()
+    correct = models.BooleanField()
+    answered_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'answered_at'], name='exercise_result_user'),
+            models.Index(fields=['lesson', 'exercise_number'], name='exercise_result_exercise'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.lesson_id}/{self.exercise_number} {'correct' if self.correct else 'wrong'}"
+
+
+class LeaderboardChange(models.Model):
+    """Experience change of a user, applied by the leaderboard index of every process (see base/leaderboard.py)"""
+    # Not a foreign key, deleted users are logged with experience 0
+    user_id = models.IntegerField()
+    experience = models.IntegerField()
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.experience}"
+
+
 class UserAchievement(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='earned_achievements')
     achievement = models.ForeignKey(Achievement, on_delete=models.CASCADE, related_name='earned_by')
@@ -1,105 +1,179 @@
 """
 Achievement service for handling achievement logic
 """
-from lessons.models import Lesson, Country
+from lessons.services import CatalogueService
 from datetime import date, datetime
-from django.db import models
+
+
+class AchievementRule:
+    """Declarative achievement condition with the user fields it depends on"""
+
+    def __init__(self, name, fields, condition):
+        self.name = name
+        self.fields = frozenset(fields)
+        self.condition = condition
+
+    def __repr__(self):
+        return f"<AchievementRule {self.name}>"
+
+
+class CatalogueTotals:
+    """Catalogue-wide numbers shared by all rules in one evaluation, read lazily from catalogue stats"""
+
+    def __init__(self):
+        self._stats = None
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = CatalogueService.get_stats()
+        return self._stats
+
+    @property
+    def use_of_spanish(self):
+        return self.stats.total['use_of_spanish']
+
+    def country_lessons(self, country_name):
+        return self.stats.country(country_name)['lessons']
+
+
+def _at_least(field, threshold):
+    return lambda user, totals: getattr(user, field) >= threshold
+
+
+def _learned_at_least(item_type, threshold):
+    return lambda user, totals: user.knowledge_counts()[item_type] >= threshold
+
+
+def _use_of_spanish_at_least(percentage):
+    def condition(user, totals):
+        total = totals.use_of_spanish
+        return total > 0 and user.use_of_spanish / total * 100 >= percentage
+    return condition
+
+
+def _active_today_hour(predicate):
+    return lambda user, totals: user.last_activity_date == date.today() and predicate(datetime.now().hour)
+
+
+def _country_progress_at_least(country_name, percentage):
+    def condition(user, totals):
+        total_lessons = totals.country_lessons(country_name)
+        progress = user.country_lessons_progress.get(country_name, 0)
+        return total_lessons > 0 and progress / total_lessons * 100 >= percentage
+    return condition
+
+
+# Every rule lists the user fields its condition reads, so only rules whose
+# inputs changed since the user was loaded have to be evaluated.
+# Time-based rules listen to experience as every activity awards experience
+ACHIEVEMENT_RULES = [
+    # Level-based
+    AchievementRule('Baby Step', ['level'], _at_least('level', 2)),
+    AchievementRule('Level Up', ['level'], _at_least('level', 5)),
+    AchievementRule('Expert', ['level'], _at_least('level', 10)),
+    AchievementRule('Master', ['level'], _at_least('level', 20)),
+
+    # Experience-based
+    AchievementRule('Getting Started', ['experience'], _at_least('experience', 250)),
+    AchievementRule('Experience Seeker', ['experience'], _at_least('experience', 2500)),
+    AchievementRule('Experience Master', ['experience'], _at_least('experience', 5000)),
+
+    # Streak-based
+    AchievementRule('Streak Beginner', ['days_streak'], _at_least('days_streak', 3)),
+    AchievementRule('Streak Master', ['days_streak'], _at_least('days_streak', 7)),
+    AchievementRule('Streak Legend', ['days_streak'], _at_least('days_streak', 30)),
+
+    # Adventure-based
+    AchievementRule('Adventure Hero', ['adventure_progress'], _at_least('adventure_progress', 1)),
+
+    # Knowledge-based
+    AchievementRule('Word Master', ['vocabulary_learned'], _learned_at_least('vocabulary', 100)),
+    AchievementRule('Sentence Master', ['sentence_learned'], _learned_at_least('sentence', 25)),
+    AchievementRule('Audiofile', ['audio_learned'], _learned_at_least('audio', 25)),
+    AchievementRule('Spanish User', ['use_of_spanish'], _use_of_spanish_at_least(50)),
+
+    # Time-based
+    AchievementRule('Early Bird', ['experience', 'last_activity_date'], _active_today_hour(lambda hour: hour < 10)),
+    AchievementRule('Night Owl', ['experience', 'last_activity_date'], _active_today_hour(lambda hour: hour >= 22)),
+
+    # Country-specific
+    AchievementRule('Poland Explorer', ['country_lessons_progress'], _country_progress_at_least('poland', 50)),
+    AchievementRule('Poland Master', ['country_lessons_progress'], _country_progress_at_least('poland', 100)),
+    AchievementRule('Spain Explorer', ['country_lessons_progress'], _country_progress_at_least('spain', 50)),
+    AchievementRule('Spain Master', ['country_lessons_progress'], _country_progress_at_least('spain', 100)),
+]
+
+# Field name -> rules depending on it, in registry order
+RULES_BY_FIELD = {}
+# Rule name -> position in the registry, rules of several fields are evaluated in that order
+RULE_POSITIONS = {}
+for _position, _rule in enumerate(ACHIEVEMENT_RULES):
+    RULE_POSITIONS[_rule.name] = _position
+    for _field in _rule.fields:
+        RULES_BY_FIELD.setdefault(_field, []).append(_rule)
+
 
 class AchievementService:
     """Service class to handle achievement checking and awarding"""
-    
+
     @staticmethod
-    def check_and_award_achievements(user):
-        """Check all possible achievements for a user and award them if conditions are met"""
-        
-        # Level-based
-        if user.level >= 2 and not user.has_achievement('Baby Step'):
-            user.award_achievement('Baby Step')
+    def rules_for_fields(changed_fields=None):
+        """Rules depending on any of the given fields, all rules if fields are unknown"""
+        if changed_fields is None:
+            return list(ACHIEVEMENT_RULES)
+        rules = {rule.name: rule for field in changed_fields for rule in RULES_BY_FIELD.get(field, ())}
+        return sorted(rules.values(), key=lambda rule: RULE_POSITIONS[rule.name])
 
-        if user.level >= 5 and not user.has_achievement('Level Up'):
-            user.award_achievement('Level Up')
+    @staticmethod
+    def check_and_award_achievements(user, changed_fields=None):
+        """Evaluate the rules affected by changed_fields and award the ones met.
 
-        if user.level >= 10 and not user.has_achievement('Expert'):
-            user.award_achievement('Expert')
+        Earned achievements are loaded once into a set, so evaluation itself costs
+        a single query. The user is not saved, callers persist the awarded experience.
+        Returns list of awarded achievement names.
+        """
+        rules = AchievementService.rules_for_fields(changed_fields)
+        if not rules:
+            return []
 
-        if user.level >= 20 and not user.has_achievement('Master'):
-            user.award_achievement('Master')
+        earned = set(user.earned_achievements.values_list('achievement__name', flat=True))
+        totals = CatalogueTotals()
+        awarded = []
 
-        # Experience-based
-        if user.experience >= 250 and not user.has_achievement('Getting Started'):
-            user.award_achievement('Getting Started')
+        while rules:
+            newly_met = [rule.name for rule in rules if rule.name not in earned and rule.condition(user, totals)]
+            if not newly_met:
+                break
 
-        if user.experience >= 2500 and not user.has_achievement('Experience Seeker'):
-            user.award_achievement('Experience Seeker')
+            names = AchievementService.award_achievements(user, newly_met)
+            earned.update(newly_met)
+            awarded.extend(names)
 
-        if user.experience >= 5000 and not user.has_achievement('Experience Master'):
-            user.award_achievement('Experience Master')
+            # Awarded experience can unlock further level/experience achievements
+            rules = AchievementService.rules_for_fields(['experience', 'level'])
 
-        # Streak-based
-        if user.days_streak >= 3 and not user.has_achievement('Streak Beginner'):
-            user.award_achievement('Streak Beginner')
+        return awarded
 
-        if user.days_streak >= 7 and not user.has_achievement('Streak Master'):
-            user.award_achievement('Streak Master')
+    @staticmethod
+    def award_achievements(user, achievement_names):
+        """Award several achievements at once, skipping ones already earned"""
+        # Importing here to avoid circular import
+        from base.models import Achievement, UserAchievement
 
-        if user.days_streak >= 30 and not user.has_achievement('Streak Legend'):
-            user.award_achievement('Streak Legend')
+        achievements = list(Achievement.objects.filter(name__in=achievement_names))
+        if not achievements:
+            return []
 
-        # Adventure-based
-        if user.adventure_progress >= 1 and not user.has_achievement('Adventure Hero'):
-            user.award_achievement('Adventure Hero')
+        UserAchievement.objects.bulk_create(
+            [UserAchievement(user=user, achievement=achievement) for achievement in achievements],
+            ignore_conflicts=True,
+        )
+        user.experience += sum(achievement.experience_award for achievement in achievements)
+        user.check_if_new_level(save=False)
 
-        # Knowledge-based
-        if len(user.words_learned) >= 100 and not user.has_achievement('Word Master'):
-            user.award_achievement('Word Master')
-        
-        if len(user.sentences_learned) >= 25 and not user.has_achievement('Sentence Master'):
-            user.award_achievement('Sentence Master')
-
-        if len(user.audio_learned) >= 25 and not user.has_achievement('Audiofile'):
-            user.award_achievement('Audiofile')
-            
-        total_use_of_spanish = Lesson.objects.aggregate(total=models.Sum('use_of_spanish'))['total'] or 0
-        use_of_spanish_percentage = (user.use_of_spanish / total_use_of_spanish * 100) if total_use_of_spanish > 0 else 0
-        if use_of_spanish_percentage >= 50 and not user.has_achievement('Spanish User'):
-            user.award_achievement('Spanish User')
-
-        # Time-based
-        current_hour = datetime.now().hour
-        if user.last_activity_date == date.today() and not user.has_achievement('Early Bird') and current_hour < 10:
-            user.award_achievement('Early Bird')
-        
-        if user.last_activity_date == date.today() and not user.has_achievement('Night Owl') and current_hour >= 22:
-            user.award_achievement('Night Owl')
+        return [achievement.name for achievement in achievements]
 
-        # Country-specific achievements
-        poland_progress = user.country_lessons_progress.get('poland', 0)
-        spain_progress = user.country_lessons_progress.get('spain', 0)
-        
-        # Get total lessons for each country
-        poland_country = Country.objects.filter(name__iexact='poland').first()
-        spain_country = Country.objects.filter(name__iexact='spain').first()
-
-        total_poland_lessons = Lesson.objects.filter(country=poland_country).count()
-        if total_poland_lessons > 0:
-            poland_percentage = (poland_progress / total_poland_lessons) * 100
-            
-            if poland_percentage >= 50 and not user.has_achievement('Poland Explorer'):
-                user.award_achievement('Poland Explorer')
-
-            if poland_percentage >= 100 and not user.has_achievement('Poland Master'):
-                user.award_achievement('Poland Master')
-        
-        total_spain_lessons = Lesson.objects.filter(country=spain_country).count()
-        if total_spain_lessons > 0:
-            spain_percentage = (spain_progress / total_spain_lessons) * 100
-            
-            if spain_percentage >= 50 and not user.has_achievement('Spain Explorer'):
-                user.award_achievement('Spain Explorer')
-            
-            if spain_percentage >= 100 and not user.has_achievement('Spain Master'):
-                user.award_achievement('Spain Master')
-    
     
     @staticmethod
     def get_user_achievements_status_exp(user):
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import LeaderboardChange, User
+from .leaderboard import leaderboard
+
+
+@receiver(post_save, sender=User)
+def update_leaderboard_rank(sender, instance, created=False, update_fields=None, **kwargs):
+    """Keep leaderboard index in sync with user's experience"""
+    if update_fields is not None and 'experience' not in update_fields:
+        return
+    if created and instance.experience <= 0:
+        return
+    # Value of the last write, the snapshot is updated after post_save
+    saved_values = getattr(instance, '_saved_values', None)
+    if not created and saved_values and saved_values.get('experience') == instance.experience:
+        return
+
+    # Logged for the indexes of other processes, applied here right away
+    LeaderboardChange.objects.create(user_id=instance.pk, experience=instance.experience)
+    leaderboard.update(instance.pk, instance.experience)
+
+
+@receiver(post_delete, sender=User)
+def remove_leaderboard_rank(sender, instance, **kwargs):
+    LeaderboardChange.objects.create(user_id=instance.pk, experience=0)
+    leaderboard.update(instance.pk, 0)
@@ -0,0 +1,12 @@
+from django import template
+from ..avatars import AVATAR_SIZES, user_avatar_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(user, size_name='small'):
+    """URL of the user's avatar thumbnail, size_name is one of AVATAR_SIZES"""
+    if size_name not in AVATAR_SIZES:
+        raise template.TemplateSyntaxError(f'Unknown avatar size "{size_name}", available: {", ".join(AVATAR_SIZES)}')
+    return user_avatar_url(user, size_name)
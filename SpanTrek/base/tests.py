@@ -1,3 +1,675 @@
-from django.test import TestCase
+from datetime import date, timedelta
+import base64
+import io
+import json
+import os
+import random
+import re
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from lessons.models import Audio, Country, Landmark, Lesson, Sentence, Vocabulary
+from practice.models import DailyChallenge
+
+from .activity import ActivityCalendar
+from .avatars import AVATAR_SIZES, avatar_hash, user_avatar_url
+from .leaderboard import LeaderboardIndex, LocalSortedSet
+from .middleware import UserWriteBehindMiddleware
+from .models import Achievement, LeaderboardChange, User, UserKnowledge
+from .services import ACHIEVEMENT_RULES, AchievementService
+from .views import LEADERBOARD_PAGE_SIZE, decode_leaderboard_cursor, encode_leaderboard_cursor
+
+
+def legacy_calculate_streak(activity_days, highest_streak, today):
+    """Streak algorithm replaced by incremental streak state, kept as the reference"""
+    if not activity_days:
+        return 0, highest_streak
+
+    sorted_dates = sorted([date.fromisoformat(d) for d in activity_days])
+
+    current_streak = 0
+    current_date = today
+
+    if today.isoformat() in activity_days:
+        current_streak = 1
+        current_date = today
+    elif len(sorted_dates) > 0 and sorted_dates[-1] == today - timedelta(days=1):
+        current_date = sorted_dates[-1]
+        current_streak = 1
+    else:
+        return 0, highest_streak
+
+    for i in range(len(sorted_dates) - 1, -1, -1):
+        expected_date = current_date - timedelta(days=current_streak - 1)
+        if sorted_dates[i] == expected_date:
+            if i == 0:
+                break
+            prev_expected = expected_date - timedelta(days=1)
+            if i > 0 and sorted_dates[i - 1] == prev_expected:
+                current_streak += 1
+            else:
+                break
+        else:
+            break
+
+    return current_streak, max(highest_streak, current_streak)
+
+
+def random_activity_days(rng, today):
+    """Random history of active days up to today, with runs of various lengths"""
+    days = set()
+    day = today - timedelta(days=rng.randint(0, 400))
+    while day <= today:
+        if rng.random() < rng.choice([0.2, 0.5, 0.9]):
+            days.add(day)
+        day += timedelta(days=1)
+    return sorted(days)
+
+
+class StreakTests(SimpleTestCase):
+    examples = 300
+
+    def test_rebuilt_streak_matches_legacy_algorithm(self):
+        rng = random.Random(2024)
+        today = date(2026, 3, 1)
+        for _ in range(self.examples):
+            activity_days = [d.isoformat() for d in random_activity_days(rng, today)]
+            highest_streak = rng.randint(0, 20)
+
+            calendar = ActivityCalendar.from_days(date.fromisoformat(d) for d in activity_days)
+            user = User(activity_calendar=calendar.to_bytes(), highest_streak=highest_streak)
+            user.rebuild_streak_state(today=today)
+
+            self.assertEqual(
+                (user.days_streak, user.highest_streak),
+                legacy_calculate_streak(activity_days, highest_streak, today),
+                activity_days,
+            )
+
+    def test_incremental_streak_matches_legacy_algorithm(self):
+        rng = random.Random(7)
+        today = date(2026, 3, 1)
+        for _ in range(self.examples):
+            active_days = random_activity_days(rng, today)
+
+            # Replay history day by day, as if activity was recorded on each day
+            user = User()
+            recorded = []
+            legacy_streak, legacy_highest = 0, 0
+            for day in active_days:
+                recorded.append(day.isoformat())
+                user.record_streak_activity(day)
+                legacy_streak, legacy_highest = legacy_calculate_streak(recorded, legacy_highest, day)
+                self.assertEqual((user.days_streak, user.highest_streak), (legacy_streak, legacy_highest))
+
+            # Streak read some days after the last activity
+            user.calculate_streak(today=today)
+            self.assertEqual(user.days_streak, legacy_calculate_streak(recorded, legacy_highest, today)[0])
+
+
+class ActivityCalendarTests(SimpleTestCase):
+    def test_round_trip_and_membership(self):
+        days = [date(2024, 12, 30), date(2024, 12, 31), date(2025, 1, 1), date(2026, 3, 1), date(2023, 2, 28)]
+        calendar = ActivityCalendar(ActivityCalendar.from_days(days).to_bytes())
+
+        self.assertEqual(list(calendar.days()), sorted(days))
+        self.assertEqual(len(calendar), len(days))
+        self.assertIn(date(2024, 12, 31), calendar)
+        self.assertNotIn(date(2025, 1, 2), calendar)
+        self.assertNotIn(date(2010, 1, 1), calendar)
+        self.assertEqual(calendar.last_day(), date(2026, 3, 1))
+
+    def test_counts(self):
+        rng = random.Random(1)
+        today = date(2025, 6, 15)
+        active_days = random_activity_days(rng, today)
+        calendar = ActivityCalendar.from_days(active_days)
+
+        for year, month in [(2025, 6), (2025, 2), (2024, 12), (2024, 2)]:
+            expected = sum(1 for d in active_days if (d.year, d.month) == (year, month))
+            self.assertEqual(calendar.count_in_month(year, month), expected)
+        self.assertEqual(calendar.count_in_year(2025), sum(1 for d in active_days if d.year == 2025))
+
+    def test_run_crosses_year_boundary(self):
+        calendar = ActivityCalendar.from_days(date(2024, 12, 25) + timedelta(days=i) for i in range(10))
+
+        self.assertEqual(calendar.run_ending_at(date(2025, 1, 3)), 10)
+        self.assertEqual(calendar.run_ending_at(date(2024, 12, 31)), 7)
+        self.assertEqual(calendar.run_ending_at(date(2025, 1, 4)), 0)
+
+
+class LeaderboardCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        user = User(id=42, experience=1500)
+        for direction in ('next', 'prev'):
+            cursor = encode_leaderboard_cursor(user, 17, direction)
+            self.assertEqual(
+                decode_leaderboard_cursor(cursor),
+                {'experience': 1500, 'id': 42, 'rank': 17, 'direction': direction},
+            )
+
+    def test_first_page_has_no_cursor(self):
+        self.assertIsNone(decode_leaderboard_cursor(None))
+        self.assertIsNone(decode_leaderboard_cursor(''))
+
+    def test_invalid_cursors(self):
+        invalid = [
+            'not base64!', base64.urlsafe_b64encode(b'not json').decode(),
+            encode_cursor_data([1, 2]), encode_cursor_data({'e': 1, 'i': 2, 'd': 'next'}),
+            encode_cursor_data({'e': 'x', 'i': 2, 'r': 1, 'd': 'next'}),
+            encode_cursor_data({'e': 1, 'i': 2, 'r': 1, 'd': 'sideways'}),
+            encode_cursor_data({'e': 1, 'i': 2, 'r': 0, 'd': 'next'}),
+        ]
+        for cursor in invalid:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_leaderboard_cursor(cursor)
+
+
+def encode_cursor_data(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+class LeaderboardApiTests(TestCase):
+    def setUp(self):
+        # Ties on experience are ordered by id
+        experiences = [100, 50, 50, 50, 30, 0] + [10] * 20
+        self.users = [
+            User.objects.create(username=f'user{i}', email=f'user{i}@example.com', experience=experience)
+            for i, experience in enumerate(experiences)
+        ]
+        self.expected = [
+            user.id for user in sorted((u for u in self.users if u.experience > 0), key=lambda u: (-u.experience, u.id))
+        ]
+        self.client.force_login(self.users[0])
+
+    def get_page(self, cursor=None):
+        response = self.client.get(reverse('leaderboard_api'), {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_walk_forward_and_back(self):
+        pages = [self.get_page()]
+        while pages[-1]['next_cursor']:
+            pages.append(self.get_page(pages[-1]['next_cursor']))
+
+        users = [user for page in pages for user in page['users']]
+        self.assertEqual([user['id'] for user in users], self.expected)
+        self.assertEqual([user['rank'] for user in users], list(range(1, len(self.expected) + 1)))
+        self.assertTrue(all(len(page['users']) == LEADERBOARD_PAGE_SIZE for page in pages[:-1]))
+        self.assertIsNone(pages[0]['prev_cursor'])
+
+        # Back from the last page gives the same rows and ranks
+        page = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            page = self.get_page(page['prev_cursor'])
+            self.assertEqual(page['users'], expected_page['users'])
+        self.assertIsNone(page['prev_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('leaderboard_api'), {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class LocalSortedSetTests(SimpleTestCase):
+    def assert_matches(self, ranking, scores):
+        expected = [member for _, member in sorted((-score, member) for member, score in scores.items())]
+        self.assertEqual(len(ranking), len(expected))
+        self.assertEqual(ranking.range(0, len(expected)), expected)
+        for position, member in enumerate(expected):
+            self.assertEqual(ranking.rank(member), position)
+        for score in set(scores.values()) | {0}:
+            self.assertEqual(ranking.count_above(score), sum(1 for other in scores.values() if other > score))
+
+    def test_random_changes_with_ties(self):
+        rng = random.Random(3)
+        ranking, scores = LocalSortedSet(), {}
+        for _ in range(3000):
+            member = rng.randint(1, 300)
+            if rng.random() < 0.25:
+                ranking.remove(member)
+                scores.pop(member, None)
+            else:
+                # Few distinct scores so most members are tied
+                scores[member] = rng.randint(1, 8)
+                ranking.add(member, scores[member])
+        self.assert_matches(ranking, scores)
+        self.assertEqual(ranking.range(10, 25), ranking.range(0, len(scores))[10:25])
+        self.assertEqual(ranking.range(len(scores) - 2, len(scores) + 5), ranking.range(0, len(scores))[-2:])
+        self.assertEqual(ranking.range(5, 5), [])
+
+    def test_missing_member(self):
+        ranking = LocalSortedSet()
+        ranking.add(1, 10)
+        ranking.remove(2)
+        self.assertIsNone(ranking.rank(2))
+        self.assertIsNone(ranking.score(2))
+        self.assertEqual(len(ranking), 1)
+
+
+class LeaderboardIndexTests(TestCase):
+    def create_user(self, name, experience):
+        return User.objects.create(username=name, email=f'{name}@example.com', experience=experience)
+
+    def test_tied_users_share_rank(self):
+        first = self.create_user('first', 100)
+        tied = [self.create_user(f'tied{i}', 50) for i in range(3)]
+        last = self.create_user('last', 10)
+        index = LeaderboardIndex()
+
+        self.assertEqual(index.user_rank(first), 1)
+        self.assertEqual([index.user_rank(user) for user in tied], [2, 2, 2])
+        self.assertEqual(index.user_rank(last), 5)
+        self.assertEqual([user.display_rank for user in index.top_users(5)], [1, 2, 3, 4, 5])
+        self.assertEqual([user.id for user in index.top_users(5)], [first.id] + [user.id for user in tied] + [last.id])
+
+    def test_changes_from_other_processes(self):
+        user = self.create_user('climber', 10)
+        leader = self.create_user('leader', 100)
+        other_process = LeaderboardIndex()
+        self.assertEqual(other_process.user_rank(user), 2)
+
+        # Saved through the signal, which only updates this process's index
+        user.experience = 500
+        user.save()
+        self.assertTrue(LeaderboardChange.objects.filter(user_id=user.id, experience=500).exists())
+        self.assertEqual(other_process.user_rank(user), 1)
+
+        leader.delete()
+        self.assertEqual(other_process.count(), 1)
+
+    def test_unchanged_experience_is_not_logged(self):
+        # Loaded from database like request.user, so the last written values are known
+        user = User.objects.get(id=self.create_user('idle', 10).id)
+        changes = LeaderboardChange.objects.count()
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(LeaderboardChange.objects.count(), changes)
+
+    @override_settings(BACKGROUND_TASKS_SYNC=True, LEADERBOARD_REFRESH_SECONDS=-1)
+    def test_stale_index_is_rebuilt(self):
+        user = self.create_user('rebuilt', 10)
+        index = LeaderboardIndex()
+        self.assertEqual(index.count(), 1)
+
+        # Written without signals, only a rebuild can see it
+        User.objects.filter(id=user.id).update(experience=0)
+        index.count()
+        self.assertEqual(index.count(), 0)
+
+
+class AchievementRuleTests(SimpleTestCase):
+    def rule_names(self, changed_fields):
+        return {rule.name for rule in AchievementService.rules_for_fields(changed_fields)}
+
+    def test_unknown_changes_check_every_rule(self):
+        self.assertEqual(AchievementService.rules_for_fields(None), ACHIEVEMENT_RULES)
+
+    def test_no_changes_check_nothing(self):
+        self.assertEqual(AchievementService.rules_for_fields([]), [])
+        self.assertEqual(AchievementService.rules_for_fields(['username', 'email']), [])
+
+    def test_rules_of_changed_fields(self):
+        self.assertEqual(self.rule_names(['days_streak']), {'Streak Beginner', 'Streak Master', 'Streak Legend'})
+        self.assertEqual(
+            self.rule_names(['experience']),
+            {'Getting Started', 'Experience Seeker', 'Experience Master', 'Early Bird', 'Night Owl'},
+        )
+        self.assertEqual(self.rule_names({'vocabulary_learned', 'audio_learned'}), {'Word Master', 'Audiofile'})
+
+    def test_rules_keep_registry_order(self):
+        for fields in (['level', 'experience'], ['experience', 'level'], ['last_activity_date', 'experience', 'days_streak']):
+            with self.subTest(fields=fields):
+                rules = AchievementService.rules_for_fields(fields)
+                self.assertEqual(rules, [rule for rule in ACHIEVEMENT_RULES if rule.fields & set(fields)])
+
+    def test_rule_fields_exist(self):
+        field_names = {field.name for field in User._meta.concrete_fields}
+        knowledge_fields = {'vocabulary_learned', 'sentence_learned', 'audio_learned'}
+        for rule in ACHIEVEMENT_RULES:
+            with self.subTest(rule=rule.name):
+                self.assertTrue(rule.fields)
+                self.assertLessEqual(rule.fields, field_names | knowledge_fields)
+
+
+class AchievementAwardTests(TestCase):
+    def setUp(self):
+        for code, name, award in [('getting_started', 'Getting Started', 2300),
+                                  ('experience_seeker', 'Experience Seeker', 0),
+                                  ('streak_beginner', 'Streak Beginner', 0)]:
+            Achievement.objects.create(code=code, name=name, description=name, icon='star', experience_award=award)
+        created = User.objects.create(
+            username='achiever', email='achiever@example.com', experience=200, days_streak=5,
+            last_activity_date=date.today() - timedelta(days=1),
+        )
+        # Loaded from database so changed fields are tracked
+        self.user = User.objects.get(id=created.id)
+
+    def earned(self):
+        return set(self.user.earned_achievements.values_list('achievement__name', flat=True))
+
+    def test_only_rules_of_changed_fields_are_awarded(self):
+        self.user.experience = 300
+        self.assertEqual(self.user.get_changed_fields(), {'experience'})
+
+        awarded = AchievementService.check_and_award_achievements(self.user, self.user.get_changed_fields())
+        # Streak Beginner is met too, but days_streak didn't change. The award unlocks Experience Seeker
+        self.assertEqual(awarded, ['Getting Started', 'Experience Seeker'])
+        self.assertEqual(self.earned(), {'Getting Started', 'Experience Seeker'})
+        self.assertEqual(self.user.experience, 2600)
+
+    def test_earned_achievements_are_not_awarded_again(self):
+        self.assertEqual(AchievementService.check_and_award_achievements(self.user, ['days_streak']), ['Streak Beginner'])
+        self.assertEqual(AchievementService.check_and_award_achievements(self.user, None), [])
+        self.assertEqual(self.earned(), {'Streak Beginner'})
+
+
+def user_updates(queries):
+    """Columns set by every UPDATE of the user table, bulk updates match rows by "table"."id" in CASE"""
+    table = connection.ops.quote_name(User._meta.db_table)
+    return [
+        set(re.findall(r'(?<!\.)"(\w+)" = ', query['sql'].split(' WHERE ')[0]))
+        for query in queries.captured_queries
+        if query['sql'].startswith(f'UPDATE {table}')
+    ]
+
+
+class UserWriteBehindTests(TestCase):
+    def setUp(self):
+        # Stored in lower case like imported landmarks
+        country = Country.objects.create(name='poland')
+        landmark = Landmark.objects.create(country=country, name='poznan')
+        Lesson.objects.create(
+            title='Family', order=0, country_order=0, landmark=landmark, country=country, use_of_spanish=5,
+            lesson_sequence=[{'type': 'text', 'content': 'Hola'}],
+        )
+        self.user = User.objects.create(username='writer', email='writer@example.com')
+        self.url = reverse('lessons:lesson_complete', kwargs={'country': 'poland', 'landmark': 'poznan', 'lesson_number': 0})
+
+    def test_lesson_completion_writes_user_once(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        updates = user_updates(queries)
+        # Every step of the progress update saved the user, all of it is written by one UPDATE of the changed fields
+        self.assertEqual(len(updates), 1)
+        self.assertLessEqual(
+            {'experience', 'adventure_progress', 'use_of_spanish', 'last_activity_date',
+             'country_lessons_progress', 'landmark_lessons_progress'},
+            updates[0],
+        )
+        self.assertFalse(updates[0] & {'username', 'email', 'password', 'date_joined'})
+
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual((user.use_of_spanish, user.landmark_lessons_progress), (5, {'poznan': 1}))
+        self.assertGreaterEqual(user.experience, 100)
+
+    def test_raising_view_writes_nothing(self):
+        client = Client(raise_request_exception=False)
+        client.force_login(self.user)
+        # Fails after the progress update changed the user in memory
+        with mock.patch('lessons.views.render', side_effect=RuntimeError('broken template')):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(self.url)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(user_updates(queries), [])
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual((user.experience, user.landmark_lessons_progress), (0, {}))
+
+    def test_error_responses_write_nothing(self):
+        for status, written in [(200, True), (302, True), (404, False), (500, False)]:
+            with self.subTest(status=status):
+                user = User.objects.get(id=self.user.id)
+
+                def view(request):
+                    user.experience += 10
+                    user.save()
+                    return HttpResponse(status=status)
+
+                before = user.experience
+                UserWriteBehindMiddleware(view)(RequestFactory().get('/'))
+                self.assertEqual(User.objects.get(id=self.user.id).experience, before + 10 if written else before)
+
+
+def png_bytes(color, size=(400, 300)):
+    # Importing here, only avatar tests draw images
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True)
+class AvatarThumbnailTests(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.media_root = temp_dir.name
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def thumbnail_path(self, hash_value, size):
+        return os.path.join(self.media_root, 'avatars', 'thumbs', f'{hash_value}_{size}.webp')
+
+    def upload_avatar(self, user, data):
+        self.client.force_login(user)
+        avatar = SimpleUploadedFile('photo.png', data, content_type='image/png')
+        self.client.post(reverse('user_page', kwargs={'pk': user.id}), {'avatar': avatar})
+
+    def test_upload_creates_webp_thumbnails(self):
+        # Importing here, only avatar tests decode images
+        from PIL import Image
+
+        user = User.objects.create(username='painter', email='painter@example.com')
+        data = png_bytes('red')
+
+        self.upload_avatar(user, data)
+
+        hash_value = avatar_hash(data)
+        user.refresh_from_db()
+        self.assertEqual(user.avatar_hash, hash_value)
+        self.assertEqual(user.avatar.name, f'avatars/thumbs/{hash_value}_320.webp')
+        for size in AVATAR_SIZES.values():
+            with Image.open(self.thumbnail_path(hash_value, size)) as thumbnail:
+                self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (size, size)))
+        self.assertEqual(user_avatar_url(user, 'small'), f'/images/avatars/thumbs/{hash_value}_100.webp')
+
+    def test_same_image_reuses_thumbnails(self):
+        data = png_bytes('blue')
+        self.upload_avatar(User.objects.create(username='first', email='first@example.com'), data)
+        written = {size: os.stat(self.thumbnail_path(avatar_hash(data), size)).st_mtime_ns for size in AVATAR_SIZES.values()}
+        second = User.objects.create(username='second', email='second@example.com')
+
+        with mock.patch('PIL.ImageOps.fit') as fit:
+            self.upload_avatar(second, data)
+
+        fit.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.avatar_hash, avatar_hash(data))
+        self.assertEqual(
+            {size: os.stat(self.thumbnail_path(avatar_hash(data), size)).st_mtime_ns for size in AVATAR_SIZES.values()},
+            written,
+        )
+
+    def test_broken_upload_keeps_avatar(self):
+        user = User.objects.create(username='broken', email='broken@example.com')
+
+        with self.assertLogs('base.background', level='ERROR'):
+            self.upload_avatar(user, b'not a picture')
+
+        user.refresh_from_db()
+        self.assertEqual(user.avatar_hash, '')
+        self.assertEqual(user.avatar.name, 'avatars/default_avatar.png')
+
+    def test_command_is_idempotent(self):
+        os.makedirs(os.path.join(self.media_root, 'avatars'))
+        with open(os.path.join(self.media_root, 'avatars', 'photo.png'), 'wb') as f:
+            f.write(png_bytes('green'))
+        users = [
+            User.objects.create(username=f'legacy{number}', email=f'legacy{number}@example.com', avatar='avatars/photo.png')
+            for number in range(2)
+        ]
+
+        out = io.StringIO()
+        call_command('create_avatar_thumbnails', stdout=out)
+        self.assertIn('Created thumbnails for 2 users (1 distinct images)', out.getvalue())
+        for user in users:
+            user.refresh_from_db()
+            self.assertTrue(os.path.exists(self.thumbnail_path(user.avatar_hash, 160)))
+
+        out = io.StringIO()
+        with self.assertNumQueries(1):
+            call_command('create_avatar_thumbnails', stdout=out)
+        self.assertIn('Created thumbnails for 0 users (0 distinct images)', out.getvalue())
+
+
+class LearnLessonItemsTests(TestCase):
+    def setUp(self):
+        country = Country.objects.create(name='poland')
+        landmark = Landmark.objects.create(country=country, name='poznan')
+        self.lesson = Lesson.objects.create(title='Family', order=0, country_order=0, landmark=landmark, country=country)
+        self.vocabularies = [Vocabulary.objects.create(word=word) for word in ('padre', 'madre')]
+        self.sentence = Sentence.objects.create(sentence='Mi padre')
+        self.audio = Audio.objects.create(audio_url='/static/audio/vocabulary/padre.mp3', text='padre')
+        self.lesson.vocabularies.set(self.vocabularies)
+        self.lesson.sentences.set([self.sentence])
+        self.lesson.audios.set([self.audio])
+        self.user = User.objects.create(username='learner', email='learner@example.com')
+
+    def knowledge(self):
+        return set(self.user.knowledge.values_list('item_type', 'item_id'))
+
+    def test_lesson_items_are_learned_once(self):
+        with mock.patch('practice.sampling.SamplingService.invalidate') as invalidate:
+            self.assertEqual(self.user.learn_lesson_items(self.lesson), {'vocabulary': 2, 'sentence': 1, 'audio': 1})
+        invalidate.assert_called_once_with(self.user.id)
+        self.assertEqual(self.knowledge(), {
+            (UserKnowledge.VOCABULARY, self.vocabularies[0].id), (UserKnowledge.VOCABULARY, self.vocabularies[1].id),
+            (UserKnowledge.SENTENCE, self.sentence.id), (UserKnowledge.AUDIO, self.audio.id),
+        })
+
+        with mock.patch('practice.sampling.SamplingService.invalidate') as invalidate:
+            self.assertEqual(self.user.learn_lesson_items(self.lesson), {'vocabulary': 0, 'sentence': 0, 'audio': 0})
+        # Nothing new, sampled ids are still right
+        invalidate.assert_not_called()
+        self.assertEqual(self.user.knowledge.count(), 4)
+
+    def test_known_items_are_kept(self):
+        learned_at = timezone.now() - timedelta(days=30)
+        UserKnowledge.objects.create(
+            user=self.user, item_type=UserKnowledge.VOCABULARY, item_id=self.vocabularies[0].id, learned_at=learned_at
+        )
+
+        self.assertEqual(self.user.learn_lesson_items(self.lesson), {'vocabulary': 1, 'sentence': 1, 'audio': 1})
+        self.assertEqual(self.user.knowledge.count(), 4)
+        self.assertEqual(self.user.knowledge.get(item_type=UserKnowledge.VOCABULARY, item_id=self.vocabularies[0].id).learned_at, learned_at)
+        self.assertEqual(self.user.knowledge_counts()[UserKnowledge.VOCABULARY], 2)
+
+
+class UserKnowledgeMigrationTests(TransactionTestCase):
+    """Backfill of 0026_userknowledge from the learned text lists of User, and its reverse"""
+    before = [('base', '0025_remove_user_levels'), ('lessons', '0022_lesson_country_order')]
+    after = [('base', '0026_userknowledge'), ('lessons', '0022_lesson_country_order')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_learned_texts_become_knowledge_and_back(self):
+        apps = self.migrate(self.before)
+        Vocabulary = apps.get_model('lessons', 'Vocabulary')
+        Sentence = apps.get_model('lessons', 'Sentence')
+        Audio = apps.get_model('lessons', 'Audio')
+        # Duplicated texts in the catalogue, every item with the text counts as learned
+        padre = [Vocabulary.objects.create(word='padre').id, Vocabulary.objects.create(word='padre').id]
+        madre = Vocabulary.objects.create(word='madre').id
+        sentence = Sentence.objects.create(sentence='Mi padre').id
+        audio = Audio.objects.create(audio_url='/static/audio/vocabulary/padre.mp3', text='padre').id
+        user = apps.get_model('base', 'User').objects.create(
+            username='legacy', email='legacy@example.com',
+            words_learned=['padre', 'madre', 'removed word'], sentences_learned=['Mi padre'], audio_learned=['padre'],
+        )
+
+        apps = self.migrate(self.after)
+
+        knowledge = apps.get_model('base', 'UserKnowledge').objects.filter(user_id=user.id)
+        self.assertEqual(set(knowledge.values_list('item_type', 'item_id')), {
+            ('vocabulary', padre[0]), ('vocabulary', padre[1]), ('vocabulary', madre),
+            ('sentence', sentence), ('audio', audio),
+        })
+
+        apps = self.migrate(self.before)
+
+        user = apps.get_model('base', 'User').objects.get(id=user.id)
+        # Texts without a catalogue item are lost
+        self.assertEqual(user.words_learned, ['padre', 'madre'])
+        self.assertEqual((user.sentences_learned, user.audio_learned), (['Mi padre'], ['padre']))
+
+
+class CreateDailyChallengesCommandTests(TestCase):
+    def setUp(self):
+        DailyChallenge.objects.bulk_create([
+            DailyChallenge(code=code, description=f'Challenge {code}', max_progress=3)
+            for code in ('C3L', 'P3', 'RP3', 'VP3', 'NW3', 'EX300')
+        ])
+        self.users = [
+            User.objects.create(
+                username=f'challenger{number}', email=f'challenger{number}@example.com', experience=50,
+                daily_challenges_creation_date=date.today() - timedelta(days=1), daily_challenges_completed=True,
+            )
+            for number in range(5)
+        ]
+
+    def create_daily_challenges(self, *args):
+        call_command('create_daily_challenges', *args, stdout=io.StringIO())
+        return {user.id: user.daily_challenges for user in User.objects.order_by('id')}
+
+    def test_users_are_updated_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.create_daily_challenges('--batch-size', '2')
+
+        self.assertEqual(
+            user_updates(queries),
+            [{'daily_challenges', 'daily_challenges_completed', 'daily_challenges_creation_date'}] * 3,
+        )
+
+    def test_challenges_are_reset(self):
+        self.create_daily_challenges()
+
+        codes = set(DailyChallenge.objects.values_list('code', flat=True))
+        for user in User.objects.all():
+            self.assertEqual(user.daily_challenges_creation_date, date.today())
+            self.assertFalse(user.daily_challenges_completed)
+            self.assertEqual(user.experience, 50)
+            self.assertEqual(len(user.daily_challenges), 3)
+            self.assertEqual(len({challenge['code'] for challenge in user.daily_challenges}), 3)
+            for challenge in user.daily_challenges:
+                self.assertIn(challenge['code'], codes)
+                self.assertEqual((challenge['progress'], challenge['max_progress'], challenge['completed']), (0, 3, False))
+
+    def test_seed_makes_selection_reproducible(self):
+        selected = self.create_daily_challenges('--seed', '7', '--batch-size', '2')
+
+        self.assertEqual(self.create_daily_challenges('--seed', '7', '--batch-size', '2'), selected)
+        # Every batch has its own seed, processes don't change the result
+        self.assertEqual(self.create_daily_challenges('--seed', '7', '--batch-size', '2', '--jobs', '2'), selected)
+        self.assertNotEqual(self.create_daily_challenges('--seed', '8', '--batch-size', '2'), selected)
@@ -0,0 +1,61 @@
+"""
+Write-behind unit of work for base.User
+
+Within user_unit_of_work() a plain user.save() only registers the user, and
+the fields changed since the last write are saved once, with update_fields,
+when the block exits. Progress updates of one request therefore write the user
+row once instead of after every step. A block left with an exception writes
+nothing, so changes applied halfway are not persisted. UserWriteBehindMiddleware
+opens a unit of work for every request and also drops it when the response is
+an error, as Django turns exceptions of views into 500 responses before they
+reach middleware.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_active_unit_of_work = ContextVar('user_unit_of_work', default=None)
+
+
+class UserUnitOfWork:
+    """Users with pending changes, flushed together"""
+
+    def __init__(self):
+        self._users = {}
+
+    def register(self, user):
+        self._users[id(user)] = user
+
+    def discard(self):
+        """Forget pending changes, registered users are left unsaved"""
+        self._users.clear()
+
+    def flush(self):
+        users = list(self._users.values())
+        self._users.clear()
+        for user in users:
+            user.flush_changes()
+
+
+def current_unit_of_work():
+    return _active_unit_of_work.get()
+
+
+@contextmanager
+def user_unit_of_work():
+    """Defer User.save() calls until the block exits, nested blocks join the outer one"""
+    unit_of_work = _active_unit_of_work.get()
+    if unit_of_work is not None:
+        yield unit_of_work
+        return
+
+    unit_of_work = UserUnitOfWork()
+    token = _active_unit_of_work.set(unit_of_work)
+    try:
+        try:
+            yield unit_of_work
+        except BaseException:
+            unit_of_work.discard()
+            raise
+        unit_of_work.flush()
+    finally:
+        _active_unit_of_work.reset(token)
@@ -10,4 +10,5 @@ urlpatterns = [
     path('logout/', views.logout_user, name='logout_user'),
     path('user/<str:pk>/', views.user_page, name='user_page'),
     path('leaderboard/<str:view_type>/', views.leaderboard_page, name='leaderboard'),
+    path('api/leaderboard/', views.leaderboard_api, name='leaderboard_api'),
 ]
\ No newline at end of file
@@ -2,12 +2,22 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.db import models
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from .models import User
-from lessons.models import Lesson, Vocabulary, Sentence
+from .avatars import process_avatar_upload, user_avatar_url
+from .background import background
+from lessons.services import CatalogueService
 from .forms import My_User_Creation_Form
 from .services import AchievementService
+from .leaderboard import leaderboard
 from datetime import date
 from django.contrib.auth.decorators import login_required
+import base64
+import json
+
+
+LEADERBOARD_PAGE_SIZE = 10
 
 
 @login_required(login_url='login_page')
@@ -20,7 +30,7 @@ def home_page(request):
         request.user.create_daily_challenges()
         request.user.save()
 
-    all_lessons_count = Lesson.objects.count()
+    all_lessons_count = CatalogueService.get_stats().total['lessons']
     completed_daily_challenges_count = sum(1 for challenge in request.user.daily_challenges if challenge['completed'])
     daily_challenges = request.user.daily_challenges
 
@@ -51,6 +61,7 @@ def home_page(request):
         'filled_stars': filled_stars,
         'xp_for_next_level': xp_for_next_level,
         'leaderboard_user_position': leaderboard_user_position,
+        'knowledge_counts': request.user.knowledge_counts(),
     }
     return render(request, 'base/home.html', context=context)
 
@@ -130,8 +141,8 @@ def user_page(request, pk):
                 messages.error(request, 'File size must be less than 5MB')
                 return redirect('user_page', pk=user.id)
                         
-            user.avatar = avatar_file
-            user.save()
+            # Thumbnails are made by the background worker, the avatar changes once they are written
+            background.submit(process_avatar_upload, user.id, avatar_file.read())
             messages.success(request, 'Profile picture updated successfully')
         
         if request.POST.get('email') and request.POST['email'] != user.email:
@@ -202,18 +213,21 @@ def user_page(request, pk):
     total_achievements_count = len(achievements)
     achievement_earned_percentage = (achievements_earned_count / total_achievements_count * 100) if total_achievements_count > 0 else 0
     
-    words_learned_count = len(user.words_learned)
-    total_words_count = Vocabulary.objects.count()
+    knowledge_counts = user.knowledge_counts()
+    catalogue_totals = CatalogueService.get_stats().total
+
+    words_learned_count = knowledge_counts['vocabulary']
+    total_words_count = catalogue_totals['vocabularies']
     words_learned_percentage = (words_learned_count / total_words_count * 100) if total_words_count > 0 else 0
 
-    total_sentences_count = Sentence.objects.count()
-    sentences_learned_count = len(user.sentences_learned)
+    total_sentences_count = catalogue_totals['sentences']
+    sentences_learned_count = knowledge_counts['sentence']
     sentences_learned_percentage = (sentences_learned_count / total_sentences_count * 100) if total_sentences_count > 0 else 0
 
-    total_use_of_spanish = Lesson.objects.aggregate(total=models.Sum('use_of_spanish'))['total'] or 0
+    total_use_of_spanish = catalogue_totals['use_of_spanish']
     use_of_spanish_percentage = (user.use_of_spanish / total_use_of_spanish * 100) if total_use_of_spanish > 0 else 0
 
-    total_lessons_count = Lesson.objects.count()
+    total_lessons_count = catalogue_totals['lessons']
     lessons_completed_percentage = (user.adventure_progress / total_lessons_count * 100) if total_lessons_count > 0 else 0
 
     # Knowledge difference optional information
@@ -253,22 +267,20 @@ def user_page(request, pk):
         'use_of_spanish_percentage': use_of_spanish_percentage,
         'lowest_knowledge_section': lowest_knowledge_section,
         
-        'user_activity_days': user.activity_days,
+        'user_activity_days': json.dumps([day.isoformat() for day in user.activity.days()]),
     }
 
     return render(request, 'base/user_page.html', context)
 
 @login_required(login_url='login_page')
 def leaderboard_page(request, view_type):
-    all_users_count = User.objects.all().filter(experience__gt=0).count()
+    all_users_count = leaderboard.count()
     
     top_10_users = []
     leaderboard_users = []
     
     if view_type == 'top':
-        leaderboard_users = User.objects.all().filter(experience__gt=0).order_by('-experience')[:10]
-        for i, user in enumerate(leaderboard_users):
-            user.display_rank = i + 1
+        leaderboard_users = leaderboard.top_users(10)
             
     elif view_type == 'user_position':
         leaderboard_users = get_surrounding_leaderboard_users(request)
@@ -281,6 +293,85 @@ def leaderboard_page(request, view_type):
     }
     return render(request, 'base/leaderboard.html', context)
 
+@login_required(login_url='login_page')
+@require_GET
+def leaderboard_api(request):
+    """Leaderboard page in JSON, navigated with keyset cursors over (-experience, id).
+
+    Every page is fetched with an index range scan starting at the cursor,
+    so page N costs the same as page 1. Cursors carry the rank of the row
+    they point at, so ranks follow the rows read here.
+    """
+    try:
+        cursor = decode_leaderboard_cursor(request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    ranked_users = User.objects.filter(experience__gt=0).only(
+        'id', 'username', 'avatar', 'avatar_hash', 'level', 'experience', 'days_streak'
+    )
+
+    if cursor is None:
+        page = list(ranked_users.order_by('-experience', 'id')[:LEADERBOARD_PAGE_SIZE + 1])
+        has_before, has_after = False, len(page) > LEADERBOARD_PAGE_SIZE
+        page = page[:LEADERBOARD_PAGE_SIZE]
+        first_rank = 1
+    elif cursor['direction'] == 'next':
+        # Users ranked after the cursor
+        page = list(ranked_users.filter(
+            models.Q(experience__lt=cursor['experience']) |
+            models.Q(experience=cursor['experience'], id__gt=cursor['id'])
+        ).order_by('-experience', 'id')[:LEADERBOARD_PAGE_SIZE + 1])
+        has_before, has_after = True, len(page) > LEADERBOARD_PAGE_SIZE
+        page = page[:LEADERBOARD_PAGE_SIZE]
+        first_rank = cursor['rank'] + 1
+    else:
+        # Users ranked before the cursor, walked backwards and flipped
+        page = list(ranked_users.filter(
+            models.Q(experience__gt=cursor['experience']) |
+            models.Q(experience=cursor['experience'], id__lt=cursor['id'])
+        ).order_by('experience', '-id')[:LEADERBOARD_PAGE_SIZE + 1])
+        has_before, has_after = len(page) > LEADERBOARD_PAGE_SIZE, True
+        page = page[:LEADERBOARD_PAGE_SIZE][::-1]
+        first_rank = max(1, cursor['rank'] - len(page))
+
+    users = []
+    for i, user in enumerate(page):
+        users.append({
+            'id': user.id,
+            'username': user.username,
+            'avatar_url': user_avatar_url(user, 'small'),
+            'level': user.level,
+            'experience': user.experience,
+            'days_streak': user.days_streak,
+            'rank': first_rank + i,
+            'is_current_user': user.id == request.user.id,
+        })
+
+    return JsonResponse({
+        'users': users,
+        'page_size': LEADERBOARD_PAGE_SIZE,
+        'next_cursor': encode_leaderboard_cursor(page[-1], first_rank + len(page) - 1, 'next') if page and has_after else None,
+        'prev_cursor': encode_leaderboard_cursor(page[0], first_rank, 'prev') if page and has_before else None,
+    })
+
+def encode_leaderboard_cursor(user, rank, direction):
+    cursor = json.dumps({'e': user.experience, 'i': user.id, 'r': rank, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+def decode_leaderboard_cursor(cursor):
+    """Opaque cursor -> dict with experience, id, rank and direction, None for the first page"""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        decoded = {'experience': int(data['e']), 'id': int(data['i']), 'rank': int(data['r']), 'direction': data['d']}
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid leaderboard cursor')
+    if decoded['direction'] not in ('next', 'prev') or decoded['rank'] < 1:
+        raise ValueError('Invalid leaderboard cursor')
+    return decoded
+
 def get_user_level_name(level):
     if level >= 25:
         return "El Campeón"
@@ -302,44 +393,8 @@ def get_surrounding_leaderboard_users(request, only_user_position=False):
             return None
         return []
     
-    user_rank = User.objects.filter(experience__gt=request.user.experience).count() + 1
-    
     if only_user_position:
-        return user_rank
-    
-    # Get all users with experience > 0, ordered by experience (descending) then by id for tie-breaking
-    all_users = User.objects.filter(experience__gt=0).order_by('-experience', 'id')
-    user_list = list(all_users)
+        return leaderboard.user_rank(request.user)
     
-    # Find current user's index in the list
-    user_index = None
-    for i, user in enumerate(user_list):
-        if user.id == request.user.id:
-            user_index = i
-            break
-    
-    if user_index is None:
-        return []
-    
-    # Calculate start and end indices to get 10 users centered around current user
-    total_users = len(user_list)
-    start_index = max(0, user_index - 5)
-    end_index = min(total_users, user_index + 5)
-    
-    # Adjust to get 10 users 
-    if end_index - start_index < 10:
-        if start_index == 0:
-            # User is near the top, extend downward
-            end_index = min(total_users, start_index + 10)
-        elif end_index == total_users:
-            # User is near the bottom, extend upward
-            start_index = max(0, end_index - 10)
-    
-    leaderboard_users = user_list[start_index:end_index]
-    
-    # Display ranks
-    for i, user in enumerate(leaderboard_users):
-        user.display_rank = start_index + i + 1
-            
-    return leaderboard_users
-
+    # 10 users centered around current user, with display ranks
+    return leaderboard.surrounding_users(request.user, size=10)
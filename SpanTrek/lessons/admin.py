@@ -36,4 +36,10 @@ class SentenceAdmin(admin.ModelAdmin):
 @admin.register(Audio)
 class AudioAdmin(admin.ModelAdmin):
     list_display = ['text', 'audio_url']
-    search_fields = ['text']
\ No newline at end of file
+    search_fields = ['text']
+
+@admin.register(CatalogueStats)
+class CatalogueStatsAdmin(admin.ModelAdmin):
+    list_display = ['scope', 'key', 'lessons', 'vocabularies', 'sentences', 'audios', 'use_of_spanish', 'updated_at']
+    list_filter = ['scope']
+    search_fields = ['key']
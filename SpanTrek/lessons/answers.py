@@ -0,0 +1,145 @@
+"""
+Server-side checking of lesson exercise answers
+
+Exercises in lesson_sequence follow the convention of IMPORTANT.txt: correct
+answers are written in UPPER case, everything else in lower case, and match
+pairs share their "1_", "2_"... prefix. compile_answer_key() turns a whole
+sequence into an answer key when the lesson is imported, with expected texts
+already normalized, so checking an answer only normalizes the user's text
+and compares. Comparison ignores case, accents and the punctuation the
+exercise scripts ignore (normalize.js).
+"""
+import re
+
+from .normalize import SPANISH_TO_ENGLISH
+
+# Punctuation ignored anywhere in answers, trailing sentence punctuation is dropped separately
+IGNORED_CHARACTERS = str.maketrans('', '', '¿¡,')
+TRAILING_PUNCTUATION = re.compile(r'[.!?]+$')
+WHITESPACE = re.compile(r'\s+')
+HAS_LATIN_UPPER = re.compile(r'[A-Z]')
+
+
+def normalize_answer(text):
+    """Text as compared, e.g. "¿Cómo  estás?" -> "como estas" """
+    normalized = str(text).translate(SPANISH_TO_ENGLISH).translate(IGNORED_CHARACTERS).lower().strip()
+    normalized = TRAILING_PUNCTUATION.sub('', normalized)
+    return WHITESPACE.sub(' ', normalized).strip()
+
+
+def is_marked_correct(choice):
+    """UPPER case choice, same rule as single_choice.js and multiple_choice.js"""
+    choice = choice.strip()
+    return choice == choice.upper() and len(choice) > 1 and bool(HAS_LATIN_UPPER.search(choice))
+
+
+def _compile_fill_blank(content):
+    # Blocks the template renders as inputs (block == block|upper)
+    return {'blanks': [normalize_answer(block) for block in content if block == block.upper()]}
+
+
+def _compile_input_field(content):
+    return {'answer': normalize_answer(content[1])}
+
+
+def _compile_single_choice(content):
+    correct = [index for index, choice in enumerate(content[1:]) if is_marked_correct(choice)]
+    # single_choice.js treats the last choice as correct when none is marked
+    return {'correct': correct or [len(content) - 2]}
+
+
+def _compile_multiple_choice(content):
+    return {'correct': [index for index, choice in enumerate(content[1:]) if is_marked_correct(choice)]}
+
+
+def _compile_match(content):
+    # The first character names the pair (match.html), items can be matched across or within columns (match.js)
+    return {'pairs': [item[:1] for item in content]}
+
+
+COMPILERS = {
+    'fill_blank': _compile_fill_blank,
+    'input_field': _compile_input_field,
+    'translate_input_field': _compile_input_field,
+    'single_choice': _compile_single_choice,
+    'multiple_choice': _compile_multiple_choice,
+    'match': _compile_match,
+}
+
+
+def compile_answer_key(lesson_sequence):
+    """Answer key per step of lesson_sequence, None for steps without an answer"""
+    answer_key = []
+    for item in lesson_sequence or []:
+        compiler = COMPILERS.get(item.get('type')) if isinstance(item, dict) else None
+        content = item.get('content') if compiler else None
+        if compiler and isinstance(content, list) and len(content) >= 2:
+            answer_key.append({'type': item['type'], **compiler(content)})
+        else:
+            answer_key.append(None)
+    return answer_key
+
+
+def _is_index(value):
+    # bool is an int subclass, True must not select choice 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_fill_blank(key, answer):
+    """answer: texts of the blanks in order"""
+    if not isinstance(answer, list) or len(answer) != len(key['blanks']):
+        return False
+    if not all(isinstance(text, str) for text in answer):
+        return False
+    return all(normalize_answer(text) == expected for text, expected in zip(answer, key['blanks']))
+
+
+def _check_input_field(key, answer):
+    """answer: text typed in the field"""
+    return isinstance(answer, str) and normalize_answer(answer) == key['answer']
+
+
+def _check_single_choice(key, answer):
+    """answer: 0-based index of the selected choice"""
+    return _is_index(answer) and answer in key['correct']
+
+
+def _check_multiple_choice(key, answer):
+    """answer: 0-based indexes of all selected choices"""
+    if not isinstance(answer, list) or not all(_is_index(index) for index in answer):
+        return False
+    return len(answer) == len(key['correct']) and set(answer) == set(key['correct'])
+
+
+def _check_match(key, answer):
+    """answer: [position, position] pairs of content positions, every item matched once"""
+    pairs = key['pairs']
+    if not isinstance(answer, list) or len(answer) * 2 != len(pairs):
+        return False
+
+    used = set()
+    for pair in answer:
+        if not (isinstance(pair, list) and len(pair) == 2 and all(_is_index(position) for position in pair)):
+            return False
+        first, second = pair
+        if not (0 <= first < len(pairs) and 0 <= second < len(pairs)) or first == second:
+            return False
+        if pairs[first] != pairs[second] or first in used or second in used:
+            return False
+        used.update(pair)
+    return True
+
+
+CHECKERS = {
+    'fill_blank': _check_fill_blank,
+    'input_field': _check_input_field,
+    'translate_input_field': _check_input_field,
+    'single_choice': _check_single_choice,
+    'multiple_choice': _check_multiple_choice,
+    'match': _check_match,
+}
+
+
+def check_answer(key, answer):
+    """Whether answer is correct for a compiled exercise key, answers of a wrong shape are just incorrect"""
+    return CHECKERS[key['type']](key, answer)
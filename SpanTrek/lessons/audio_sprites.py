@@ -0,0 +1,178 @@
+"""
+Audio sprites, all clips of a lesson concatenated into one MP3 file
+
+MP3 is a stream of self-contained frames, so clips with the same sample rate
+and channel mode can be joined frame by frame without re-encoding. A short run
+of silent frames separates clips, so a player stopping on timeupdate doesn't
+bleed into the next clip. Every sprite comes with an offset map
+{audio url: [start, duration]} in seconds.
+
+Lower bitrate variants are joined the same way from clips encoded one by one,
+with offsets measured on their own frames, as encoder delay and padding make
+every clip of a variant a little longer than the original.
+
+Built by the build_audio_sprites command into static/audio/sprites:
+- lesson_<id>.<hash>.mp3 (and lesson_<id>.<hash>.<bitrate>k.mp3 variants)
+- lesson_<id>.json with the URL and offset map of every variant
+- manifest.json with lesson maps
+
+Only lessons with several clips get a sprite, a single clip is played from
+its own file.
+"""
+from functools import lru_cache
+import json
+import os
+
+from django.conf import settings
+
+SPRITES_DIR_NAME = 'sprites'
+MANIFEST_NAME = 'manifest.json'
+GAP_SECONDS = 0.3
+
+# kbps by [version is MPEG-1][bitrate index], Layer III only
+BITRATES = {
+    True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def audio_dir():
+    return os.path.join(settings.BASE_DIR, 'static', 'audio')
+
+
+def sprites_dir():
+    return os.path.join(audio_dir(), SPRITES_DIR_NAME)
+
+
+def sprites_url():
+    # URL of sprites_dir()
+    return f'{settings.STATIC_URL.rstrip("/")}/audio/{SPRITES_DIR_NAME}/'
+
+
+def parse_frame_header(header):
+    """(frame length, samples, sample rate, channel mode) of a Layer III frame header, None if it isn't one"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[mpeg1][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    samples = 1152 if mpeg1 else 576
+    length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples, sample_rate, header[3] >> 6
+
+
+def mp3_frames(data):
+    """Audio frames of MP3 data as (bytes, samples, sample rate, channel mode), tags and VBR info frames skipped"""
+    position = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        # ID3v2 size is stored as 4 bytes of 7 bits
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        position = 10 + size
+
+    frames = []
+    while position + 4 <= len(data):
+        header = parse_frame_header(data[position:position + 4])
+        if header is None:
+            # ID3v1 tag or garbage at the end
+            break
+        length, samples, sample_rate, channel_mode = header
+        frame = data[position:position + length]
+        if len(frame) < length:
+            break
+        # Xing/Info/VBRI frames describe the whole file, they would be wrong inside a sprite
+        if not any(tag in frame[:64] for tag in (b'Xing', b'Info', b'VBRI')):
+            frames.append((frame, samples, sample_rate, channel_mode))
+        position += length
+    return frames
+
+
+def silent_frame(frame):
+    """Frame with the same format as given one and zeroed audio data"""
+    header = bytearray(frame[:4])
+    header[2] &= 0xFD  # No padding
+    length = parse_frame_header(header)[0]
+    return bytes(header) + bytes(length - 4)
+
+
+def build_sprite(clips, gap_seconds=GAP_SECONDS):
+    """Concatenate [(audio url, mp3 data)], returns (sprite data, {url: [start, duration]}, skipped urls)
+
+    Clips whose sample rate or channel mode differ from the first clip can't be joined and are skipped.
+    """
+    sprite = bytearray()
+    offsets = {}
+    skipped = []
+    audio_format = None
+    gap = b''
+    gap_frames = 0
+    elapsed_samples = 0
+
+    for audio_url, data in clips:
+        frames = mp3_frames(data)
+        if not frames:
+            skipped.append(audio_url)
+            continue
+        clip_format = frames[0][2:]
+        if audio_format is None:
+            audio_format = clip_format
+            gap = silent_frame(frames[0][0])
+            gap_frames = max(1, round(gap_seconds * clip_format[0] / frames[0][1]))
+        if any(frame[2:] != audio_format for frame in frames):
+            skipped.append(audio_url)
+            continue
+
+        if offsets:
+            sprite += gap * gap_frames
+            elapsed_samples += gap_frames * frames[0][1]
+
+        clip_samples = sum(samples for _, samples, _, _ in frames)
+        sample_rate = audio_format[0]
+        offsets[audio_url] = [round(elapsed_samples / sample_rate, 4), round(clip_samples / sample_rate, 4)]
+        for frame, _, _, _ in frames:
+            sprite += frame
+        elapsed_samples += clip_samples
+
+    return bytes(sprite), offsets, skipped
+
+
+@lru_cache(maxsize=1)
+def _load_manifest(mtime):
+    with open(os.path.join(sprites_dir(), MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=256)
+def _load_lesson_map(map_name, mtime):
+    with open(os.path.join(sprites_dir(), map_name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_manifest():
+    """Sprites manifest, reloaded when the file changes, None if sprites weren't built"""
+    try:
+        mtime = os.path.getmtime(os.path.join(sprites_dir(), MANIFEST_NAME))
+    except OSError:
+        return None
+    return _load_manifest(mtime)
+
+
+def lesson_sprite(lesson_id):
+    """Sprite variants of a lesson {name: {'url', 'clips'}}, None if it has no sprite"""
+    manifest = load_manifest()
+    map_name = manifest and manifest['lessons'].get(str(lesson_id))
+    if not map_name:
+        return None
+    try:
+        mtime = os.path.getmtime(os.path.join(sprites_dir(), map_name))
+    except OSError:
+        return None
+    return _load_lesson_map(map_name, mtime)['variants']
@@ -0,0 +1,104 @@
+"""
+Responsive variants of lesson images
+
+build_responsive_images resizes the raster lesson images of static/images to fixed
+widths in modern formats and records them in static/images/responsive/manifest.json:
+{source url: {'hash', 'width', 'height', 'variants': {format: [[width, url], ...]}}}.
+Variant names carry a hash of the source, so browsers can cache them forever
+and a changed source gets new URLs. The responsive_image template tag writes
+a <picture> with srcset from the manifest and falls back to the source file.
+"""
+from functools import lru_cache
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+
+RESPONSIVE_DIR_NAME = 'responsive'
+# Directories of static/images that lesson content never shows, generated variants and profile avatars
+EXCLUDED_DIR_NAMES = (RESPONSIVE_DIR_NAME, 'avatars')
+MANIFEST_NAME = 'manifest.json'
+RESPONSIVE_WIDTHS = (320, 480, 960)
+# Preferred format first, browsers take the first <source> they support
+IMAGE_FORMATS = ('avif', 'webp')
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+QUALITY = {'avif': 60, 'webp': 80}
+
+
+def images_dir():
+    return os.path.join(settings.BASE_DIR, 'static', 'images')
+
+
+def responsive_dir():
+    return os.path.join(images_dir(), RESPONSIVE_DIR_NAME)
+
+
+def discover_images(root=None):
+    """Relative paths of source images, generated variants and avatars excluded"""
+    root = root or images_dir()
+    paths = []
+    for directory, dir_names, file_names in os.walk(root):
+        if directory == root:
+            dir_names[:] = [name for name in dir_names if name not in EXCLUDED_DIR_NAMES]
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(SOURCE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(directory, file_name), root).replace(os.sep, '/'))
+    return paths
+
+
+def variant_widths(source_width, widths=RESPONSIVE_WIDTHS):
+    """Widths not larger than the source, the source width itself if it is smaller than all of them"""
+    return [width for width in widths if width <= source_width] or [source_width]
+
+
+def build_variants(source_path, relative_path, output_dir, widths=RESPONSIVE_WIDTHS, formats=IMAGE_FORMATS):
+    """Write all variants of one image, returns its manifest entry. Runs in worker processes"""
+    # Imported here, Pillow is only needed by the build step
+    from PIL import Image, ImageOps
+
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    source_hash = hashlib.sha256(data).hexdigest()[:12]
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    stem = os.path.splitext(relative_path)[0]
+    url_prefix = f'{settings.STATIC_URL.rstrip("/")}/images/{RESPONSIVE_DIR_NAME}/'
+
+    variants = {image_format: [] for image_format in formats}
+    for width in variant_widths(image.width, widths):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for image_format in formats:
+            name = f'{stem}.{width}.{source_hash}.{image_format}'
+            path = os.path.join(output_dir, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            resized.save(temp_path, format=image_format.upper(), quality=QUALITY.get(image_format, 80))
+            os.replace(temp_path, path)
+            variants[image_format].append([width, url_prefix + name])
+
+    return {'hash': source_hash, 'width': image.width, 'height': image.height, 'variants': variants}
+
+
+@lru_cache(maxsize=1)
+def _load_manifest(mtime):
+    with open(os.path.join(responsive_dir(), MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_manifest():
+    """Responsive images manifest, reloaded when the file changes, empty if images weren't built"""
+    try:
+        mtime = os.path.getmtime(os.path.join(responsive_dir(), MANIFEST_NAME))
+    except OSError:
+        return {}
+    return _load_manifest(mtime)
+
+
+def image_variants(url):
+    """Manifest entry of an image URL, None if it has no variants"""
+    return load_manifest().get(url)
@@ -0,0 +1,399 @@
+"""
+Bulk lesson importer used by lesson management commands
+
+All landmark files are resolved against the database with one `in` query per
+model, missing rows are created with bulk_create and lesson M2M links are
+written as bulk through rows, everything inside one transaction.
+
+Every landmark file and every lesson is fingerprinted with a hash of its
+canonical JSON form. Fingerprints are stored on Landmark/Lesson, so files
+that didn't change since the last import are skipped without touching the
+lesson tables and only modified lessons of changed files are written.
+
+Landmark files are discovered under landmark_data/<country>/<landmark>.json.
+Parsing and validation don't touch the database, so they can run in a process
+pool before the single write phase.
+"""
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
+import os
+
+from django.db import transaction
+from .answers import compile_answer_key
+from .models import Audio, Country, Landmark, Lesson, Sentence, Vocabulary
+from .normalize import normalize_filename
+from .services import CatalogueService
+
+# Keys of lesson JSON which aren't plain Lesson fields
+RELATION_KEYS = ['vocabularies', 'sentences', 'country', 'landmark']
+REQUIRED_LESSON_KEYS = ['title', 'order', 'country_order', 'country', 'lesson_sequence']
+
+LANDMARK_DATA_DIR = os.path.join(os.path.dirname(__file__), 'landmark_data')
+
+
+def lesson_audios(lesson_data):
+    """(audio_url, text) pairs of audio items in lesson sequence"""
+    audios = []
+    for item in lesson_data.get('lesson_sequence', []):
+        if isinstance(item, dict) and item.get('type') == 'audio':
+            audio_data = item.get('content', [])
+            if len(audio_data) >= 2:
+                # audio_data[0] is the path, audio_data[1] is the text
+                audio_text = audio_data[1]
+                audio_type = 'vocabulary' if '/vocabulary/' in audio_data[0] else 'sentences'
+                # Only audio_url identifies audio, so "me gusta" and "Me gusta" share one Audio
+                audio_url = f'/static/audio/{audio_type}/{normalize_filename(audio_text)}.mp3'
+                audios.append((audio_url, audio_text))
+    return audios
+
+
+def read_landmark_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def discover_landmark_files(data_dir=LANDMARK_DATA_DIR):
+    """[(country, landmark, path)] of every landmark file, sorted by country and landmark"""
+    files = []
+    for country in sorted(os.listdir(data_dir)):
+        country_dir = os.path.join(data_dir, country)
+        if not os.path.isdir(country_dir):
+            continue
+        for file_name in sorted(os.listdir(country_dir)):
+            if file_name.endswith('.json'):
+                files.append((country, file_name[:-len('.json')].lower(), os.path.join(country_dir, file_name)))
+    return files
+
+
+def find_landmark_file(landmark, data_dir=LANDMARK_DATA_DIR):
+    """Path of landmark file in any country directory, None if there is none"""
+    for _, landmark_name, path in discover_landmark_files(data_dir):
+        if landmark_name == landmark:
+            return path
+    return None
+
+
+def lesson_label(index, lesson_data):
+    """Position of lesson in its file and its title when there is one, as used in errors"""
+    if isinstance(lesson_data, dict) and lesson_data.get('title'):
+        return f'Lesson #{index + 1} "{lesson_data["title"]}"'
+    return f'Lesson #{index + 1}'
+
+
+def validate_lessons(country, lessons_data):
+    """List of problems in landmark file content, empty if it can be imported"""
+    if not isinstance(lessons_data, list):
+        return ['File must contain a list of lessons']
+
+    errors = []
+    orders = set()
+    for index, lesson_data in enumerate(lessons_data):
+        label = lesson_label(index, lesson_data)
+        if not isinstance(lesson_data, dict):
+            errors.append(f'{label} is not an object')
+            continue
+        missing = [key for key in REQUIRED_LESSON_KEYS if key not in lesson_data]
+        if missing:
+            errors.append(f'{label} is missing {", ".join(missing)}')
+            continue
+        if not isinstance(lesson_data['order'], int) or not isinstance(lesson_data['country_order'], int):
+            errors.append(f'{label} order and country_order must be integers')
+        elif lesson_data['order'] in orders:
+            errors.append(f'{label} repeats order {lesson_data["order"]}')
+        orders.add(lesson_data['order'])
+        if lesson_data['country'] != country:
+            errors.append(f'{label} belongs to country "{lesson_data["country"]}", not "{country}"')
+        if not isinstance(lesson_data['lesson_sequence'], list):
+            errors.append(f'{label} lesson_sequence must be a list')
+        if any('word' not in vocab for vocab in lesson_data.get('vocabularies', [])):
+            errors.append(f'{label} has vocabulary without word')
+        if any('sentence' not in sentence for sentence in lesson_data.get('sentences', [])):
+            errors.append(f'{label} has sentence without text')
+    return errors
+
+
+def parse_landmark_file(landmark_file):
+    """(country, landmark, lessons data, errors) of a discovered file, runs in worker processes
+
+    Errors start with the file path, so they can be reported as they are.
+    """
+    country, landmark, path = landmark_file
+    try:
+        lessons_data = read_landmark_file(path)
+    except (OSError, ValueError) as e:
+        return country, landmark, None, [f'Cannot read {path}: {e}']
+    return country, landmark, lessons_data, [f'{path}: {error}' for error in validate_lessons(country, lessons_data)]
+
+
+def fingerprint(data):
+    """Hash of canonical JSON form, formatting and key order don't change it"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class ImportStats:
+    """Diff summary of one import, lessons are listed as (landmark, title, order)"""
+    created: list = field(default_factory=list)
+    # (landmark, title, order, changed fields)
+    updated: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    # Landmarks whose file fingerprint didn't change
+    files_imported: list = field(default_factory=list)
+    files_skipped: list = field(default_factory=list)
+    countries_created: int = 0
+    landmarks_created: int = 0
+    vocabularies_created: int = 0
+    sentences_created: int = 0
+    audios_created: int = 0
+    links_added: int = 0
+    links_removed: int = 0
+
+    @property
+    def changed(self):
+        return bool(
+            self.created or self.updated or self.countries_created or self.landmarks_created or self.links_added or self.links_removed
+            or self.vocabularies_created or self.sentences_created or self.audios_created
+        )
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class LessonImporter:
+    """Imports lessons of many landmarks with a fixed number of queries"""
+
+    def __init__(self):
+        self.stats = ImportStats()
+        self._existing_lessons = {}
+
+    def import_landmarks(self, landmarks_data, force=False, create_countries=False):
+        """Import {landmark name: lessons data} in one transaction, returns ImportStats
+
+        Unchanged files and lessons are skipped unless force is set. Landmarks are
+        written in the order of landmarks_data.
+        """
+        with transaction.atomic():
+            landmarks_data, file_hashes = self._changed_files(landmarks_data, force)
+            lessons, landmarks = self._resolve_lessons(landmarks_data, create_countries)
+            lessons = self._changed_lessons(lessons, force)
+            if lessons:
+                # First occurrence of an item decides its defaults, as get_or_create did
+                vocabularies, sentences, audios = {}, {}, {}
+                for _, _, lesson_data, _ in lessons:
+                    for vocab in lesson_data.get('vocabularies', []):
+                        vocabularies.setdefault(vocab['word'], {'translation': vocab.get('translation', '')})
+                    for sentence in lesson_data.get('sentences', []):
+                        sentences.setdefault(sentence['sentence'], {'translation': sentence.get('translation', '')})
+                    for audio_url, audio_text in lesson_audios(lesson_data):
+                        audios.setdefault(audio_url, {'text': audio_text})
+
+                vocabulary_ids = self._resolve_items(Vocabulary, 'word', vocabularies, 'vocabularies_created')
+                sentence_ids = self._resolve_items(Sentence, 'sentence', sentences, 'sentences_created')
+                audio_ids = self._resolve_items(Audio, 'audio_url', audios, 'audios_created')
+
+                lesson_ids = self._write_lessons(lessons)
+                self._write_links(Lesson.vocabularies.through, 'vocabulary_id', {
+                    lesson_ids[key]: [vocabulary_ids[vocab['word']] for vocab in lesson_data.get('vocabularies', [])]
+                    for key, _, lesson_data, _ in lessons
+                })
+                self._write_links(Lesson.sentences.through, 'sentence_id', {
+                    lesson_ids[key]: [sentence_ids[sentence['sentence']] for sentence in lesson_data.get('sentences', [])]
+                    for key, _, lesson_data, _ in lessons
+                })
+                self._write_links(Lesson.audios.through, 'audio_id', {
+                    lesson_ids[key]: [audio_ids[audio_url] for audio_url, _ in lesson_audios(lesson_data)]
+                    for key, _, lesson_data, _ in lessons
+                })
+
+            self._save_file_hashes(landmarks, file_hashes)
+
+        if self.stats.changed:
+            # Bulk writes don't send model signals, so stats are recounted here
+            CatalogueService.rebuild()
+        return self.stats
+
+    def _changed_files(self, landmarks_data, force):
+        """Landmark files whose fingerprint differs from the imported one, and hashes of all files"""
+        file_hashes = {landmark_name: fingerprint(lessons_data) for landmark_name, lessons_data in landmarks_data.items()}
+        imported = set() if force else set(
+            Landmark.objects.filter(name__in=landmarks_data).values_list('name', 'import_hash')
+        )
+
+        changed = {}
+        for landmark_name, lessons_data in landmarks_data.items():
+            if (landmark_name, file_hashes[landmark_name]) in imported:
+                self.stats.files_skipped.append(landmark_name)
+                self.stats.skipped.extend(
+                    (landmark_name, lesson_data.get('title'), lesson_data.get('order')) for lesson_data in lessons_data
+                )
+            else:
+                self.stats.files_imported.append(landmark_name)
+                changed[landmark_name] = lessons_data
+        return changed, file_hashes
+
+    def _save_file_hashes(self, landmarks, file_hashes):
+        """Remember fingerprints of imported files, files with errors are retried next time"""
+        failed = {landmark_name for landmark_name, _ in self.stats.errors}
+        changed_landmarks = []
+        for (_, landmark_name), landmark_obj in landmarks.items():
+            if landmark_name not in failed and landmark_obj.import_hash != file_hashes[landmark_name]:
+                landmark_obj.import_hash = file_hashes[landmark_name]
+                changed_landmarks.append(landmark_obj)
+        Landmark.objects.bulk_update(changed_landmarks, ['import_hash'])
+
+    def _resolve_lessons(self, landmarks_data, create_countries=False):
+        """[((landmark id, order), landmark name, lesson data, lesson hash)] for lessons whose country exists,
+        and {(country id, landmark name): Landmark} of imported landmarks"""
+        country_names = {lesson_data['country'] for lessons_data in landmarks_data.values() for lesson_data in lessons_data}
+        countries = {country.name: country for country in Country.objects.filter(name__in=country_names)}
+        missing_countries = [Country(name=name) for name in sorted(country_names) if name not in countries]
+        if create_countries and missing_countries:
+            Country.objects.bulk_create(missing_countries)
+            self.stats.countries_created = len(missing_countries)
+            countries = {country.name: country for country in Country.objects.filter(name__in=country_names)}
+
+        wanted_landmarks = {}
+        valid_lessons = []
+        for landmark_name, lessons_data in landmarks_data.items():
+            for lesson_data in lessons_data:
+                country_obj = countries.get(lesson_data['country'])
+                if not country_obj:
+                    self.stats.errors.append(
+                        (landmark_name, f'Country "{lesson_data["country"]}" not found. Please create it first.')
+                    )
+                    continue
+                wanted_landmarks[(country_obj.id, landmark_name)] = country_obj
+                valid_lessons.append((country_obj, landmark_name, lesson_data))
+
+        if not valid_lessons:
+            return [], {}
+
+        def load_landmarks():
+            return {
+                (landmark.country_id, landmark.name): landmark
+                for landmark in Landmark.objects.filter(name__in={name for _, name in wanted_landmarks})
+            }
+
+        landmarks = load_landmarks()
+        missing_landmarks = [
+            Landmark(country=country_obj, name=name)
+            for (country_id, name), country_obj in wanted_landmarks.items() if (country_id, name) not in landmarks
+        ]
+        if missing_landmarks:
+            Landmark.objects.bulk_create(missing_landmarks)
+            self.stats.landmarks_created = len(missing_landmarks)
+            landmarks = load_landmarks()
+
+        lessons = []
+        for country_obj, landmark_name, lesson_data in valid_lessons:
+            landmark_obj = landmarks[(country_obj.id, landmark_name)]
+            lesson_hash = fingerprint(lesson_data)
+            lesson_data = {**lesson_data, 'country': country_obj}
+            lessons.append(((landmark_obj.id, lesson_data['order']), landmark_name, lesson_data, lesson_hash))
+        return lessons, {key: landmarks[key] for key in wanted_landmarks}
+
+    def _changed_lessons(self, lessons, force):
+        """Lessons which are new or whose fingerprint changed, existing lessons are kept for writing"""
+        if not lessons:
+            return []
+        self._existing_lessons = self._load_lessons(lessons)
+
+        changed = []
+        for key, landmark_name, lesson_data, lesson_hash in lessons:
+            lesson = self._existing_lessons.get(key)
+            if not force and lesson is not None and lesson.import_hash == lesson_hash:
+                self.stats.skipped.append((landmark_name, lesson.title, lesson.order))
+            else:
+                changed.append((key, landmark_name, lesson_data, lesson_hash))
+        return changed
+
+    @staticmethod
+    def _load_lessons(lessons):
+        landmark_ids = {landmark_id for (landmark_id, _), *_ in lessons}
+        return {
+            (lesson.landmark_id, lesson.order): lesson
+            for lesson in Lesson.objects.filter(landmark_id__in=landmark_ids)
+        }
+
+    def _resolve_items(self, model, key_field, items, stats_field):
+        """{key: id} of items, missing ones are created with given defaults"""
+        def load_ids():
+            ids = {}
+            # Lowest id wins when catalogue already has duplicates
+            for item_id, key in model.objects.filter(**{f'{key_field}__in': items}).order_by('id').values_list('id', key_field):
+                ids.setdefault(key, item_id)
+            return ids
+
+        if not items:
+            return {}
+        ids = load_ids()
+        missing = [model(**{key_field: key}, **defaults) for key, defaults in items.items() if key not in ids]
+        if missing:
+            model.objects.bulk_create(missing)
+            setattr(self.stats, stats_field, len(missing))
+            ids = load_ids()
+        return ids
+
+    def _write_lessons(self, lessons):
+        """Create new and update changed lessons, returns {(landmark id, order): lesson id}"""
+        existing = self._existing_lessons
+        new_lessons = []
+        changed_lessons = []
+        changed_fields = {'import_hash'}
+
+        for key, landmark_name, lesson_data, lesson_hash in lessons:
+            values = {k: v for k, v in lesson_data.items() if k not in RELATION_KEYS}
+            values['answer_key'] = compile_answer_key(values.get('lesson_sequence'))
+            lesson = existing.get(key)
+            if lesson is None:
+                new_lessons.append(
+                    Lesson(landmark_id=key[0], country=lesson_data['country'], import_hash=lesson_hash, **values)
+                )
+                self.stats.created.append((landmark_name, values['title'], values['order']))
+                continue
+
+            lesson_changes = [name for name, value in values.items() if getattr(lesson, name) != value]
+            if lesson.country_id != lesson_data['country'].id:
+                lesson_changes.append('country')
+            for name in lesson_changes:
+                setattr(lesson, name, values[name] if name in values else lesson_data[name])
+
+            if lesson_changes or lesson.import_hash != lesson_hash:
+                lesson.import_hash = lesson_hash
+                changed_lessons.append(lesson)
+                changed_fields.update(lesson_changes)
+            if lesson_changes:
+                self.stats.updated.append((landmark_name, lesson.title, lesson.order, lesson_changes))
+            else:
+                self.stats.skipped.append((landmark_name, lesson.title, lesson.order))
+
+        if new_lessons:
+            Lesson.objects.bulk_create(new_lessons)
+        if changed_lessons:
+            Lesson.objects.bulk_update(changed_lessons, sorted(changed_fields))
+        if new_lessons:
+            existing = self._load_lessons(lessons)
+        return {key: existing[key].id for key, *_ in lessons}
+
+    def _write_links(self, through, item_field, wanted):
+        """Replace M2M links of given lessons, like .set() but in bulk"""
+        existing = {}
+        for link_id, lesson_id, item_id in through.objects.filter(lesson_id__in=wanted).values_list('id', 'lesson_id', item_field):
+            existing[(lesson_id, item_id)] = link_id
+
+        wanted_links = {(lesson_id, item_id) for lesson_id, item_ids in wanted.items() for item_id in item_ids}
+        removed = [link_id for link, link_id in existing.items() if link not in wanted_links]
+        added = [
+            through(lesson_id=lesson_id, **{item_field: item_id})
+            for lesson_id, item_id in wanted_links if (lesson_id, item_id) not in existing
+        ]
+
+        if removed:
+            through.objects.filter(id__in=removed).delete()
+        if added:
+            through.objects.bulk_create(added)
+        self.stats.links_added += len(added)
+        self.stats.links_removed += len(removed)
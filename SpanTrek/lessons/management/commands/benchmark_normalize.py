@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand
+from lessons.importer import discover_landmark_files, lesson_audios, read_landmark_file
+from lessons.models import Audio, Sentence, Vocabulary
+from lessons.normalize import normalize_filename
+import re
+import timeit
+
+
+def legacy_normalize_filename(text):
+    """Chained str.replace implementation used before lessons/normalize.py, kept as reference"""
+    spanish_to_english = {
+        'á': 'a', 'à': 'a', 'ä': 'a', 'â': 'a',
+        'é': 'e', 'è': 'e', 'ë': 'e', 'ê': 'e',
+        'í': 'i', 'ì': 'i', 'ï': 'i', 'î': 'i',
+        'ó': 'o', 'ò': 'o', 'ö': 'o', 'ô': 'o',
+        'ú': 'u', 'ù': 'u', 'ü': 'u', 'û': 'u',
+        'ñ': 'n',
+        'ç': 'c',
+        'Á': 'A', 'À': 'A', 'Ä': 'A', 'Â': 'A',
+        'É': 'E', 'È': 'E', 'Ë': 'E', 'Ê': 'E',
+        'Í': 'I', 'Ì': 'I', 'Ï': 'I', 'Î': 'I',
+        'Ó': 'O', 'Ò': 'O', 'Ö': 'O', 'Ô': 'O',
+        'Ú': 'U', 'Ù': 'U', 'Ü': 'U', 'Û': 'U',
+        'Ñ': 'N',
+        'Ç': 'C'
+    }
+
+    normalized = text
+    for spanish_char, english_char in spanish_to_english.items():
+        normalized = normalized.replace(spanish_char, english_char)
+
+    normalized = re.sub(r'[^\w\s-]', '', normalized)
+    normalized = re.sub(r'[\s-]+', '_', normalized)
+    normalized = normalized.lower()
+
+    # Remove Spanish articles from the beginning
+    articles = ['el_', 'la_', 'los_', 'las_', 'un_', 'una_', 'unos_', 'unas_']
+    for article in articles:
+        if normalized.startswith(article):
+            normalized = normalized[len(article):]
+            break
+
+    if normalized == 'con':
+        normalized = f'word_{normalized}'
+
+    return normalized
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks audio filename normalization on every text in the catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Number of passes over all texts')
+
+    def handle(self, *args, **options):
+        texts = catalogue_texts()
+        if not texts:
+            self.stdout.write(self.style.WARNING('No texts found'))
+            return
+
+        mismatches = [text for text in texts if normalize_filename(text) != legacy_normalize_filename(text)]
+        for text in mismatches:
+            self.stdout.write(self.style.ERROR(f'Different result for "{text}"'))
+
+        repeat = options['repeat']
+        uncached = normalize_filename.__wrapped__
+        results = [
+            ('legacy str.replace', timeit.timeit(lambda: [legacy_normalize_filename(text) for text in texts], number=repeat)),
+            ('translate table', timeit.timeit(lambda: [uncached(text) for text in texts], number=repeat)),
+            ('translate table, cached', timeit.timeit(lambda: [normalize_filename(text) for text in texts], number=repeat)),
+        ]
+
+        self.stdout.write(f'{len(texts)} texts, {repeat} passes')
+        for name, seconds in results:
+            per_text = seconds / (len(texts) * repeat) * 1e6
+            self.stdout.write(f'{name:<26} {seconds * 1000:8.1f} ms  {per_text:6.2f} us/text  x{results[0][1] / seconds:.1f}')
+
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f'{len(mismatches)} texts normalized differently'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All texts normalized identically'))
+
+
+def catalogue_texts():
+    """Vocabulary, sentence and audio texts from landmark data and database"""
+    texts = set()
+    for _, _, path in discover_landmark_files():
+        for lesson_data in read_landmark_file(path):
+            texts.update(vocab['word'] for vocab in lesson_data.get('vocabularies', []))
+            texts.update(sentence['sentence'] for sentence in lesson_data.get('sentences', []))
+            texts.update(text for _, text in lesson_audios(lesson_data))
+    texts.update(Vocabulary.objects.values_list('word', flat=True))
+    texts.update(Sentence.objects.values_list('sentence', flat=True))
+    texts.update(Audio.objects.values_list('text', flat=True))
+    return sorted(texts)
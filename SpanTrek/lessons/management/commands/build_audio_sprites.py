@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.core.management.base import BaseCommand
+from lessons.audio_sprites import GAP_SECONDS, MANIFEST_NAME, audio_dir, build_sprite, sprites_dir, sprites_url
+from lessons.models import Lesson
+
+
+def write_atomic(path, data):
+    # Written to a temporary file first, so an interrupted run never leaves a broken file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class Command(BaseCommand):
+    help = 'Builds one audio sprite per lesson with an offset map, plus lower bitrate variants when ffmpeg is available'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bitrates', type=str, default='32', help='Comma separated kbps of variants, empty for none')
+        parser.add_argument('--gap', type=float, default=GAP_SECONDS, help='Seconds of silence between clips')
+        parser.add_argument('--force', action='store_true', help='Build again even if sprites are up to date')
+
+    def handle(self, *args, **options):
+        output_dir = sprites_dir()
+        bitrates = [int(bitrate) for bitrate in options['bitrates'].split(',') if bitrate.strip()]
+        os.makedirs(output_dir, exist_ok=True)
+
+        ffmpeg = shutil.which('ffmpeg')
+        if bitrates and not ffmpeg:
+            self.stdout.write(self.style.WARNING('ffmpeg not found, building sprites without bitrate variants'))
+            bitrates = []
+
+        manifest = {'lessons': {}}
+        built_count = 0
+        up_to_date_count = 0
+        keep_files = {MANIFEST_NAME}
+
+        for lesson_id, lesson_sequence in Lesson.objects.order_by('id').values_list('id', 'lesson_sequence'):
+            clip_urls = []
+            for item in lesson_sequence or []:
+                content = item.get('content') if isinstance(item, dict) else None
+                if item.get('type') == 'audio' and content and content[0] not in clip_urls:
+                    clip_urls.append(content[0])
+            # A single clip is played from its own file
+            if len(clip_urls) < 2:
+                continue
+
+            clips = []
+            for audio_url in clip_urls:
+                path = os.path.join(audio_dir(), *audio_url[len('/static/audio/'):].split('/'))
+                try:
+                    with open(path, 'rb') as f:
+                        clips.append((audio_url, f.read()))
+                except FileNotFoundError:
+                    self.stdout.write(self.style.WARNING(f'Lesson {lesson_id}: missing audio file {audio_url}'))
+
+            source = hashlib.sha256(json.dumps([options['gap'], bitrates]).encode())
+            for audio_url, data in clips:
+                source.update(audio_url.encode() + b'\0' + hashlib.sha256(data).digest())
+            source_hash = source.hexdigest()
+
+            map_name = f'lesson_{lesson_id}.json'
+            map_path = os.path.join(output_dir, map_name)
+            sprite_map = self.load_map(map_path)
+            if (not options['force'] and sprite_map and sprite_map.get('source_hash') == source_hash and 'variants' in sprite_map
+                    and all(os.path.exists(os.path.join(output_dir, os.path.basename(variant['url'])))
+                            for variant in sprite_map['variants'].values())):
+                up_to_date_count += 1
+            else:
+                sprite_map = self.build_lesson(lesson_id, clips, source_hash, options['gap'], bitrates, ffmpeg, output_dir)
+                if sprite_map is None:
+                    continue
+                write_atomic(map_path, json.dumps(sprite_map, ensure_ascii=False, indent=2).encode('utf-8'))
+                built_count += 1
+                self.stdout.write(f'Sprite built: lesson {lesson_id} ({len(sprite_map["variants"]["original"]["clips"])} clips)')
+
+            manifest['lessons'][str(lesson_id)] = map_name
+            keep_files.add(map_name)
+            keep_files.update(os.path.basename(variant['url']) for variant in sprite_map['variants'].values())
+
+        write_atomic(os.path.join(output_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+
+        # Sprites of older builds and removed lessons
+        removed_count = 0
+        for file_name in os.listdir(output_dir):
+            if file_name.startswith('lesson_') and file_name not in keep_files:
+                os.remove(os.path.join(output_dir, file_name))
+                removed_count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Audio sprites: {built_count} built, {up_to_date_count} up to date, {removed_count} old files removed'
+        ))
+
+    def load_map(self, map_path):
+        try:
+            with open(map_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def build_lesson(self, lesson_id, clips, source_hash, gap, bitrates, ffmpeg, output_dir):
+        """Write sprite files of a lesson, returns its map or None if no clip could be used"""
+        sprite, offsets, skipped = build_sprite(clips, gap)
+        for audio_url in skipped:
+            self.stdout.write(self.style.WARNING(f'Lesson {lesson_id}: {audio_url} has a different format, not in sprite'))
+        if not offsets:
+            return None
+
+        sprite_hash = hashlib.sha256(sprite).hexdigest()[:12]
+        file_name = f'lesson_{lesson_id}.{sprite_hash}.mp3'
+        write_atomic(os.path.join(output_dir, file_name), sprite)
+        variants = {'original': {'url': sprites_url() + file_name, 'clips': offsets}}
+
+        # Only clips that made it into the original sprite
+        clips = [(audio_url, data) for audio_url, data in clips if audio_url in offsets]
+        for bitrate in bitrates:
+            try:
+                encoded = [(audio_url, self.encode_clip(ffmpeg, data, bitrate)) for audio_url, data in clips]
+            except RuntimeError as e:
+                self.stdout.write(self.style.ERROR(f'Lesson {lesson_id}: {bitrate}k variant failed: {e}'))
+                continue
+
+            # Encoded clips are joined like the original ones, so offsets are measured on the variant frames
+            variant, variant_offsets, skipped = build_sprite(encoded, gap)
+            if skipped:
+                self.stdout.write(self.style.ERROR(f'Lesson {lesson_id}: {bitrate}k variant failed: clips could not be joined'))
+                continue
+            variant_name = f'lesson_{lesson_id}.{sprite_hash}.{bitrate}k.mp3'
+            write_atomic(os.path.join(output_dir, variant_name), variant)
+            variants[f'{bitrate}k'] = {'url': sprites_url() + variant_name, 'clips': variant_offsets}
+
+        return {'lesson': lesson_id, 'source_hash': source_hash, 'variants': variants}
+
+    def encode_clip(self, ffmpeg, data, bitrate):
+        """MP3 data of a clip encoded at given kbps"""
+        result = subprocess.run(
+            [ffmpeg, '-loglevel', 'error', '-f', 'mp3', '-i', 'pipe:0',
+             '-codec:a', 'libmp3lame', '-b:a', f'{bitrate}k', '-write_xing', '0', '-f', 'mp3', 'pipe:1'],
+            input=data, capture_output=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors='replace').strip())
+        return result.stdout
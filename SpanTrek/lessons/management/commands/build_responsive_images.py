@@ -0,0 +1,118 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from lessons.images import (
+    IMAGE_FORMATS, MANIFEST_NAME, RESPONSIVE_WIDTHS, build_variants, discover_images, images_dir, responsive_dir,
+    variant_widths,
+)
+
+
+def build_entry(task):
+    """(url, manifest entry, error) of one image, errors are returned so one broken image doesn't stop the build"""
+    url, source_path, relative_path, output_dir, widths, formats = task
+    try:
+        return url, build_variants(source_path, relative_path, output_dir, widths, formats), None
+    except Exception as e:
+        return url, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Builds resized WebP/AVIF variants of static/images with content-hashed names and a manifest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--widths', type=str, default=','.join(map(str, RESPONSIVE_WIDTHS)), help='Comma separated variant widths')
+        parser.add_argument('--formats', type=str, default=','.join(IMAGE_FORMATS), help='Comma separated formats, preferred first')
+        parser.add_argument('--jobs', type=int, default=1, help='Number of processes encoding images')
+        parser.add_argument('--force', action='store_true', help='Build again even if variants are up to date')
+
+    def handle(self, *args, **options):
+        widths = sorted(int(width) for width in options['widths'].split(',') if width.strip())
+        formats = [image_format.strip().lower() for image_format in options['formats'].split(',') if image_format.strip()]
+        output_dir = responsive_dir()
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        os.makedirs(output_dir, exist_ok=True)
+
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                old_manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            old_manifest = {}
+
+        manifest = {}
+        pending = []
+        for relative_path in discover_images():
+            url = f'/static/images/{relative_path}'
+            source_path = os.path.join(images_dir(), *relative_path.split('/'))
+            entry = old_manifest.get(url)
+            if not options['force'] and self.is_up_to_date(entry, source_path, widths, formats):
+                manifest[url] = entry
+            else:
+                pending.append((url, source_path, relative_path))
+        up_to_date_count = len(manifest)
+
+        tasks = [(url, source_path, relative_path, output_dir, widths, formats) for url, source_path, relative_path in pending]
+        if options['jobs'] > 1:
+            with ProcessPoolExecutor(max_workers=options['jobs']) as executor:
+                results = list(executor.map(build_entry, tasks))
+        else:
+            results = map(build_entry, tasks)
+
+        failed_count = 0
+        for url, entry, error in results:
+            if error:
+                self.stdout.write(self.style.ERROR(f'Error building {url}: {error}'))
+                failed_count += 1
+                continue
+            manifest[url] = entry
+            self.stdout.write(f'Variants built: {url}')
+
+        # Written to a temporary file first, so an interrupted run never leaves a broken manifest
+        fd, temp_path = tempfile.mkstemp(dir=output_dir, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(manifest.items())), f, indent=2)
+        os.replace(temp_path, manifest_path)
+
+        removed_count = self.remove_old_variants(output_dir, manifest)
+        self.stdout.write(self.style.SUCCESS(
+            f'Responsive images: {len(pending) - failed_count} built, {up_to_date_count} up to date, '
+            f'{failed_count} failed, {removed_count} old files removed'
+        ))
+
+    def is_up_to_date(self, entry, source_path, widths, formats):
+        """Same source content and settings as the manifest entry, and all variant files exist"""
+        if not entry:
+            return False
+        with open(source_path, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest()[:12] != entry['hash']:
+                return False
+        if list(entry['variants']) != formats:
+            return False
+        expected_widths = variant_widths(entry['width'], widths)
+        return all(
+            [width for width, _ in variants] == expected_widths
+            and all(os.path.exists(self.variant_path(url)) for _, url in variants)
+            for variants in entry['variants'].values()
+        )
+
+    def variant_path(self, url):
+        relative_path = url.split('/images/', 1)[1]
+        return os.path.join(images_dir(), *relative_path.split('/'))
+
+    def remove_old_variants(self, output_dir, manifest):
+        """Delete variant files no manifest entry refers to, returns their count"""
+        keep_paths = {
+            os.path.normpath(self.variant_path(url))
+            for entry in manifest.values() for variants in entry['variants'].values() for _, url in variants
+        }
+        removed_count = 0
+        for directory, _, file_names in os.walk(output_dir):
+            for file_name in file_names:
+                path = os.path.normpath(os.path.join(directory, file_name))
+                if file_name != MANIFEST_NAME and path not in keep_paths:
+                    os.remove(path)
+                    removed_count += 1
+        return removed_count
@@ -1,61 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor
 from django.core.management.base import BaseCommand
-from django.core.management import call_command
-from io import StringIO
-from contextlib import redirect_stdout
-import re
+from lessons.importer import LessonImporter, discover_landmark_files, parse_landmark_file
 
 class Command(BaseCommand):
-    help = 'Creates all Spanish lessons across Polish cities in the correct learning order'
-
-    def extract_statistics(self, output):
-        """Extract statistics from command output"""
-        created = sum(int(x) for x in re.findall(r'Created: (\d+)', output))
-        updated = sum(int(x) for x in re.findall(r'Updated: (\d+)', output))
-        skipped = sum(int(x) for x in re.findall(r'Skipped: (\d+)', output))
-        return created, updated, skipped
-
-    def handle(self, *args, **kwargs):
-        # The order of cities matches the Spanish learning progression
-        cities = [
-            'szczecin',
-            'poznan',
-            'warsaw'
-        ]
-
-        total_created = 0
-        total_updated = 0
-        total_skipped = 0
-        processed_cities = 0
-
-        for landmark in cities:
-            self.stdout.write(f'\nProcessing Spanish lessons for {landmark.title()}...')
-            try:
-                output = StringIO()
-                with redirect_stdout(output):
-                    call_command('create_landmark_lessons', landmark)
-                
-                output_str = output.getvalue()
-                self.stdout.write(output_str)
-                
-                created, updated, skipped = self.extract_statistics(output_str)
-                total_created += created
-                total_updated += updated
-                total_skipped += skipped
-                processed_cities += 1
-
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error processing lessons for {landmark}: {str(e)}')
-                )
-                raise
+    help = 'Creates all Spanish lessons from landmark data of every country in the correct learning order'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Import lessons even if their fingerprint is unchanged')
+        parser.add_argument('--jobs', type=int, default=1, help='Number of processes parsing landmark files')
+
+    def handle(self, *args, **options):
+        landmark_files = discover_landmark_files()
+        if not landmark_files:
+            self.stdout.write(self.style.WARNING('No landmark data found'))
+            return
+
+        # Parse and validate every file before anything is written
+        if options['jobs'] > 1:
+            with ProcessPoolExecutor(max_workers=options['jobs']) as executor:
+                parsed_files = list(executor.map(parse_landmark_file, landmark_files))
+        else:
+            parsed_files = list(map(parse_landmark_file, landmark_files))
+
+        valid_files = []
+        seen_landmarks = {}
+        for (_, _, path), (country, landmark, lessons_data, errors) in zip(landmark_files, parsed_files):
+            # Progress and lesson URLs use landmark names only, so they must be unique
+            if landmark in seen_landmarks:
+                errors = errors + [f'{path}: landmark name already used in {seen_landmarks[landmark]}']
+            if errors:
+                for error in errors:
+                    self.stdout.write(self.style.ERROR(error))
+                continue
+            seen_landmarks[landmark] = country
+            valid_files.append((country, landmark, lessons_data))
+
+        # The order of landmarks within country matches the Spanish learning progression
+        valid_files.sort(key=lambda landmark_file: (
+            landmark_file[0], min((lesson['country_order'] for lesson in landmark_file[2]), default=0), landmark_file[1]
+        ))
+        landmarks_data = {landmark: lessons_data for _, landmark, lessons_data in valid_files}
+
+        try:
+            stats = LessonImporter().import_landmarks(landmarks_data, force=options['force'], create_countries=True)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error importing lessons: {str(e)}'))
+            raise
+
+        for landmark, error in stats.errors:
+            self.stdout.write(self.style.ERROR(f'{landmark.title()}: {error}'))
+        for landmark in stats.files_skipped:
+            self.stdout.write(f'{landmark.title()}: unchanged since last import')
+        for landmark, title, order in stats.created:
+            self.stdout.write(self.style.SUCCESS(f'{landmark.title()}: created lesson {title} (Order: {order})'))
+        for landmark, title, order, changed_fields in stats.updated:
+            self.stdout.write(
+                self.style.WARNING(f'{landmark.title()}: updated lesson {title} (Order: {order}) - {", ".join(changed_fields)}')
+            )
 
         # Print summary
         self.stdout.write('\n' + '='*50)
         self.stdout.write(self.style.SUCCESS('Overall Lesson Import Summary:'))
-        self.stdout.write(f'Cities processed: {processed_cities}')
-        self.stdout.write(self.style.SUCCESS(f'Total lessons created: {total_created}'))
-        self.stdout.write(self.style.WARNING(f'Total lessons updated: {total_updated}'))
-        self.stdout.write(f'Total lessons skipped: {total_skipped}')
+        self.stdout.write(f'Countries: {len({country for country, _, _ in valid_files})} (created: {stats.countries_created})')
+        self.stdout.write(f'Landmarks processed: {len(stats.files_imported)} (unchanged: {len(stats.files_skipped)}, '
+                          f'invalid: {len(parsed_files) - len(valid_files)})')
+        self.stdout.write(self.style.SUCCESS(f'Total lessons created: {len(stats.created)}'))
+        self.stdout.write(self.style.WARNING(f'Total lessons updated: {len(stats.updated)}'))
+        self.stdout.write(f'Total lessons skipped: {len(stats.skipped)}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Total lessons processed: {len(stats.created) + len(stats.updated) + len(stats.skipped)}')
+        )
         self.stdout.write(
-            self.style.SUCCESS(f'Total lessons processed: {total_created + total_updated + total_skipped}')
-        )
\ No newline at end of file
+            f'New vocabularies: {stats.vocabularies_created}, new sentences: {stats.sentences_created}, '
+            f'new audios: {stats.audios_created}'
+        )
+        self.stdout.write(f'Lesson links added: {stats.links_added}, removed: {stats.links_removed}')
@@ -1,134 +1,99 @@
 #!/usr/bin/env python3
 
-import json
 from django.core.management.base import BaseCommand
-from gtts import gTTS
-import os
-import re
-from lessons.models import Audio, Vocabulary, Sentence
+from lessons.importer import lesson_audios
+from lessons.models import Audio, Lesson, Vocabulary, Sentence
+from lessons.normalize import normalize_filename
+from lessons.services import CatalogueService
+from lessons.tts import AudioJob, ENGINES, SynthesisPipeline, get_engine
 
-def normalize_filename(text):
-    """
-    Convert Spanish characters to English equivalents for filenames
-    """
-    # Dictionary mapping Spanish characters to English equivalents
-    spanish_to_english = {
-        'á': 'a', 'à': 'a', 'ä': 'a', 'â': 'a',
-        'é': 'e', 'è': 'e', 'ë': 'e', 'ê': 'e',
-        'í': 'i', 'ì': 'i', 'ï': 'i', 'î': 'i',
-        'ó': 'o', 'ò': 'o', 'ö': 'o', 'ô': 'o',
-        'ú': 'u', 'ù': 'u', 'ü': 'u', 'û': 'u',
-        'ñ': 'n',
-        'ç': 'c',
-        # Uppercase versions
-        'Á': 'A', 'À': 'A', 'Ä': 'A', 'Â': 'A',
-        'É': 'E', 'È': 'E', 'Ë': 'E', 'Ê': 'E',
-        'Í': 'I', 'Ì': 'I', 'Ï': 'I', 'Î': 'I',
-        'Ó': 'O', 'Ò': 'O', 'Ö': 'O', 'Ô': 'O',
-        'Ú': 'U', 'Ù': 'U', 'Ü': 'U', 'Û': 'U',
-        'Ñ': 'N',
-        'Ç': 'C'
-    }
-    
-    # Replace Spanish characters with English equivalents
-    normalized = text
-    for spanish_char, english_char in spanish_to_english.items():
-        normalized = normalized.replace(spanish_char, english_char)
-    
-    # Replace spaces with underscores and remove special characters
-    # Remove special chars except spaces and hyphens
-    normalized = re.sub(r'[^\w\s-]', '', normalized)  
-    # Replace spaces and hyphens with underscores
-    normalized = re.sub(r'[\s-]+', '_', normalized)   
-    # Convert to lowercase
-    normalized = normalized.lower()                    
-    
-    # Remove Spanish articles from the beginning
-    articles = ['el_', 'la_', 'los_', 'las_', 'un_', 'una_', 'unos_', 'unas_']
-    for article in articles:
-        if normalized.startswith(article):
-            normalized = normalized[len(article):]
-            break
-     
-    # If the filename is a Windows reserved name, add prefix
-    if normalized == 'con':
-        normalized = f'word_{normalized}'
-    
-    return normalized
+AUDIO_SOURCES = ['vocabulary', 'sentences', 'lessons', 'all']
 
-def create_audio_file(text, audio_type):
-    """
-    Create an MP3 file from text using GTTS - Google Text-to-Speech
-    """
-    # Create the TTS object
-    tts = gTTS(text=text, lang='es', slow=False)
-    
-    # Normalize the filename to remove Spanish characters
-    normalized_filename = normalize_filename(text)
-    
-    output_path = os.path.join('static', 'audio', audio_type, f'{normalized_filename}.mp3')
-    
-    tts.save(output_path)
-    print(f"Audio file created: {output_path}")
 
 class Command(BaseCommand):
-    help = 'Creates MP3 audio files from audios.json file'
+    help = 'Creates MP3 audio files for vocabulary, sentences and audio items of lessons'
     
     # Add argument determining source of audio text
     def add_arguments(self, parser):
-        # --audio-from sentences/vocabulary
+        # --audio-from sentences/vocabulary/lessons/all
         parser.add_argument(
             '--audio-from',
             type=str,
-            help='Text to convert to speech (optional, overrides JSON file)'
-        ) 
+            help='Source of texts: vocabulary, sentences, lessons (audio items of lesson sequences) or all'
+        )
+        parser.add_argument('--engine', type=str, choices=list(ENGINES), help='TTS engine (default: TTS_ENGINE setting or gtts)')
+        parser.add_argument('--jobs', type=int, default=4, help='Maximum number of clips synthesized at once')
+        parser.add_argument('--output-dir', type=str, default=None, help='Directory for audio files (default: static/audio)')
+        parser.add_argument('--force', action='store_true', help='Synthesize again even if files are up to date')
     
     def handle(self, *args, **options):
         audio_from = options.get('audio_from')
         
-        if not audio_from or audio_from not in ['vocabulary', 'sentences']:
-            self.stdout.write(self.style.ERROR('Please specify --audio-from with either "vocabulary" or "sentences"'))
+        if not audio_from or audio_from not in AUDIO_SOURCES:
+            self.stdout.write(self.style.ERROR(
+                'Please specify --audio-from with either "vocabulary", "sentences", "lessons" or "all"'
+            ))
             return
     
         try:
-            # Get data from database
-            if audio_from == 'vocabulary':
-                items = Vocabulary.objects.all()
-                self.stdout.write(self.style.SUCCESS(f'Found {items.count()} vocabulary items in database'))
-            elif audio_from == 'sentences':
-                items = Sentence.objects.all()
-                self.stdout.write(self.style.SUCCESS(f'Found {items.count()} sentence items in database'))
-            
-            created_count = 0
-            skipped_count = 0
-            
-            for item in items:
-                # Get the text based on audio_from type
-                if audio_from == 'vocabulary':
-                    text = item.word
-                elif audio_from == 'sentences':
-                    text = item.sentence
-                
-                # Create or get audio object (using audio_url as unique key to avoid duplicates)
-                audio_url = f'/static/audio/{audio_from}/{normalize_filename(text)}.mp3'
-                audio, created = Audio.objects.get_or_create(
-                    audio_url=audio_url,
-                    defaults={'text': text}
-                )
-                
-                if created:
-                    created_count += 1
+            sources = ['vocabulary', 'sentences', 'lessons'] if audio_from == 'all' else [audio_from]
+            jobs = []
+            audio_texts = {}
+
+            for source in sources:
+                if source == 'vocabulary':
+                    texts = list(Vocabulary.objects.values_list('word', flat=True))
+                elif source == 'sentences':
+                    texts = list(Sentence.objects.values_list('sentence', flat=True))
+
+                if source in ('vocabulary', 'sentences'):
+                    self.stdout.write(self.style.SUCCESS(f'Found {len(texts)} {source} items in database'))
+                    for text in texts:
+                        # Normalized once per item, the same name is used for the URL and the file
+                        path = f'{source}/{normalize_filename(text)}.mp3'
+                        audio_texts.setdefault(f'/static/audio/{path}', text)
+                        jobs.append(AudioJob(text=text, path=path))
                 else:
-                    skipped_count += 1
-                
-                if not os.path.exists(os.path.join('static', 'audio', audio_from, f'{normalize_filename(text)}.mp3')):
-                    create_audio_file(text, audio_from)
-            
+                    lessons_count = 0
+                    for lesson_sequence in Lesson.objects.values_list('lesson_sequence', flat=True):
+                        lessons_count += 1
+                        for audio_url, text in lesson_audios({'lesson_sequence': lesson_sequence}):
+                            jobs.append(AudioJob(text=text, path=audio_url[len('/static/audio/'):]))
+                    self.stdout.write(self.style.SUCCESS(f'Found audio items of {lessons_count} lessons in database'))
+
+            created_count, skipped_count = self.create_audio_objects(audio_texts)
+
+            pipeline = SynthesisPipeline(
+                get_engine(options['engine']), output_dir=options['output_dir'], jobs=options['jobs'], force=options['force'],
+            )
+            stats = pipeline.run(
+                jobs, progress=lambda path, source: self.stdout.write(f'Audio file created: {path} ({source})')
+            )
+
+            for path, error in stats.failed:
+                self.stdout.write(self.style.ERROR(f'Error creating {path}: {error}'))
             self.stdout.write(self.style.SUCCESS(
                 f'Audio processing complete: {created_count} created, {skipped_count} already existed'
             ))
+            self.stdout.write(self.style.SUCCESS(
+                f'Audio files: {stats.synthesized} synthesized, {stats.from_cache} from cache, '
+                f'{stats.up_to_date} up to date, {len(stats.failed)} failed'
+            ))
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error processing audio data: {str(e)}')
             )
             raise
+
+    def create_audio_objects(self, audio_texts):
+        """Create missing Audio rows for {audio_url: text}, returns (created, existing) counts"""
+        existing_urls = set(Audio.objects.filter(audio_url__in=audio_texts).values_list('audio_url', flat=True))
+        new_audios = [
+            Audio(audio_url=audio_url, text=text)
+            for audio_url, text in audio_texts.items() if audio_url not in existing_urls
+        ]
+        if new_audios:
+            Audio.objects.bulk_create(new_audios)
+            # Bulk writes don't send model signals
+            CatalogueService.invalidate()
+        return len(audio_texts) - len(existing_urls), len(existing_urls)
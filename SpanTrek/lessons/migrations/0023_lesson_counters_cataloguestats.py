@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_lesson_counters(apps, schema_editor):
+    """Fill denormalized counters of existing lessons, catalogue stats are built on first read"""
+    Lesson = apps.get_model("lessons", "Lesson")
+    lessons = list(
+        Lesson.objects.annotate(
+            vocabularies_total=Count("vocabularies", distinct=True),
+            sentences_total=Count("sentences", distinct=True),
+            audios_total=Count("audios", distinct=True),
+        )
+    )
+    for lesson in lessons:
+        lesson.vocabularies_count = lesson.vocabularies_total
+        lesson.sentences_count = lesson.sentences_total
+        lesson.audios_count = lesson.audios_total
+    Lesson.objects.bulk_update(
+        lessons, ["vocabularies_count", "sentences_count", "audios_count"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lessons", "0022_lesson_country_order"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lesson",
+            name="vocabularies_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="lesson",
+            name="sentences_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="lesson",
+            name="audios_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="CatalogueStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("total", "Total"),
+                            ("country", "Country"),
+                            ("landmark", "Landmark"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.CharField(blank=True, max_length=201)),
+                ("lessons", models.IntegerField(default=0)),
+                ("vocabularies", models.IntegerField(default=0)),
+                ("sentences", models.IntegerField(default=0)),
+                ("audios", models.IntegerField(default=0)),
+                ("use_of_spanish", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Catalogue stats",
+                "unique_together": {("scope", "key")},
+            },
+        ),
+        migrations.RunPython(populate_lesson_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lessons", "0023_lesson_counters_cataloguestats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cataloguestats",
+            name="generation",
+            field=models.IntegerField(default=0),
+        ),
+    ]
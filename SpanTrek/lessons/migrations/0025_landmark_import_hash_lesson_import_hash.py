@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lessons", "0024_cataloguestats_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="landmark",
+            name="import_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="lesson",
+            name="import_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
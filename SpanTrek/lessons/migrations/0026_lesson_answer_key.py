@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lessons", "0025_landmark_import_hash_lesson_import_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lesson",
+            name="answer_key",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
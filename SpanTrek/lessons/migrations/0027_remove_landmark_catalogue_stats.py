@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+def delete_landmark_stats(apps, schema_editor):
+    # Landmark rows are no longer read, the next rebuild doesn't write them
+    CatalogueStats = apps.get_model("lessons", "CatalogueStats")
+    CatalogueStats.objects.filter(scope="landmark").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lessons", "0026_lesson_answer_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_landmark_stats, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="cataloguestats",
+            name="scope",
+            field=models.CharField(
+                choices=[("total", "Total"), ("country", "Country")], max_length=10
+            ),
+        ),
+    ]
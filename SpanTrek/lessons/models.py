@@ -13,6 +13,8 @@ class Landmark(models.Model):
     """Places within countries (e.g., Madrid, Warsaw, Macchu Picchu)"""
     country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='landmarks')
     name = models.CharField(max_length=100)
+    # Fingerprint of the last imported landmark file (see lessons/importer.py)
+    import_hash = models.CharField(max_length=64, blank=True, default='')
 
     class Meta:
         unique_together = ('country', 'name')
@@ -33,6 +35,14 @@ class Lesson(models.Model):
     audios = models.ManyToManyField('Audio', blank=True, related_name='lessons')
     use_of_spanish = models.IntegerField(default=0, help_text="Number of use of Spanish exercises in the lesson")
     lesson_sequence = models.JSONField(default=list, blank=True, help_text="Sequence of content types in the lesson")
+    # Denormalized content counters, rebuilt with catalogue stats (see lessons/services.py)
+    vocabularies_count = models.IntegerField(default=0)
+    sentences_count = models.IntegerField(default=0)
+    audios_count = models.IntegerField(default=0)
+    # Fingerprint of the lesson JSON it was last imported from
+    import_hash = models.CharField(max_length=64, blank=True, default='')
+    # Exercises of lesson_sequence compiled at import (see lessons/answers.py)
+    answer_key = models.JSONField(default=list, blank=True)
 
     class Meta:
         ordering = ['landmark', 'order']
@@ -77,4 +87,32 @@ class Audio(models.Model):
 
     def __str__(self):
         return self.text
-    
+
+
+class CatalogueStats(models.Model):
+    """Snapshot of catalogue content numbers for whole catalogue and countries"""
+    TOTAL = 'total'
+    COUNTRY = 'country'
+    SCOPES = [
+        (TOTAL, 'Total'),
+        (COUNTRY, 'Country'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPES)
+    # Country name or empty for total
+    key = models.CharField(max_length=201, blank=True)
+    lessons = models.IntegerField(default=0)
+    vocabularies = models.IntegerField(default=0)
+    sentences = models.IntegerField(default=0)
+    audios = models.IntegerField(default=0)
+    use_of_spanish = models.IntegerField(default=0)
+    # Import generation, bumped on every rebuild so cached lessons can tell they are outdated
+    generation = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Catalogue stats"
+        unique_together = ('scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope} {self.key}".strip()
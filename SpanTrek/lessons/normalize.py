@@ -0,0 +1,48 @@
+"""
+Filename normalization shared by audio generation and lesson import
+
+Audio URLs are built from the spoken text, so every place that creates or
+looks up an audio file has to produce exactly the same name.
+"""
+from functools import lru_cache
+import re
+
+# Spanish characters and their English equivalents
+SPANISH_TO_ENGLISH = str.maketrans({
+    'á': 'a', 'à': 'a', 'ä': 'a', 'â': 'a',
+    'é': 'e', 'è': 'e', 'ë': 'e', 'ê': 'e',
+    'í': 'i', 'ì': 'i', 'ï': 'i', 'î': 'i',
+    'ó': 'o', 'ò': 'o', 'ö': 'o', 'ô': 'o',
+    'ú': 'u', 'ù': 'u', 'ü': 'u', 'û': 'u',
+    'ñ': 'n',
+    'ç': 'c',
+    'Á': 'A', 'À': 'A', 'Ä': 'A', 'Â': 'A',
+    'É': 'E', 'È': 'E', 'Ë': 'E', 'Ê': 'E',
+    'Í': 'I', 'Ì': 'I', 'Ï': 'I', 'Î': 'I',
+    'Ó': 'O', 'Ò': 'O', 'Ö': 'O', 'Ô': 'O',
+    'Ú': 'U', 'Ù': 'U', 'Ü': 'U', 'Û': 'U',
+    'Ñ': 'N',
+    'Ç': 'C',
+})
+
+SPECIAL_CHARACTERS = re.compile(r'[^\w\s-]')
+SEPARATORS = re.compile(r'[\s-]+')
+# Spanish articles at the beginning of the name
+LEADING_ARTICLE = re.compile(r'^(?:el|la|los|las|un|una|unos|unas)_')
+
+
+@lru_cache(maxsize=4096)
+def normalize_filename(text):
+    """
+    Convert Spanish characters to English equivalents for filenames
+    """
+    normalized = text.translate(SPANISH_TO_ENGLISH)
+    normalized = SPECIAL_CHARACTERS.sub('', normalized)
+    normalized = SEPARATORS.sub('_', normalized).lower()
+    normalized = LEADING_ARTICLE.sub('', normalized, count=1)
+
+    # If the filename is a Windows reserved name, add prefix
+    if normalized == 'con':
+        normalized = f'word_{normalized}'
+
+    return normalized
@@ -0,0 +1,265 @@
+"""
+Catalogue services for content that only changes on lesson import
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+from threading import Lock
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from .answers import check_answer, compile_answer_key
+from .models import Audio, CatalogueStats, Country, Lesson, Sentence, Vocabulary
+
+CATALOGUE_STATS_CACHE_KEY = 'lessons:catalogue_stats'
+CATALOGUE_STALE_CACHE_KEY = 'lessons:catalogue_stats_stale'
+
+STATS_FIELDS = ('lessons', 'vocabularies', 'sentences', 'audios', 'use_of_spanish')
+
+
+class CatalogueSnapshot:
+    """Read-only catalogue numbers, every lookup returns a dict with STATS_FIELDS keys"""
+
+    def __init__(self, stats, generation=0, updated_at=None):
+        self._stats = stats
+        self.generation = generation
+        self.updated_at = updated_at
+
+    @staticmethod
+    def _empty():
+        return dict.fromkeys(STATS_FIELDS, 0)
+
+    @property
+    def total(self):
+        return self._stats.get((CatalogueStats.TOTAL, ''), self._empty())
+
+    def country(self, country_name):
+        return self._stats.get((CatalogueStats.COUNTRY, country_name.lower()), self._empty())
+
+
+class CatalogueService:
+    """Service class to build and read the catalogue stats snapshot"""
+
+    @staticmethod
+    def get_stats():
+        """Catalogue snapshot with one cache lookup, rebuilt after catalogue changes"""
+        cached = cache.get(CATALOGUE_STATS_CACHE_KEY)
+        if cached is None:
+            if cache.get(CATALOGUE_STALE_CACHE_KEY) or not CatalogueStats.objects.exists():
+                return CatalogueService.rebuild()
+            stats = {}
+            generation, updated_at = 0, None
+            for row in CatalogueStats.objects.values('scope', 'key', 'generation', 'updated_at', *STATS_FIELDS):
+                stats[(row['scope'], row['key'])] = {field: row[field] for field in STATS_FIELDS}
+                generation = max(generation, row['generation'])
+                updated_at = max(updated_at or row['updated_at'], row['updated_at'])
+            cached = (stats, generation, updated_at)
+            cache.set(CATALOGUE_STATS_CACHE_KEY, cached, CatalogueService.cache_timeout())
+        return CatalogueSnapshot(*cached)
+
+    @staticmethod
+    def cache_timeout():
+        # Other processes pick up rebuilt stats after this many seconds with a local memory cache
+        return getattr(settings, 'CATALOGUE_STATS_CACHE_TIMEOUT', 300)
+
+    @staticmethod
+    def invalidate():
+        """Mark snapshot as outdated, next read rebuilds it
+
+        The flag lives in the default cache. With the local memory cache of
+        settings.py only this process sees it, others keep their snapshot for
+        cache_timeout() and then read the stored rows, which are only recounted
+        by the next rebuild. A shared cache backend (Redis, Memcached) makes
+        every process rebuild.
+        """
+        cache.delete(CATALOGUE_STATS_CACHE_KEY)
+        cache.set(CATALOGUE_STALE_CACHE_KEY, True, None)
+
+    @staticmethod
+    def rebuild():
+        """Recount per-lesson counters and catalogue stats, returns new snapshot"""
+        lessons = list(Lesson.objects.select_related('country').annotate(
+            vocabularies_total=Count('vocabularies', distinct=True),
+            sentences_total=Count('sentences', distinct=True),
+            audios_total=Count('audios', distinct=True),
+        ))
+        changed_lessons = []
+        for lesson in lessons:
+            counters = (lesson.vocabularies_total, lesson.sentences_total, lesson.audios_total)
+            if (lesson.vocabularies_count, lesson.sentences_count, lesson.audios_count) != counters:
+                lesson.vocabularies_count, lesson.sentences_count, lesson.audios_count = counters
+                changed_lessons.append(lesson)
+
+        stats = {
+            (CatalogueStats.TOTAL, ''): {
+                'lessons': len(lessons),
+                'vocabularies': Vocabulary.objects.count(),
+                'sentences': Sentence.objects.count(),
+                'audios': Audio.objects.count(),
+                'use_of_spanish': sum(lesson.use_of_spanish for lesson in lessons),
+            }
+        }
+        for country_name in Country.objects.values_list('name', flat=True):
+            stats[(CatalogueStats.COUNTRY, country_name.lower())] = dict.fromkeys(STATS_FIELDS, 0)
+
+        for lesson in lessons:
+            if lesson.country:
+                key = (CatalogueStats.COUNTRY, lesson.country.name.lower())
+                stats[key]['lessons'] += 1
+                stats[key]['use_of_spanish'] += lesson.use_of_spanish
+
+        # Distinct items per country, items shared by lessons are counted once
+        for model, field in ((Vocabulary, 'vocabularies'), (Sentence, 'sentences'), (Audio, 'audios')):
+            per_country = model.objects.filter(lessons__country__isnull=False).values_list(
+                'lessons__country__name').annotate(total=Count('id', distinct=True)).order_by()
+            for country_name, total in per_country:
+                stats[(CatalogueStats.COUNTRY, country_name.lower())][field] = total
+
+        updated_at = timezone.now()
+        with transaction.atomic():
+            generation = (CatalogueStats.objects.aggregate(last=Max('generation'))['last'] or 0) + 1
+            Lesson.objects.bulk_update(changed_lessons, ['vocabularies_count', 'sentences_count', 'audios_count'])
+            CatalogueStats.objects.all().delete()
+            CatalogueStats.objects.bulk_create([
+                CatalogueStats(scope=scope, key=key, generation=generation, updated_at=updated_at, **values)
+                for (scope, key), values in stats.items()
+            ])
+
+        cache.set(CATALOGUE_STATS_CACHE_KEY, (stats, generation, updated_at), CatalogueService.cache_timeout())
+        cache.delete(CATALOGUE_STALE_CACHE_KEY)
+        return CatalogueSnapshot(stats, generation, updated_at)
+
+
+def freeze(value):
+    """Read-only copy of JSON content, dicts become mapping proxies and lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Plain JSON-serializable copy of frozen content"""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+@dataclass(frozen=True)
+class CompiledLesson:
+    """Immutable lesson with everything exercise pages need, shared by all requests"""
+    id: int
+    title: str
+    order: int
+    landmark_id: int
+    country_id: int
+    use_of_spanish: int
+    sequence: tuple
+    vocabularies: tuple
+    sentences: tuple
+    # Per step, None for steps without an answer (see lessons/answers.py)
+    answer_key: tuple
+    # Hash of the lesson content, used as ETag by the lesson player API
+    content_hash: str
+
+    @classmethod
+    def from_lesson(cls, lesson):
+        sequence = lesson.lesson_sequence or []
+        vocabularies = list(lesson.vocabularies.values('id', 'word', 'translation'))
+        sentences = list(lesson.sentences.values('id', 'sentence', 'translation'))
+        answer_key = lesson.answer_key
+        # Lessons not imported since answer keys were added are compiled here
+        if len(answer_key or []) != len(sequence):
+            answer_key = compile_answer_key(sequence)
+        content = json.dumps(
+            [lesson.id, lesson.title, lesson.use_of_spanish, sequence, vocabularies, sentences], sort_keys=True
+        )
+        return cls(
+            id=lesson.id,
+            title=lesson.title,
+            order=lesson.order,
+            landmark_id=lesson.landmark_id,
+            country_id=lesson.country_id,
+            use_of_spanish=lesson.use_of_spanish,
+            sequence=freeze(sequence),
+            vocabularies=freeze(vocabularies),
+            sentences=freeze(sentences),
+            answer_key=freeze(answer_key),
+            content_hash=hashlib.sha256(content.encode()).hexdigest()[:32],
+        )
+
+    @property
+    def total_exercises(self):
+        return len(self.sequence)
+
+    def exercise(self, exercise_number):
+        """(type, content) of 1-based exercise number"""
+        item = self.sequence[exercise_number - 1]
+        return item.get('type'), item.get('content')
+
+    def check(self, exercise_number, answer):
+        """Whether answer to 1-based exercise number is correct, None if the step has no answer"""
+        key = self.answer_key[exercise_number - 1]
+        return None if key is None else check_answer(key, answer)
+
+    def as_dict(self):
+        """Whole lesson as plain data for the lesson player API"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'order': self.order,
+            'use_of_spanish': self.use_of_spanish,
+            'total_exercises': self.total_exercises,
+            'steps': [{'type': item.get('type'), 'content': thaw(item.get('content'))} for item in self.sequence],
+            'vocabularies': thaw(self.vocabularies),
+            'sentences': thaw(self.sentences),
+        }
+
+
+class CompiledLessonCache:
+    """Process-wide LRU of compiled lessons keyed by (landmark, order), dropped on new import generation"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._lessons = OrderedDict()
+
+    def _max_size(self):
+        return getattr(settings, 'COMPILED_LESSONS_CACHE_SIZE', 256)
+
+    def get(self, landmark_name, order):
+        """Compiled lesson, None if landmark has no lesson with given order"""
+        key = (landmark_name.lower(), order)
+        generation = CatalogueService.get_stats().generation
+
+        with self._lock:
+            entry = self._lessons.get(key)
+            if entry is not None and entry[0] == generation:
+                self._lessons.move_to_end(key)
+                return entry[1]
+
+        lesson = Lesson.objects.filter(landmark__name__iexact=landmark_name, order=order).first()
+        if lesson is None:
+            return None
+        compiled = CompiledLesson.from_lesson(lesson)
+
+        with self._lock:
+            self._lessons[key] = (generation, compiled)
+            self._lessons.move_to_end(key)
+            while len(self._lessons) > self._max_size():
+                self._lessons.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._lessons.clear()
+
+
+compiled_lessons = CompiledLessonCache()
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from .models import Country, Landmark, Lesson, Vocabulary, Sentence, Audio
+from .services import CatalogueService
+
+CATALOGUE_MODELS = (Country, Landmark, Lesson, Vocabulary, Sentence, Audio)
+LESSON_CONTENT_THROUGH_MODELS = (Lesson.vocabularies.through, Lesson.sentences.through, Lesson.audios.through)
+
+
+def invalidate_catalogue_stats(sender, **kwargs):
+    """Catalogue changed outside of import, recount stats on next read"""
+    CatalogueService.invalidate()
+
+
+for model in CATALOGUE_MODELS:
+    post_save.connect(invalidate_catalogue_stats, sender=model, dispatch_uid=f'catalogue_stats_save_{model.__name__}')
+    post_delete.connect(invalidate_catalogue_stats, sender=model, dispatch_uid=f'catalogue_stats_delete_{model.__name__}')
+
+for through in LESSON_CONTENT_THROUGH_MODELS:
+    m2m_changed.connect(invalidate_catalogue_stats, sender=through, dispatch_uid=f'catalogue_stats_m2m_{through.__name__}')
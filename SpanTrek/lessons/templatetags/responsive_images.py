@@ -0,0 +1,29 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from ..images import image_variants
+
+register = template.Library()
+
+# Lesson images are at most 470px wide (image.css), full width on small screens
+DEFAULT_SIZES = '(max-width: 500px) 100vw, 470px'
+
+
+@register.simple_tag
+def responsive_image(url, css_class='', alt='', sizes=DEFAULT_SIZES):
+    """<picture> with srcset of every built format, plain <img> if the image has no variants"""
+    entry = image_variants(url)
+    if not entry:
+        return format_html('<img src="{}" class="{}" alt="{}" />', url, css_class, alt)
+
+    sources = format_html_join(
+        '\n', '<source type="image/{}" srcset="{}" sizes="{}" />',
+        (
+            (image_format, ', '.join(f'{variant_url} {width}w' for width, variant_url in variants), sizes)
+            for image_format, variants in entry['variants'].items()
+        ),
+    )
+    # Width and height let the browser reserve space before the image loads
+    return format_html(
+        '<picture>\n{}\n<img src="{}" class="{}" alt="{}" width="{}" height="{}" decoding="async" /></picture>',
+        sources, url, css_class, alt, entry['width'], entry['height'],
+    )
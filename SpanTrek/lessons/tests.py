@@ -1,3 +1,549 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from base.models import ExerciseResult, User
+from lessons.answers import check_answer, compile_answer_key, normalize_answer
+from lessons.images import discover_images
+from lessons.importer import LessonImporter, discover_landmark_files, read_landmark_file
+from lessons.models import CatalogueStats, Country, Landmark, Lesson, Vocabulary
+from lessons.normalize import normalize_filename
+from lessons.services import CATALOGUE_STATS_CACHE_KEY, STATS_FIELDS, CatalogueService, CompiledLessonCache, compiled_lessons
+from lessons.tts import MANIFEST_NAME, AudioJob, OfflineEngine, SynthesisPipeline, cache_key
+from functools import partial
+from io import StringIO
+from unittest import mock
+import json
+import os
+import shutil
+import tempfile
+import threading
 
-# Create your tests here.
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__), 'testdata', 'normalize_filename_golden.json')
+LANDMARK_FILE = os.path.join(os.path.dirname(__file__), 'testdata', 'landmark_data', 'poland', 'poznan.json')
+
+LESSON_SEQUENCE = [
+    {'type': 'vocabulary', 'content': ['padre', 'father']},
+    {'type': 'fill_blank', 'content': ['Mi (father)', 'PADRE', 'y mi (mother)', 'MADRE']},
+    {'type': 'single_choice', 'content': ['Father?', 'MADRE', 'padre', 'PADRE']},
+    {'type': 'multiple_choice', 'content': ['Family?', 'PADRE', 'mesa', 'MADRE']},
+    {'type': 'match', 'content': ['1_padre', '2_madre', '2_mother', '1_father']},
+    {'type': 'translate_input_field', 'content': ['How are you?', '¿Cómo estás?']},
+]
+
+
+class NormalizeFilenameTests(SimpleTestCase):
+    """Audio file names must not change, existing files and Audio URLs depend on them"""
+
+    def test_matches_golden_file(self):
+        # Golden file holds output of the previous implementation for every catalogue text
+        with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+            golden = json.load(f)
+
+        self.assertGreater(len(golden), 0)
+        for text, expected in golden.items():
+            with self.subTest(text=text):
+                self.assertEqual(normalize_filename(text), expected)
+
+
+class CountingEngine(OfflineEngine):
+    """Offline engine remembering which texts it synthesized"""
+
+    def __init__(self):
+        self.texts = []
+        self._lock = threading.Lock()
+
+    def synthesize(self, text, lang):
+        with self._lock:
+            self.texts.append(text)
+        return super().synthesize(text, lang)
+
+
+class SynthesisPipelineTests(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.output_dir = os.path.join(temp_dir.name, 'audio')
+        self.cache_dir = os.path.join(temp_dir.name, 'cache')
+        self.jobs = [
+            AudioJob('padre', 'vocabulary/padre.mp3'),
+            AudioJob('madre', 'vocabulary/madre.mp3'),
+            # Same text for another file, synthesized once
+            AudioJob('padre', 'sentences/padre.mp3'),
+        ]
+
+    def run_pipeline(self, jobs, **kwargs):
+        engine = CountingEngine()
+        pipeline = SynthesisPipeline(engine, self.output_dir, self.cache_dir, jobs=2, **kwargs)
+        return engine, pipeline.run(jobs)
+
+    def read_manifest(self):
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_writes_files_and_manifest(self):
+        engine, stats = self.run_pipeline(self.jobs)
+
+        self.assertEqual(sorted(engine.texts), ['madre', 'padre'])
+        self.assertEqual((stats.synthesized, stats.from_cache, stats.up_to_date, stats.failed), (2, 1, 0, []))
+        for job in self.jobs:
+            with open(os.path.join(self.output_dir, *job.path.split('/')), 'rb') as f:
+                self.assertEqual(f.read(), OfflineEngine().synthesize(job.text, 'es'))
+        self.assertEqual(self.read_manifest(), {job.path: cache_key(job.text, 'es', 'offline') for job in self.jobs})
+
+    def test_second_run_synthesizes_nothing(self):
+        self.run_pipeline(self.jobs)
+        engine, stats = self.run_pipeline(self.jobs)
+        self.assertEqual(engine.texts, [])
+        self.assertEqual((stats.synthesized, stats.from_cache, stats.up_to_date), (0, 0, 3))
+
+    def test_changed_text_synthesizes_only_that_item(self):
+        self.run_pipeline(self.jobs)
+        changed = [AudioJob('madre mía', 'vocabulary/madre.mp3')] + [job for job in self.jobs if job.text == 'padre']
+        engine, stats = self.run_pipeline(changed)
+
+        self.assertEqual(engine.texts, ['madre mía'])
+        self.assertEqual((stats.synthesized, stats.up_to_date), (1, 2))
+        self.assertEqual(self.read_manifest()['vocabulary/madre.mp3'], cache_key('madre mía', 'es', 'offline'))
+
+    def test_lost_output_is_restored_from_cache(self):
+        self.run_pipeline(self.jobs)
+        os.remove(os.path.join(self.output_dir, 'vocabulary', 'madre.mp3'))
+        engine, stats = self.run_pipeline(self.jobs)
+
+        self.assertEqual(engine.texts, [])
+        self.assertEqual((stats.from_cache, stats.up_to_date), (1, 2))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'vocabulary', 'madre.mp3')))
+
+    def test_force_synthesizes_everything_again(self):
+        self.run_pipeline(self.jobs)
+        engine, stats = self.run_pipeline(self.jobs, force=True)
+        self.assertEqual(sorted(engine.texts), ['madre', 'padre'])
+        self.assertEqual(stats.up_to_date, 0)
+
+class DiscoverImagesTests(SimpleTestCase):
+    def test_skips_avatars_and_generated_variants(self):
+        with tempfile.TemporaryDirectory() as root:
+            for path in ('food/apple.png', 'food/notes.txt', 'home/door.JPG', 'logo.png',
+                         'avatars/1.png', 'responsive/food/apple.320.abc.webp', 'responsive/manifest.json'):
+                os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+                open(os.path.join(root, path), 'wb').close()
+            self.assertEqual(discover_images(root), ['logo.png', 'food/apple.png', 'home/door.JPG'])
+
+
+class LessonImporterTests(TestCase):
+    def setUp(self):
+        self.lessons_data = read_landmark_file(LANDMARK_FILE)
+
+    def import_lessons(self, **kwargs):
+        return LessonImporter().import_landmarks({'poznan': self.lessons_data}, create_countries=True, **kwargs)
+
+    def test_creates_lessons_with_links(self):
+        stats = self.import_lessons()
+
+        self.assertEqual(stats.created, [('poznan', 'Family', 0), ('poznan', 'Home', 1)])
+        self.assertEqual((stats.countries_created, stats.landmarks_created), (1, 1))
+        self.assertEqual((stats.vocabularies_created, stats.sentences_created, stats.audios_created), (3, 1, 1))
+        family, home = Lesson.objects.filter(landmark__name='poznan').order_by('order')
+        self.assertEqual(family.country.name, 'poland')
+        self.assertEqual(family.use_of_spanish, 1)
+        self.assertEqual(set(family.vocabularies.values_list('word', flat=True)), {'el padre', 'la madre'})
+        self.assertEqual(list(family.sentences.values_list('sentence', flat=True)), ['Mi padre es alto'])
+        self.assertEqual(
+            list(family.audios.values_list('audio_url', flat=True)),
+            [f'/static/audio/vocabulary/{normalize_filename("el padre")}.mp3'],
+        )
+        self.assertEqual(family.answer_key, compile_answer_key(family.lesson_sequence))
+        # Words shared by lessons are one row
+        self.assertEqual(set(home.vocabularies.values_list('word', flat=True)), {'la madre', 'la casa'})
+        self.assertFalse(home.sentences.exists())
+        # Counters are rebuilt after bulk writes
+        self.assertEqual((family.vocabularies_count, family.sentences_count, family.audios_count), (2, 1, 1))
+        self.assertEqual(stats.links_added, 6)
+
+    def test_second_import_skips_everything(self):
+        self.import_lessons()
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = self.import_lessons()
+
+        # Only the landmark fingerprint is read
+        self.assertFalse([query for query in queries.captured_queries if 'lessons_lesson' in query['sql']])
+        self.assertEqual(stats.files_skipped, ['poznan'])
+        self.assertEqual(stats.files_imported, [])
+        self.assertEqual(stats.skipped, [('poznan', 'Family', 0), ('poznan', 'Home', 1)])
+        self.assertEqual((stats.created, stats.updated, stats.errors), ([], [], []))
+        self.assertFalse(stats.changed)
+
+    def test_changed_lesson_is_imported_alone(self):
+        self.import_lessons()
+        home = self.lessons_data[1]
+        home['title'] = 'House'
+        home['vocabularies'].append({'word': 'la mesa', 'translation': 'table'})
+
+        stats = self.import_lessons()
+
+        self.assertEqual(stats.files_imported, ['poznan'])
+        self.assertEqual(stats.updated, [('poznan', 'House', 1, ['title'])])
+        self.assertEqual(stats.skipped, [('poznan', 'Family', 0)])
+        self.assertEqual((stats.vocabularies_created, stats.links_added, stats.links_removed), (1, 1, 0))
+        lesson = Lesson.objects.get(landmark__name='poznan', order=1)
+        self.assertEqual(lesson.title, 'House')
+        self.assertEqual(set(lesson.vocabularies.values_list('word', flat=True)), {'la madre', 'la casa', 'la mesa'})
+
+
+class CreateAllLessonsCommandTests(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.data_dir = temp_dir.name
+        os.makedirs(os.path.join(self.data_dir, 'poland'))
+        shutil.copy(LANDMARK_FILE, os.path.join(self.data_dir, 'poland', 'poznan.json'))
+        patcher = mock.patch(
+            'lessons.management.commands.create_all_lessons.discover_landmark_files',
+            partial(discover_landmark_files, self.data_dir),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_all_lessons(self, *args):
+        out = StringIO()
+        call_command('create_all_lessons', *args, stdout=out)
+        return out.getvalue()
+
+    def test_force_imports_unchanged_files(self):
+        self.create_all_lessons()
+        Lesson.objects.filter(order=0).update(title='Edited')
+
+        output = self.create_all_lessons()
+        self.assertIn('Poznan: unchanged since last import', output)
+        self.assertEqual(Lesson.objects.get(order=0).title, 'Edited')
+
+        output = self.create_all_lessons('--force')
+        self.assertIn('Poznan: updated lesson Family (Order: 0) - title', output)
+        self.assertIn('Total lessons skipped: 1', output)
+        self.assertEqual(Lesson.objects.get(order=0).title, 'Family')
+
+    def write_landmark_file(self, landmark, content):
+        path = os.path.join(self.data_dir, 'poland', f'{landmark}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+        return path
+
+    def test_malformed_files_are_reported_with_file_and_lesson(self):
+        warsaw = self.write_landmark_file('warsaw', [
+            {'title': 'Streets', 'order': 0, 'country_order': 2, 'country': 'poland', 'lesson_sequence': []},
+            {'title': 'Food', 'order': 1, 'country_order': 3, 'country': 'poland'},
+            {'title': 'Tapas', 'order': 2, 'country_order': 4, 'country': 'spain', 'lesson_sequence': []},
+        ])
+        krakow = self.write_landmark_file('krakow', '[{"title": ')
+
+        output = self.create_all_lessons()
+
+        self.assertIn(f'{warsaw}: Lesson #2 "Food" is missing lesson_sequence', output)
+        self.assertIn(f'{warsaw}: Lesson #3 "Tapas" belongs to country "spain", not "poland"', output)
+        self.assertIn(f'Cannot read {krakow}', output)
+        self.assertIn('invalid: 2', output)
+        # Invalid files are left out entirely, valid ones are imported
+        self.assertEqual(list(Landmark.objects.values_list('name', flat=True)), ['poznan'])
+        self.assertEqual(Lesson.objects.count(), 2)
+
+    def test_jobs_parse_files_in_worker_processes(self):
+        self.write_landmark_file('warsaw', [
+            {'title': 'Streets', 'order': 0, 'country_order': 2, 'country': 'poland', 'lesson_sequence': []},
+        ])
+        krakow = self.write_landmark_file('krakow', [{'title': 'Castle', 'order': 0}])
+
+        output = self.create_all_lessons('--jobs', '2')
+
+        self.assertIn(f'{krakow}: Lesson #1 "Castle" is missing country_order, country, lesson_sequence', output)
+        self.assertIn('Total lessons created: 3', output)
+        self.assertEqual(
+            list(Lesson.objects.order_by('country_order').values_list('landmark__name', 'title')),
+            [('poznan', 'Family'), ('poznan', 'Home'), ('warsaw', 'Streets')],
+        )
+
+
+class CatalogueServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.country = Country.objects.create(name='Poland')
+        self.landmark = Landmark.objects.create(country=self.country, name='poznan')
+        self.lesson = self.create_lesson(0, ['padre', 'madre'])
+
+    def create_lesson(self, order, words):
+        lesson = Lesson.objects.create(
+            title=f'Lesson {order}', order=order, country_order=order, landmark=self.landmark, country=self.country,
+            use_of_spanish=2,
+        )
+        lesson.vocabularies.set([Vocabulary.objects.get_or_create(word=word)[0] for word in words])
+        return lesson
+
+    def test_rebuild_counts_catalogue(self):
+        self.create_lesson(1, ['madre', 'casa'])
+        Country.objects.create(name='Spain')
+
+        snapshot = CatalogueService.rebuild()
+
+        self.assertEqual(snapshot.total, {'lessons': 2, 'vocabularies': 3, 'sentences': 0, 'audios': 0, 'use_of_spanish': 4})
+        # Words shared by lessons of a country count once, names are case-insensitive
+        self.assertEqual(snapshot.country('POLAND')['vocabularies'], 3)
+        self.assertEqual(snapshot.country('spain')['lessons'], 0)
+        self.assertEqual(snapshot.country('italy'), dict.fromkeys(STATS_FIELDS, 0))
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.vocabularies_count, 2)
+        self.assertEqual(CatalogueStats.objects.filter(generation=snapshot.generation).count(), 3)
+
+    def test_snapshot_is_cached(self):
+        generation = CatalogueService.rebuild().generation
+
+        with self.assertNumQueries(0):
+            self.assertEqual(CatalogueService.get_stats().generation, generation)
+
+    def test_stored_stats_are_read_after_cache_expiry(self):
+        snapshot = CatalogueService.rebuild()
+        cache.delete(CATALOGUE_STATS_CACHE_KEY)
+
+        with self.assertNumQueries(2):
+            stored = CatalogueService.get_stats()
+        self.assertEqual((stored.generation, stored.total), (snapshot.generation, snapshot.total))
+
+    def test_invalidate_rebuilds_on_next_read(self):
+        generation = CatalogueService.rebuild().generation
+        Lesson.objects.filter(pk=self.lesson.pk).update(use_of_spanish=5)
+
+        CatalogueService.invalidate()
+
+        snapshot = CatalogueService.get_stats()
+        self.assertEqual(snapshot.generation, generation + 1)
+        self.assertEqual(snapshot.total['use_of_spanish'], 5)
+        # Rebuilt once, later reads are cached again
+        self.assertEqual(CatalogueService.get_stats().generation, generation + 1)
+
+    def test_saved_lesson_bumps_generation(self):
+        generation = CatalogueService.rebuild().generation
+
+        self.create_lesson(1, ['casa'])
+
+        snapshot = CatalogueService.get_stats()
+        self.assertGreater(snapshot.generation, generation)
+        self.assertEqual(snapshot.country('poland')['lessons'], 2)
+        self.assertEqual(snapshot.country('poland')['vocabularies'], 3)
+
+    def test_world_map_shows_new_lessons(self):
+        self.client.force_login(User.objects.create(username='traveller', email='traveller@example.com'))
+        response = self.client.get(reverse('lessons:world_map'))
+        self.assertEqual(response.context['countries_lessons_dict'], {'Poland': 1})
+        self.assertEqual(response.context['progress_bar_max'], 1)
+
+        self.create_lesson(1, [])
+
+        response = self.client.get(reverse('lessons:world_map'))
+        self.assertEqual(response.context['countries_lessons_dict'], {'Poland': 2})
+        self.assertEqual(response.context['progress_bar_max'], 2)
+
+
+class CompiledLessonCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        country = Country.objects.create(name='poland')
+        self.landmark = Landmark.objects.create(country=country, name='poznan')
+        for order in range(3):
+            Lesson.objects.create(
+                title=f'Lesson {order}', order=order, country_order=order, landmark=self.landmark, country=country,
+                lesson_sequence=LESSON_SEQUENCE,
+            )
+        CatalogueService.rebuild()
+        self.lessons = CompiledLessonCache()
+
+    def test_lessons_keyed_by_lowercase_landmark_and_order(self):
+        compiled = self.lessons.get('Poznan', 1)
+        self.assertEqual((compiled.title, compiled.order), ('Lesson 1', 1))
+        self.assertEqual(compiled.check(2, ['padre', 'madre']), True)
+
+        with self.assertNumQueries(0):
+            self.assertIs(self.lessons.get('POZNAN', 1), compiled)
+            self.assertIs(self.lessons.get('poznan', 1), compiled)
+        self.assertIsNot(self.lessons.get('poznan', 0), compiled)
+        self.assertIsNone(self.lessons.get('poznan', 7))
+
+    @override_settings(COMPILED_LESSONS_CACHE_SIZE=2)
+    def test_least_recently_used_lesson_is_evicted(self):
+        first = self.lessons.get('poznan', 0)
+        second = self.lessons.get('poznan', 1)
+        # Reading the first lesson makes the second one least recently used
+        self.assertIs(self.lessons.get('poznan', 0), first)
+
+        self.lessons.get('poznan', 2)
+
+        with self.assertNumQueries(0):
+            self.assertIs(self.lessons.get('poznan', 0), first)
+        self.assertIsNot(self.lessons.get('poznan', 1), second)
+
+    def test_new_generation_compiles_lessons_again(self):
+        compiled = self.lessons.get('poznan', 0)
+        Lesson.objects.filter(landmark=self.landmark, order=0).update(title='Renamed')
+        self.assertIs(self.lessons.get('poznan', 0), compiled)
+
+        CatalogueService.rebuild()
+
+        recompiled = self.lessons.get('poznan', 0)
+        self.assertEqual(recompiled.title, 'Renamed')
+        self.assertNotEqual(recompiled.content_hash, compiled.content_hash)
+
+
+class AnswerKeyTests(SimpleTestCase):
+    def setUp(self):
+        self.key = compile_answer_key(LESSON_SEQUENCE)
+
+    def test_normalize_answer(self):
+        self.assertEqual(normalize_answer('¿Cómo  estás?'), 'como estas')
+        self.assertEqual(normalize_answer(' ¡Hola, AMIGO! '), 'hola amigo')
+
+    def test_correct_answers(self):
+        self.assertIsNone(self.key[0])
+        self.assertTrue(check_answer(self.key[1], ['padre', 'Madre']))
+        self.assertTrue(check_answer(self.key[2], 0))
+        self.assertTrue(check_answer(self.key[2], 2))
+        self.assertTrue(check_answer(self.key[3], [2, 0]))
+        self.assertTrue(check_answer(self.key[4], [[0, 3], [2, 1]]))
+        self.assertTrue(check_answer(self.key[5], 'como estas'))
+
+    def test_wrong_answers(self):
+        self.assertFalse(check_answer(self.key[1], ['padre', 'mesa']))
+        self.assertFalse(check_answer(self.key[2], 1))
+        self.assertFalse(check_answer(self.key[3], [0]))
+        self.assertFalse(check_answer(self.key[3], [0, 2, 1]))
+        self.assertFalse(check_answer(self.key[4], [[0, 1], [2, 3]]))
+        self.assertFalse(check_answer(self.key[5], 'como esta'))
+
+    def test_malformed_answers_are_wrong(self):
+        malformed = {
+            1: ['padre', ['madre']], 2: True,
+            3: [0, 'a'], 4: [[0, 3], [2, [1]]],
+            5: 42,
+        }
+        for number, answer in malformed.items():
+            with self.subTest(exercise=number, answer=answer):
+                self.assertFalse(check_answer(self.key[number], answer))
+        self.assertFalse(check_answer(self.key[3], [True, 2]))
+        self.assertFalse(check_answer(self.key[3], [[0], 2]))
+        self.assertFalse(check_answer(self.key[4], [[0, 0], [2, 1]]))
+
+
+class LessonAnswersApiTests(TestCase):
+    def setUp(self):
+        compiled_lessons.clear()
+        country = Country.objects.create(name='Poland')
+        landmark = Landmark.objects.create(country=country, name='Poznan')
+        self.lesson = Lesson.objects.create(
+            title='Family', order=0, country_order=0, landmark=landmark, country=country,
+            lesson_sequence=LESSON_SEQUENCE, answer_key=compile_answer_key(LESSON_SEQUENCE),
+        )
+        self.user = User.objects.create_user(username='learner', email='learner@example.com', password='secret')
+        self.client.force_login(self.user)
+        self.url = reverse('lessons:lesson_answers_api', kwargs={
+            'country': 'poland', 'landmark': 'poznan', 'lesson_number': 0,
+        })
+
+    def post(self, body):
+        return self.client.post(self.url, body if isinstance(body, str) else json.dumps(body), content_type='application/json')
+
+    def test_checks_and_records_answers(self):
+        response = self.post({'answers': {'2': ['padre', 'madre'], '4': [0], '6': 'COMO ESTÁS.'}})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'results': {'2': True, '4': False, '6': True}, 'correct': 2, 'total': 3})
+        self.assertEqual(
+            sorted(ExerciseResult.objects.filter(user=self.user, lesson=self.lesson).values_list('exercise_number', 'correct')),
+            [(2, True), (4, False), (6, True)],
+        )
+
+    def test_malformed_answers_are_checked_as_wrong(self):
+        response = self.post({'answers': {'4': [1, 'a'], '5': [[0, [3]]], '2': [['padre'], 'madre']}})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['correct'], 0)
+
+    def test_invalid_payloads(self):
+        for body in ['nope', '[]', {'answers': []}, {'answers': {'x': 1}}, {}, {'answers': {'1': 'padre'}}, {'answers': {'9': 1}}]:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertFalse(ExerciseResult.objects.exists())
+
+    def test_exercise_page_sends_answers_with_csrf_token(self):
+        # Like a browser, the CSRF token has to come from the page
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        page = client.get(reverse('lessons:landmark_lesson_with_exercise', kwargs={
+            'country': 'poland', 'landmark': 'poznan', 'lesson_number': 0, 'exercise_number': 3,
+        }))
+        config = page.context['lesson_player']
+        self.assertEqual(config['answers_url'], self.url)
+
+        # Request of lessonPlayer.checkAnswer for the single choice exercise
+        body = json.dumps({'answers': {'3': 2}})
+        self.assertEqual(client.post(self.url, body, content_type='application/json').status_code, 403)
+        response = client.post(self.url, body, content_type='application/json', HTTP_X_CSRFTOKEN=config['csrf_token'])
+        self.assertEqual(response.json()['results'], {'3': True})
+        self.assertTrue(ExerciseResult.objects.filter(user=self.user, exercise_number=3, correct=True).exists())
+
+    def test_only_post_to_existing_lessons(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        missing = self.url.replace('/0/', '/9/')
+        self.assertEqual(self.client.post(missing, '{}', content_type='application/json').status_code, 404)
+
+
+class LessonPlayerApiTests(TestCase):
+    def setUp(self):
+        compiled_lessons.clear()
+        country = Country.objects.create(name='Poland')
+        landmark = Landmark.objects.create(country=country, name='Poznan')
+        self.lesson = Lesson.objects.create(
+            title='Family', order=0, country_order=0, landmark=landmark, country=country,
+            lesson_sequence=[{'type': 'text', 'content': 'Hola <amigo>'}] + LESSON_SEQUENCE,
+            answer_key=compile_answer_key([None] + LESSON_SEQUENCE),
+        )
+        self.client.force_login(User.objects.create(username='player', email='player@example.com'))
+        self.url = reverse('lessons:lesson_player_api', kwargs={
+            'country': 'poland', 'landmark': 'poznan', 'lesson_number': 0,
+        })
+
+    def test_steps_rendered_by_block_templates(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        steps = response.json()['steps']
+
+        self.assertEqual([step['type'] for step in steps], ['text'] + [item['type'] for item in LESSON_SEQUENCE])
+        self.assertIn('<p class="text-content">Hola &lt;amigo&gt;</p>', steps[0]['html'])
+        self.assertEqual(steps[2]['html'].count('class="blank-input"'), 2)
+        self.assertIn('scripts/lessons/exercises/fill_blank.js', steps[2]['html'])
+        # Same markup as the exercise page
+        page = self.client.get(reverse('lessons:landmark_lesson_with_exercise', kwargs={
+            'country': 'poland', 'landmark': 'poznan', 'lesson_number': 0, 'exercise_number': 5,
+        }))
+        self.assertContains(page, steps[4]['html'], html=True)
+
+    def test_unchanged_lesson_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_changed_lesson_is_sent_again(self):
+        response = self.client.get(self.url)
+        self.lesson.lesson_sequence = LESSON_SEQUENCE
+        self.lesson.save()
+
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(len(changed.json()['steps']), len(LESSON_SEQUENCE))
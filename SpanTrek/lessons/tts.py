@@ -0,0 +1,189 @@
+"""
+Text-to-speech synthesis pipeline used by create_audios
+
+Clips are synthesized by a pluggable engine on a bounded thread pool. Every
+synthesized clip is kept in a content-addressed cache keyed by (text, lang,
+engine), so the same text is never synthesized twice, and a manifest next to
+the output files records which cache entry each file was made from, so reruns
+skip files that are already up to date without synthesizing anything.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class TTSEngine:
+    """Turns text into MP3 bytes, subclasses are registered in ENGINES"""
+    name = None
+
+    def synthesize(self, text, lang):
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    """Google Text-to-Speech, needs network access"""
+    name = 'gtts'
+
+    def synthesize(self, text, lang):
+        # Optional dependency, only needed when this engine is used
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class OfflineEngine(TTSEngine):
+    """Deterministic silent clips for tests and offline CI"""
+    name = 'offline'
+
+    # MPEG-1 Layer III, 32 kbps, 44.1 kHz, mono frame with zeroed audio data (26 ms of silence)
+    FRAME = bytes([0xFF, 0xFB, 0x10, 0xC0]) + bytes(100)
+
+    def synthesize(self, text, lang):
+        # Longer texts get longer clips, roughly like speech would
+        return self.FRAME * max(4, len(text))
+
+
+ENGINES = {engine.name: engine for engine in (GTTSEngine, OfflineEngine)}
+
+
+def get_engine(name=None):
+    name = name or getattr(settings, 'TTS_ENGINE', 'gtts')
+    if name not in ENGINES:
+        raise ValueError(f'Unknown TTS engine "{name}", available: {", ".join(ENGINES)}')
+    return ENGINES[name]()
+
+
+def cache_key(text, lang, engine_name):
+    return hashlib.sha256(f'{engine_name}\0{lang}\0{text}'.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class AudioJob:
+    """One clip to produce, path is relative to the output directory"""
+    text: str
+    path: str
+
+
+@dataclass
+class SynthesisStats:
+    synthesized: int = 0
+    from_cache: int = 0
+    up_to_date: int = 0
+    # (path, error message)
+    failed: list = field(default_factory=list)
+
+
+class SynthesisPipeline:
+    """Produces audio files for jobs, synthesizing only texts missing in the cache"""
+
+    def __init__(self, engine, output_dir=None, cache_dir=None, lang='es', jobs=4, force=False):
+        self.engine = engine
+        self.output_dir = str(output_dir or os.path.join(settings.BASE_DIR, 'static', 'audio'))
+        self.cache_dir = str(cache_dir or getattr(settings, 'TTS_CACHE_DIR', os.path.join(settings.BASE_DIR, '.tts_cache')))
+        self.lang = lang
+        self.jobs = jobs
+        self.force = force
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_manifest(self, manifest):
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Written to a temporary file first, so an interrupted run never leaves a broken manifest
+        fd, temp_path = tempfile.mkstemp(dir=self.output_dir, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def run(self, jobs, progress=None):
+        """Produce all jobs, returns SynthesisStats. progress(path, source) is called per produced file"""
+        stats = SynthesisStats()
+        manifest = self.load_manifest()
+
+        # Jobs sharing a path (e.g. "Me gusta" and "me gusta") produce one file, the first one wins
+        pending = {}
+        seen_paths = set()
+        for job in jobs:
+            if job.path in seen_paths:
+                continue
+            seen_paths.add(job.path)
+            key = cache_key(job.text, self.lang, self.engine.name)
+            exists = os.path.exists(self._output_path(job.path))
+            if not self.force and manifest.get(job.path) == key and exists:
+                stats.up_to_date += 1
+                continue
+            if not self.force and job.path not in manifest and exists:
+                # File generated before the manifest existed, adopted as it is
+                manifest[job.path] = key
+                stats.up_to_date += 1
+                continue
+            pending[job.path] = (job, key)
+
+        # Texts are synthesized once even if several files need them
+        by_key = {}
+        for path, (job, key) in pending.items():
+            by_key.setdefault(key, (job.text, []))[1].append(path)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as executor:
+            futures = {executor.submit(self._produce, text, key, paths): (key, paths) for key, (text, paths) in by_key.items()}
+            for future in as_completed(futures):
+                key, paths = futures[future]
+                try:
+                    source = future.result()
+                except Exception as e:
+                    stats.failed.extend((path, str(e)) for path in paths)
+                    continue
+
+                for path in paths:
+                    manifest[path] = key
+                    if progress:
+                        progress(path, source)
+                if source == 'cache':
+                    stats.from_cache += len(paths)
+                else:
+                    stats.synthesized += 1
+                    stats.from_cache += len(paths) - 1
+
+        self.save_manifest(manifest)
+        return stats
+
+    def _output_path(self, path):
+        return os.path.join(self.output_dir, *path.split('/'))
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.mp3')
+
+    def _produce(self, text, key, paths):
+        """Copy cached clip to every path, synthesizing it first if needed. Runs in worker threads"""
+        cache_path = self._cache_path(key)
+        source = 'cache'
+        if self.force or not os.path.exists(cache_path):
+            audio = self.engine.synthesize(text, self.lang)
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(audio)
+            os.replace(temp_path, cache_path)
+            source = 'engine'
+
+        for path in paths:
+            output_path = self._output_path(path)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            shutil.copyfile(cache_path, output_path)
+        return source
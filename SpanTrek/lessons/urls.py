@@ -5,6 +5,8 @@ app_name = 'lessons'
 
 urlpatterns = [
     path('world_map/', views.world_map, name='world_map'),
+    path('api/<str:country>/<str:landmark>/<int:lesson_number>/', views.lesson_player_api, name='lesson_player_api'),
+    path('api/<str:country>/<str:landmark>/<int:lesson_number>/answers/', views.lesson_answers_api, name='lesson_answers_api'),
     path('<str:country>/', views.country_view, name='country_map'),
     path('<str:country>/<str:landmark>/', views.country_landmark_lesson, name='country_landmark_lesson'),
     path('<str:country>/<str:landmark>/<int:lesson_number>/', views.country_landmark_lesson, name='landmark_lesson_with_number'),
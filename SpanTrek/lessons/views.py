@@ -1,9 +1,31 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_http_methods
 from .models import Lesson, Country, Vocabulary, Sentence, Audio, Landmark
+from .audio_sprites import lesson_sprite
+from .images import image_variants
+from .services import CatalogueService, compiled_lessons
 from django.db.models import Sum, Case, When, Value, IntegerField
+import hashlib
+import json
+
+# Template of every lesson block, used by the exercise page and by the lesson player API
+LESSON_BLOCK_TEMPLATES = {
+    'audio': 'lessons/content/audio.html',
+    'image': 'lessons/content/image.html',
+    'text': 'lessons/content/text.html',
+    'input_field': 'lessons/exercises/input_field.html',
+    'translate_input_field': 'lessons/exercises/translate_input_field.html',
+    'fill_blank': 'lessons/exercises/fill_blank.html',
+    'match': 'lessons/exercises/match.html',
+    'single_choice': 'lessons/exercises/single_choice.html',
+    'multiple_choice': 'lessons/exercises/multiple_choice.html',
+}
 
 
 @login_required(login_url='login_page')
@@ -11,12 +33,12 @@ def world_map(request):
     progress_bar_progress = request.user.country_lessons_progress
     user_progress = sum(progress_bar_progress.values())
     user_countries_progress = request.user.country_lessons_progress
-    all_lessons_count = Lesson.objects.count()
+    catalogue_stats = CatalogueService.get_stats()
+    all_lessons_count = catalogue_stats.total['lessons']
 
-    all_countries = Country.objects.all()
     countries_lessons_dict = {}
-    for country_obj in all_countries:
-        countries_lessons_dict[country_obj.name] = Lesson.objects.filter(country=country_obj).count()
+    for country_name in Country.objects.values_list('name', flat=True):
+        countries_lessons_dict[country_name] = catalogue_stats.country(country_name)['lessons']
 
     # Calculate completion status for each country
     country_completion_status = {}
@@ -38,7 +60,8 @@ def world_map(request):
 def country_view(request, country):
     # Get lesson count for country
     country_obj = Country.objects.filter(name__iexact=country).first()
-    country_lessons_count = Lesson.objects.filter(country=country_obj).count() if country_obj else 0
+    country_stats = CatalogueService.get_stats().country(country)
+    country_lessons_count = country_stats['lessons']
     user_country_progress = request.user.country_lessons_progress.get(country, 0)
 
     # Country learning progress
@@ -47,23 +70,18 @@ def country_view(request, country):
     country_vocabularies = Vocabulary.objects.filter(lessons__in=country_lessons).distinct()
     country_sentences = Sentence.objects.filter(lessons__in=country_lessons).distinct()
     country_audios = Audio.objects.filter(lessons__in=country_lessons).distinct()
-    country_use_of_spanish = country_lessons.aggregate(total=Sum('use_of_spanish'))['total'] or 0
-    
+
     country_stats_dict = {
-        'vocabularies': country_vocabularies.count(),
-        'sentences': country_sentences.count(),
-        'audios': country_audios.count(),
-        'use_of_spanish': country_use_of_spanish,
+        'vocabularies': country_stats['vocabularies'],
+        'sentences': country_stats['sentences'],
+        'audios': country_stats['audios'],
+        'use_of_spanish': country_stats['use_of_spanish'],
     }
 
-    user_learned_words = request.user.words_learned or []
-    user_country_vocabularies_count = country_vocabularies.filter(word__in=user_learned_words).count()
-
-    user_learned_sentences = request.user.sentences_learned or []    
-    user_country_sentences_count = country_sentences.filter(sentence__in=user_learned_sentences).count()
-
-    user_learned_audio = request.user.audio_learned or []
-    user_country_audio_count = country_audios.filter(text__in=user_learned_audio).count()
+    # Learned items are matched by id against the indexed knowledge table
+    user_country_vocabularies_count = country_vocabularies.filter(id__in=request.user.learned_ids('vocabulary')).count()
+    user_country_sentences_count = country_sentences.filter(id__in=request.user.learned_ids('sentence')).count()
+    user_country_audio_count = country_audios.filter(id__in=request.user.learned_ids('audio')).count()
     
     # Get lessons ordered by landmark id and then by lesson order within landmark
     all_lessons_in_order = Lesson.objects.filter(country=country_obj).order_by('country_order', 'order')
@@ -98,11 +116,12 @@ def country_landmark_lesson(request, country, landmark, lesson_number=None, exer
     # Get the current progress for landmark
     landmark_progress = request.user.landmark_lessons_progress.get(landmark, 0)
     user_landmark_progress = request.user.landmark_lessons_progress.get(landmark, 0)
-    country_obj = Country.objects.filter(name__iexact=country).first()
-    landmark_obj = Landmark.objects.filter(name__iexact=landmark).first()
     
     # If lesson_number is not provided, show intro page first
     if lesson_number is None:
+        country_obj = Country.objects.filter(name__iexact=country).first()
+        landmark_obj = Landmark.objects.filter(name__iexact=landmark).first()
+
         # Get all lessons for landmark
         landmark_lessons = Lesson.objects.filter(landmark=landmark_obj, country=country_obj).order_by('order')
 
@@ -114,9 +133,9 @@ def country_landmark_lesson(request, country, landmark, lesson_number=None, exer
         }
         return render(request, 'lessons/lesson_intro.html', context)
 
-    # Get the lesson
+    # Get the lesson, compiled once per import and shared by all exercise pages
     current_lesson = lesson_number
-    lesson = Lesson.objects.filter(landmark=landmark_obj, order=current_lesson).first()
+    lesson = compiled_lessons.get(landmark, current_lesson)
     
     if not lesson:
         # Handle case where lesson doesn't exist
@@ -126,25 +145,22 @@ def country_landmark_lesson(request, country, landmark, lesson_number=None, exer
         }
         return render(request, 'lessons/lesson_base.html', context=context)
     
-    # Get lesson sequence items
-    lesson_sequence_items = lesson.lesson_sequence or []
-    
-    total_exercises = len(lesson_sequence_items)
+    total_exercises = lesson.total_exercises
     
     # If exercise_number is not provided, redirect to first exercise
-    if exercise_number is None and lesson_sequence_items:
+    if exercise_number is None and total_exercises:
         return redirect('lessons:landmark_lesson_with_exercise', 
                        country=country, landmark=landmark, 
                        lesson_number=lesson_number, exercise_number=1)
     
     # If no exercises in lesson, show lesson overview
-    if not lesson_sequence_items:
+    if not total_exercises:
         context = {
             'landmark': landmark,
             'country': country,
             'lesson': lesson,
-            'lesson_vocabularies': lesson.vocabularies.all(),
-            'lesson_sentences': lesson.sentences.all(),
+            'lesson_vocabularies': lesson.vocabularies,
+            'lesson_sentences': lesson.sentences,
             'lesson_number': current_lesson,
             'prev_lesson_number': current_lesson - 1 if current_lesson >= 1 else None,
             'next_lesson_number': current_lesson + 1 if current_lesson < 3 else None,
@@ -158,36 +174,163 @@ def country_landmark_lesson(request, country, landmark, lesson_number=None, exer
                        country=country, landmark=landmark, 
                        lesson_number=lesson_number, exercise_number=1)
     
-    # Get current exercise (convert to 0-based index)
-    current_exercise_index = exercise_number - 1
-    
-    exercise_item = lesson_sequence_items[current_exercise_index]
-    current_block = exercise_item.get('type')
-    current_content = exercise_item.get('content')
+    current_block, current_content = lesson.exercise(exercise_number)
 
     context = {
         'landmark': landmark,
         'country': country,
         'lesson': lesson,
-        'lesson_vocabularies': lesson.vocabularies.all(),
-        'lesson_sentences': lesson.sentences.all(),
+        'lesson_vocabularies': lesson.vocabularies,
+        'lesson_sentences': lesson.sentences,
         'lesson_number': current_lesson,
         'exercise_number': exercise_number-1,
         'exercise_done': False,
         'total_exercises': total_exercises,
         'current_block': current_block,
         'current_content': current_content,
+        'current_template': LESSON_BLOCK_TEMPLATES.get(current_block),
         'prev_lesson_number': current_lesson - 1 if current_lesson >= 1 else None,
         'next_lesson_number': current_lesson + 1 if current_lesson < 3 else None,
         'prev_exercise_number': exercise_number - 1 if exercise_number > 1 else None,
         'next_exercise_number': exercise_number + 1 if exercise_number < total_exercises else None,
         'is_last_exercise': exercise_number == total_exercises,
         'is_first_exercise': exercise_number == 1,
+        # Prefetched on every exercise, so audio exercises of the lesson play without loading
+        'audio_sprite': lesson_sprite(lesson.id),
+        # Following steps are rendered by lesson_player.js from the lesson player API
+        'lesson_player': {
+            'api_url': reverse('lessons:lesson_player_api', kwargs={
+                'country': country, 'landmark': landmark, 'lesson_number': lesson_number,
+            }),
+            'lesson_url': reverse('lessons:landmark_lesson_with_number', kwargs={
+                'country': country, 'landmark': landmark, 'lesson_number': lesson_number,
+            }),
+            # Exercise scripts send every checked answer here, see lesson_answers_api
+            'answers_url': reverse('lessons:lesson_answers_api', kwargs={
+                'country': country, 'landmark': landmark, 'lesson_number': lesson_number,
+            }),
+            'csrf_token': get_token(request),
+            'exercise_number': exercise_number,
+            'current_block': current_block,
+            'has_complete': current_lesson < 3,
+        },
     }
 
     return render(request, 'lessons/lesson_base.html', context=context)
 
 
+def lesson_player_images(lesson):
+    """Responsive variants of the lesson images, {image url: manifest entry}"""
+    images = {}
+    for item in lesson.sequence:
+        content = item.get('content')
+        if item.get('type') == 'image' and content:
+            variants = image_variants(content[0])
+            if variants:
+                images[content[0]] = variants
+    return images
+
+
+def lesson_step_html(block, content):
+    """Step rendered by its block template, None for unknown blocks"""
+    template_name = LESSON_BLOCK_TEMPLATES.get(block)
+    if template_name is None:
+        return None
+    return render_to_string(template_name, {'content': content})
+
+
+def lesson_player_etag(request, country, landmark, lesson_number):
+    lesson = compiled_lessons.get(landmark, lesson_number)
+    if not lesson:
+        return None
+    # Image variants are built separately from lesson imports and templates change on deploy
+    rendering = hashlib.sha256(json.dumps(lesson_player_images(lesson), sort_keys=True).encode())
+    for template_name in sorted(LESSON_BLOCK_TEMPLATES.values()):
+        rendering.update(get_template(template_name).template.source.encode())
+    return f'{lesson.content_hash}-{rendering.hexdigest()[:8]}'
+
+
+def lesson_player_last_modified(request, country, landmark, lesson_number):
+    # Lessons only change on import, so the catalogue rebuild time bounds every lesson
+    return CatalogueService.get_stats().updated_at
+
+
+@login_required(login_url='login_page')
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=lesson_player_etag, last_modified_func=lesson_player_last_modified)
+def lesson_player_api(request, country, landmark, lesson_number):
+    """Whole lesson sequence in one JSON payload, so steps are shown without page loads.
+
+    Fetched by lesson_player.js on the exercise page a lesson is opened at. Every
+    step comes with its html, rendered by the same block template as the exercise
+    page, which the player swaps in. Payload is validated with ETag/Last-Modified,
+    repeated plays of an unchanged lesson get 304 Not Modified. Progress is still
+    saved by lesson_complete.
+    """
+    lesson = compiled_lessons.get(landmark, lesson_number)
+    if not lesson:
+        return JsonResponse({'error': 'Lesson not found'}, status=404)
+
+    payload = lesson.as_dict()
+    for step in payload['steps']:
+        step['html'] = lesson_step_html(step['type'], step['content'])
+    payload.update({
+        'country': country,
+        'landmark': landmark,
+        'complete_url': reverse('lessons:lesson_complete', kwargs={
+            'country': country, 'landmark': landmark, 'lesson_number': lesson_number,
+        }),
+    })
+    return JsonResponse(payload)
+
+
+@login_required(login_url='login_page')
+@require_http_methods(['POST'])
+def lesson_answers_api(request, country, landmark, lesson_number):
+    """Check answers of a whole lesson in one call against its precompiled answer key.
+
+    Body is {"answers": {"<exercise number>": answer}}, answer formats per
+    exercise type are described in lessons/answers.py. Every checked answer
+    is recorded as an ExerciseResult. The exercise scripts send each answer
+    through lessonPlayer.checkAnswer and show the verdict returned here.
+    """
+    lesson = compiled_lessons.get(landmark, lesson_number)
+    if not lesson:
+        return JsonResponse({'error': 'Lesson not found'}, status=404)
+
+    try:
+        answers = json.loads(request.body)['answers']
+        answers = {int(number): answer for number, answer in answers.items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Invalid answers'}, status=400)
+
+    results = {}
+    for number, answer in sorted(answers.items()):
+        if not 1 <= number <= lesson.total_exercises:
+            return JsonResponse({'error': f'No exercise {number} in lesson'}, status=400)
+        try:
+            result = lesson.check(number, answer)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': f'Invalid answer to exercise {number}'}, status=400)
+        if result is None:
+            return JsonResponse({'error': f'Step {number} is not an exercise'}, status=400)
+        results[number] = result
+
+    # Importing here to avoid circular import
+    from base.models import ExerciseResult
+    ExerciseResult.objects.bulk_create([
+        ExerciseResult(user=request.user, lesson_id=lesson.id, exercise_number=number, correct=correct)
+        for number, correct in results.items()
+    ])
+
+    return JsonResponse({
+        'results': results,
+        'correct': sum(results.values()),
+        'total': len(results),
+    })
+
+
 @login_required(login_url='login_page')
 def lesson_complete(request, country, landmark, lesson_number):
     """View for lesson completion page with congratulations message"""
@@ -231,7 +374,7 @@ def lesson_complete(request, country, landmark, lesson_number):
         'lesson_completed_before': lesson_completed_before,
     }
 
-    country_lessons = Lesson.objects.filter(country__name__iexact=country).count()  
+    country_lessons = CatalogueService.get_stats().country(country)['lessons']
 
     # Country completed
     if request.user.country_lessons_progress.get(country, 0) >= country_lessons and not lesson_completed_before:
@@ -243,13 +386,13 @@ def lesson_complete(request, country, landmark, lesson_number):
 @login_required(login_url='login_page')
 def country_complete(request, country):
     """View for country completion page with congratulations and statistics"""  
-    country_obj = Country.objects.filter(name__iexact=country).first()
-    country_lessons = Lesson.objects.filter(country=country_obj).count()
+    country_stats = CatalogueService.get_stats().country(country)
+    country_lessons = country_stats['lessons']
     country_knowledge = {
-        'vocabularies': Vocabulary.objects.filter(lessons__country=country_obj).distinct().count(),
-        'sentences': Sentence.objects.filter(lessons__country=country_obj).distinct().count(),
-        'audios': Audio.objects.filter(lessons__country=country_obj).distinct().count(),
-        'use_of_spanish': Lesson.objects.filter(country=country_obj).aggregate(total=Sum('use_of_spanish'))['total'] or 0,
+        'vocabularies': country_stats['vocabularies'],
+        'sentences': country_stats['sentences'],
+        'audios': country_stats['audios'],
+        'use_of_spanish': country_stats['use_of_spanish'],
     }
     
     if country not in request.user.passports_earned:
@@ -264,35 +407,3 @@ def country_complete(request, country):
     
     
     return render(request, 'lessons/country_complete.html', context=context)
-
-
-@login_required(login_url='login_page')
-def check_exercise_done(request):
-    """Handle exercise completion"""
-    if request.method == 'POST':
-        # Get all answer fields
-        answers = {}
-        
-        for key, value in request.POST.items():
-            if key.startswith('answer_'):
-                answers[key] = value.strip()
-        
-        # Get additional data
-        exercise_completed = request.POST.get('exercise_completed', 'false').lower() == 'true'
- 
-        # Check if this is an AJAX request
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            # Return JSON response for AJAX
-            response_data = {
-                'success': True,
-                'message': 'Exercise completed successfully',
-                'exercise_completed': exercise_completed,
-                'answers_received': len(answers),
-            }
-            return JsonResponse(response_data)
-        else:
-            # Handle regular form submission
-            return redirect('lessons:world_map')
-
-    # Handle GET request
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -0,0 +1,161 @@
+"""
+Practice decks stored in the session as compact tokens
+
+A deck is kept as one string of type code + item id per question, e.g.
+"v12,s7,a40", instead of the texts of every item, so the session row
+rewritten on every practice step stays small. Items are resolved one at a
+time through a process-wide LRU of catalogue items, dropped when a lesson
+import bumps the catalogue generation.
+
+Decks of every practice type are prebuilt per user in the practice_decks
+cache by the background worker, after the user learns new items, after
+every practice and when a deck was evicted, so starting a practice usually
+builds nothing.
+"""
+from collections import OrderedDict
+import random
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from base.background import background
+from base.models import UserKnowledge
+from lessons.models import Audio, Sentence, Vocabulary
+from lessons.services import CatalogueService
+from .scheduler import PRACTICE_ITEM_TYPES, ReviewScheduler
+
+ITEM_MODELS = {
+    UserKnowledge.VOCABULARY: Vocabulary,
+    UserKnowledge.SENTENCE: Sentence,
+    UserKnowledge.AUDIO: Audio,
+}
+
+TYPE_CODES = {
+    UserKnowledge.VOCABULARY: 'v',
+    UserKnowledge.SENTENCE: 's',
+    UserKnowledge.AUDIO: 'a',
+}
+CODE_TYPES = {code: item_type for item_type, code in TYPE_CODES.items()}
+
+PREBUILT_DECK_CACHE_KEY = 'practice:deck:{user_id}:{practice_type}'
+
+
+def encode_deck(deck):
+    """[(item_type, item_id)] -> deck token"""
+    return ','.join(f'{TYPE_CODES[item_type]}{item_id}' for item_type, item_id in deck)
+
+
+def decode_deck(token):
+    """Deck token -> [(item_type, item_id)]"""
+    return [(CODE_TYPES[entry[0]], int(entry[1:])) for entry in token.split(',')] if token else []
+
+
+def item_data(item_type, item):
+    """Practice item as the practice pages use it"""
+    data = {'type': item_type, 'id': item.id}
+    # Vocabulary
+    if item_type == UserKnowledge.VOCABULARY:
+        data.update({'word': item.word, 'translation': item.translation})
+    # Sentence
+    elif item_type == UserKnowledge.SENTENCE:
+        data.update({'sentence': item.sentence, 'translation': item.translation})
+    # Audio
+    else:
+        data.update({'audio_url': item.audio_url, 'text': item.text})
+    return data
+
+
+class PracticeItemCache:
+    """Process-wide LRU of practice items keyed by (item_type, item_id), dropped on new import generation"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._items = OrderedDict()
+        self._generation = None
+
+    def _max_size(self):
+        return getattr(settings, 'PRACTICE_ITEMS_CACHE_SIZE', 4096)
+
+    def get(self, item_type, item_id):
+        """Item data, None if the item doesn't exist anymore"""
+        key = (item_type, item_id)
+        generation = CatalogueService.get_stats().generation
+
+        with self._lock:
+            if self._generation != generation:
+                self._items.clear()
+                self._generation = generation
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+
+        item = ITEM_MODELS[item_type].objects.filter(id=item_id).first()
+        if item is None:
+            return None
+        data = item_data(item_type, item)
+
+        with self._lock:
+            self._items[key] = data
+            while len(self._items) > self._max_size():
+                self._items.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+practice_items = PracticeItemCache()
+
+
+class DeckCache:
+    """Service class keeping a prebuilt deck per user and practice type"""
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'PRACTICE_DECK_CACHE', 'practice_decks')]
+
+    @staticmethod
+    def deck_size():
+        # Largest question count served from a prebuilt deck
+        return getattr(settings, 'PREBUILT_DECK_SIZE', 50)
+
+    @staticmethod
+    def take(user_id, practice_type, count):
+        """Deck of count items in random order, from the prebuilt deck when it is big enough"""
+        key = PREBUILT_DECK_CACHE_KEY.format(user_id=user_id, practice_type=practice_type)
+        cache = DeckCache._cache()
+        token = cache.get(key)
+        deck = decode_deck(token) if token is not None else None
+
+        # A prebuilt deck shorter than deck_size() holds every learned item, so it serves any count
+        if deck is None or (count > len(deck) == DeckCache.deck_size()):
+            deck = ReviewScheduler.build_deck(user_id, practice_type, count)
+            if token is None:
+                # Evicted or expired, the next practice starts from a prebuilt deck again
+                DeckCache.schedule_refill(user_id)
+        else:
+            # Used once, the next one is built when this practice completes
+            cache.delete(key)
+
+        deck = deck[:count]
+        # Most due first decides what is practiced, not the order it is asked in
+        random.shuffle(deck)
+        return deck
+
+    @staticmethod
+    def refill(user_id):
+        """Build decks of every practice type, runs in the background worker"""
+        DeckCache._cache().set_many({
+            PREBUILT_DECK_CACHE_KEY.format(user_id=user_id, practice_type=practice_type): encode_deck(
+                ReviewScheduler.build_deck(user_id, practice_type, DeckCache.deck_size())
+            )
+            for practice_type in PRACTICE_ITEM_TYPES
+        })
+
+    @staticmethod
+    def schedule_refill(user_id):
+        # After commit, so the worker reads what the request has written
+        transaction.on_commit(lambda: background.submit(DeckCache.refill, user_id))
@@ -0,0 +1,125 @@
+from datetime import timedelta
+import random
+import time
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from base.models import User, UserKnowledge
+from lessons.models import Audio, Sentence, Vocabulary
+from practice.deck import ITEM_MODELS, PREBUILT_DECK_CACHE_KEY, DeckCache
+from practice.sampling import SamplingService
+from practice.scheduler import PRACTICE_ITEM_TYPES
+
+# Share of learned items per type in the benchmark user
+TYPE_SHARES = ((UserKnowledge.VOCABULARY, 0.5), (UserKnowledge.SENTENCE, 0.3), (UserKnowledge.AUDIO, 0.2))
+
+
+def legacy_draw_deck(user, count):
+    """'random' deck of practice_intro before practice/scheduler.py, kept as reference"""
+    all_vocabularies = Vocabulary.objects.filter(id__in=user.learned_ids('vocabulary'))
+    all_sentences = Sentence.objects.filter(id__in=user.learned_ids('sentence'))
+    all_audios = Audio.objects.filter(id__in=user.learned_ids('audio'))
+    return random.sample(
+        list(all_vocabularies) + list(all_sentences) + list(all_audios),
+        k=min(count, len(all_vocabularies) + len(all_sentences) + len(all_audios))
+    )
+
+
+def draw_deck(user, count):
+    """'random' deck and its items, as practice_intro starts a practice"""
+    deck = DeckCache.take(user.id, 'random', count)
+    items_by_type = {
+        item_type: ITEM_MODELS[item_type].objects.in_bulk([item_id for deck_type, item_id in deck if deck_type == item_type])
+        for item_type in {item_type for item_type, _ in deck}
+    }
+    return [items_by_type[item_type][item_id] for item_type, item_id in deck]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks building a random practice deck for users with growing numbers of learned items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='100,1000,10000', help='Comma separated numbers of learned items')
+        parser.add_argument('--count', type=int, default=20, help='Number of questions in a deck')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of decks built per measurement')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(',') if size.strip())
+        count = options['count']
+        repeat = options['repeat']
+
+        # Everything is created in a transaction rolled back at the end, the database is left as it was
+        with transaction.atomic():
+            items = self.create_items(sizes[-1])
+            users = []
+            self.stdout.write(f'Deck of {count} questions, {repeat} decks per measurement (ms per deck)')
+            self.stdout.write(
+                f'{"learned items":>14} {"legacy":>10} {"cold cache":>11} {"warm cache":>11} {"prebuilt":>9}'
+            )
+
+            for size in sizes:
+                user = User.objects.create(username=f'benchmark_{size}', email=f'benchmark_{size}@example.com')
+                # Nothing due, so every slot is sampled
+                due_at = timezone.now() + timedelta(days=30)
+                UserKnowledge.objects.bulk_create([
+                    UserKnowledge(user=user, item_type=item_type, item_id=item_id, due_at=due_at)
+                    for item_type, share in TYPE_SHARES
+                    for item_id in items[item_type][:round(size * share)]
+                ], batch_size=1000)
+
+                def cold():
+                    SamplingService.invalidate(user.id)
+                    draw_deck(user, count)
+
+                legacy_time = timeit.timeit(lambda: legacy_draw_deck(user, count), number=repeat)
+                # No deck is prebuilt yet, so these build it like a practice start after eviction
+                cold_time = timeit.timeit(cold, number=repeat)
+                warm_time = timeit.timeit(lambda: draw_deck(user, count), number=repeat)
+                prebuilt_time = self.time_prebuilt(user, count, repeat)
+                SamplingService.invalidate(user.id)
+                users.append(user)
+
+                self.stdout.write(
+                    f'{size:>14} {legacy_time / repeat * 1000:>10.2f} {cold_time / repeat * 1000:>11.2f} '
+                    f'{warm_time / repeat * 1000:>11.2f} {prebuilt_time / repeat * 1000:>9.2f}'
+                )
+
+            # Refills are only scheduled on commit, decks prebuilt here are dropped with the users
+            DeckCache._cache().delete_many([
+                PREBUILT_DECK_CACHE_KEY.format(user_id=user.id, practice_type=practice_type)
+                for user in users for practice_type in PRACTICE_ITEM_TYPES
+            ])
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark data rolled back'))
+
+    def time_prebuilt(self, user, count, repeat):
+        """Seconds of repeat practice starts from a deck prebuilt by the background refill"""
+        total = 0
+        for _ in range(repeat):
+            DeckCache.refill(user.id)
+            start = time.perf_counter()
+            draw_deck(user, count)
+            total += time.perf_counter() - start
+        return total
+
+    def create_items(self, size):
+        """Ids of new vocabularies, sentences and audios, enough for the largest size"""
+        per_type = {item_type: round(size * share) for item_type, share in TYPE_SHARES}
+        created = {
+            UserKnowledge.VOCABULARY: Vocabulary.objects.bulk_create(
+                [Vocabulary(word=f'palabra {i}', translation=f'word {i}') for i in range(per_type[UserKnowledge.VOCABULARY])],
+                batch_size=1000,
+            ),
+            UserKnowledge.SENTENCE: Sentence.objects.bulk_create(
+                [Sentence(sentence=f'frase {i}', translation=f'sentence {i}') for i in range(per_type[UserKnowledge.SENTENCE])],
+                batch_size=1000,
+            ),
+            UserKnowledge.AUDIO: Audio.objects.bulk_create(
+                [Audio(audio_url=f'/static/audio/benchmark/{i}.mp3', text=f'audio {i}') for i in range(per_type[UserKnowledge.AUDIO])],
+                batch_size=1000,
+            ),
+        }
+        return {item_type: [item.id for item in items] for item_type, items in created.items()}
@@ -0,0 +1,104 @@
+"""
+Random sampling of learned items without loading them
+
+Ids of the items a user learned are kept per item type in the cache as packed
+arrays. A sample of k items picks k random positions across the arrays of all
+requested types, as if they were one list, so every learned item has the same
+chance and item types come up in proportion to how many were learned.
+
+Only the draw is O(k): the arrays are still copied out of the cache, which is
+O(n) in learned items, but as one flat byte copy instead of loading n rows.
+The arrays are read from the database once per change. Learned items are only
+ever added, so before sampling the array lengths are compared with one grouped
+count of the user's items; an array of another length is stale, e.g. dropped
+by invalidate() in another process whose local cache this one doesn't share,
+and is read again.
+"""
+from array import array
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from base.models import UserKnowledge
+
+LEARNED_IDS_CACHE_KEY = 'practice:learned_ids:{user_id}:{item_type}'
+# Bytes per packed id
+ITEM_SIZE = array('Q').itemsize
+
+
+class SamplingService:
+    """Service class sampling learned (item_type, item_id) pairs of a user"""
+
+    @staticmethod
+    def cache_timeout():
+        return getattr(settings, 'LEARNED_IDS_CACHE_TIMEOUT', 3600)
+
+    @staticmethod
+    def learned_counts(user_id, item_types):
+        """Number of learned items per type, as currently stored in the database"""
+        counts = {item_type: 0 for item_type in item_types}
+        counts.update(
+            UserKnowledge.objects.filter(user_id=user_id, item_type__in=item_types)
+            .values_list('item_type').annotate(total=models.Count('id')).order_by()
+        )
+        return counts
+
+    @staticmethod
+    def learned_ids(user_id, item_type, expected_count=None):
+        """Packed ids of learned items of given type, read from the database on cache miss
+
+        Cached ids are read again when there aren't expected_count of them.
+        """
+        key = LEARNED_IDS_CACHE_KEY.format(user_id=user_id, item_type=item_type)
+        packed = cache.get(key)
+        if packed is not None and expected_count is not None and len(packed) != expected_count * ITEM_SIZE:
+            packed = None
+        if packed is None:
+            item_ids = array('Q', UserKnowledge.objects.filter(
+                user_id=user_id, item_type=item_type
+            ).order_by().values_list('item_id', flat=True))
+            packed = item_ids.tobytes()
+            cache.set(key, packed, SamplingService.cache_timeout())
+            return item_ids
+
+        item_ids = array('Q')
+        item_ids.frombytes(packed)
+        return item_ids
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop cached ids after the user's learned items changed
+
+        Only reaches this process's cache, others notice the change by the counts checked in sample.
+        """
+        cache.delete_many([
+            LEARNED_IDS_CACHE_KEY.format(user_id=user_id, item_type=item_type)
+            for item_type, _ in UserKnowledge.ITEM_TYPES
+        ])
+
+    @staticmethod
+    def sample(user_id, item_types, count, exclude=(), rng=random):
+        """Up to count random (item_type, item_id) pairs of learned items, pairs in exclude are never picked"""
+        counts = SamplingService.learned_counts(user_id, item_types)
+        populations = [
+            (item_type, SamplingService.learned_ids(user_id, item_type, counts[item_type])) for item_type in item_types
+        ]
+        total = sum(len(item_ids) for _, item_ids in populations)
+        exclude = set(exclude)
+
+        # Excluded pairs may take some of the positions, so enough are drawn to still get count items
+        positions = rng.sample(range(total), min(total, count + len(exclude)))
+
+        picked = []
+        for position in positions:
+            for item_type, item_ids in populations:
+                if position < len(item_ids):
+                    pair = (item_type, item_ids[position])
+                    break
+                position -= len(item_ids)
+            if pair not in exclude:
+                picked.append(pair)
+                if len(picked) == count:
+                    break
+        return picked
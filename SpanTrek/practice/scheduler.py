@@ -0,0 +1,94 @@
+"""
+Spaced repetition of learned items
+
+Every UserKnowledge row carries a review state (due_at, ease, interval_days,
+repetitions) updated with the SM-2 algorithm. Practice decks start with the
+most overdue items of the user, read through the (user, due_at) indexes, and
+slots left are filled by SamplingService, so starting a practice doesn't
+load a row per learned item. Answers of a whole practice are graded
+at practice_complete and written with one bulk update.
+"""
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+from base.models import UserKnowledge
+from .sampling import SamplingService
+
+# Item types drawn by every practice type
+PRACTICE_ITEM_TYPES = {
+    'random': (UserKnowledge.VOCABULARY, UserKnowledge.SENTENCE, UserKnowledge.AUDIO),
+    'vocabulary': (UserKnowledge.VOCABULARY,),
+    'sentence': (UserKnowledge.SENTENCE,),
+    'listening': (UserKnowledge.AUDIO,),
+}
+
+MIN_EASE = 1.3
+REVIEW_FIELDS = ['due_at', 'ease', 'interval_days', 'repetitions']
+
+
+class ReviewScheduler:
+    """Service class drawing practice decks and scheduling next reviews"""
+
+    @staticmethod
+    def build_deck(user_id, practice_type, count):
+        """[(item_type, item_id)] of up to count items, most due first
+
+        Slots no due item is left for are filled with random learned items.
+        """
+        item_types = PRACTICE_ITEM_TYPES[practice_type]
+        knowledge = UserKnowledge.objects.filter(user_id=user_id, due_at__lte=timezone.now())
+        if len(item_types) == 1:
+            knowledge = knowledge.filter(item_type=item_types[0])
+        deck = list(knowledge.order_by('due_at', 'id').values_list('item_type', 'item_id')[:count])
+
+        if len(deck) < count:
+            deck += SamplingService.sample(user_id, item_types, count - len(deck), exclude=deck)
+        return deck
+
+    @staticmethod
+    def grade(mistakes):
+        """SM-2 quality (0-5) of an answer given after that many wrong attempts"""
+        if mistakes <= 0:
+            return 5
+        if mistakes == 1:
+            return 3
+        return 1
+
+    @staticmethod
+    def review(knowledge, quality, now):
+        """Apply an answer of given quality to the review state, doesn't save"""
+        if quality >= 3:
+            if knowledge.repetitions == 0:
+                knowledge.interval_days = 1
+            elif knowledge.repetitions == 1:
+                knowledge.interval_days = 6
+            else:
+                knowledge.interval_days = round(knowledge.interval_days * knowledge.ease)
+            knowledge.repetitions += 1
+        else:
+            # Forgotten, asked again in the next practice
+            knowledge.repetitions = 0
+            knowledge.interval_days = 0
+
+        knowledge.ease = max(MIN_EASE, knowledge.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        knowledge.due_at = now + timedelta(days=knowledge.interval_days)
+
+    @staticmethod
+    def record_results(user, results):
+        """Schedule reviews of {(item_type, item_id): mistakes} with one read and one bulk update, returns updated count"""
+        if not results:
+            return 0
+
+        items = models.Q(pk__in=[])
+        for item_type in {item_type for item_type, _ in results}:
+            item_ids = [item_id for result_type, item_id in results if result_type == item_type]
+            items |= models.Q(item_type=item_type, item_id__in=item_ids)
+
+        now = timezone.now()
+        knowledge = list(user.knowledge.filter(items).only('id', 'item_type', 'item_id', *REVIEW_FIELDS))
+        for item in knowledge:
+            ReviewScheduler.review(item, ReviewScheduler.grade(results[(item.item_type, item.item_id)]), now)
+
+        UserKnowledge.objects.bulk_update(knowledge, REVIEW_FIELDS)
+        return len(knowledge)
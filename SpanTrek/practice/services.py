@@ -0,0 +1,158 @@
+"""
+Daily challenge service for selecting and progressing users' daily challenges
+"""
+from .models import DailyChallenge
+from functools import lru_cache
+import random
+import re
+
+
+LESSON_EVENT = 'lesson'
+PRACTICE_EVENT = 'practice'
+PRACTICE_TYPES = ('random', 'vocabulary', 'sentence', 'listening')
+
+
+class ChallengeEvent:
+    """Lesson completion or practice completion progressing daily challenges"""
+
+    def __init__(self, practice_type=None, lesson=None):
+        self.kind = LESSON_EVENT if lesson is not None else PRACTICE_EVENT
+        self.practice_type = practice_type
+        self.lesson = lesson
+
+    def lesson_items_count(self, item_type):
+        """Number of lesson's vocabularies/sentences/audios from denormalized counters"""
+        return {
+            'vocabulary': self.lesson.vocabularies_count,
+            'sentence': self.lesson.sentences_count,
+            'audio': self.lesson.audios_count,
+        }[item_type]
+
+
+class ChallengeHandler:
+    """Progress rule of one challenge code prefix, subscribed to given event kinds"""
+    events = ()
+
+    def progress(self, event):
+        return 0
+
+
+class ExperienceChallenge(ChallengeHandler):
+    """EXx - Earn x experience points"""
+    events = (LESSON_EVENT, PRACTICE_EVENT)
+
+    def progress(self, event):
+        if event.kind == LESSON_EVENT:
+            return 100
+        return 25 if event.practice_type in PRACTICE_TYPES else 0
+
+
+class CompleteLessonsChallenge(ChallengeHandler):
+    """CxL - Complete x lessons"""
+    events = (LESSON_EVENT,)
+
+    def progress(self, event):
+        return 1
+
+
+class PracticeChallenge(ChallengeHandler):
+    """Px - Practice x times, RPx/VPx/SPx/LPx - Do given practice x times"""
+    events = (PRACTICE_EVENT,)
+
+    def __init__(self, practice_type=None):
+        self.practice_type = practice_type
+
+    def progress(self, event):
+        if self.practice_type is None:
+            return 1 if event.practice_type in PRACTICE_TYPES else 0
+        return 1 if event.practice_type == self.practice_type else 0
+
+
+class LearnNewChallenge(ChallengeHandler):
+    """NWx/NSx/NAx - Learn x new words/sentences/audio clips"""
+    events = (LESSON_EVENT,)
+
+    def __init__(self, item_type):
+        self.item_type = item_type
+
+    def progress(self, event):
+        return event.lesson_items_count(self.item_type)
+
+
+# Code prefix -> handler, see DailyChallenge docstring for codes
+CHALLENGE_HANDLERS = {
+    'EX': ExperienceChallenge(),
+    'C': CompleteLessonsChallenge(),
+    'P': PracticeChallenge(),
+    'RP': PracticeChallenge('random'),
+    'VP': PracticeChallenge('vocabulary'),
+    'SP': PracticeChallenge('sentence'),
+    'LP': PracticeChallenge('listening'),
+    'NW': LearnNewChallenge('vocabulary'),
+    'NS': LearnNewChallenge('sentence'),
+    'NA': LearnNewChallenge('audio'),
+}
+
+CHALLENGE_CODE_PREFIX = re.compile(r'^[A-Z]+')
+
+
+@lru_cache(maxsize=None)
+def parse_challenge_code(code):
+    """Handler of a challenge code (e.g. 'NW5' -> LearnNewChallenge), None for unknown codes"""
+    prefix = CHALLENGE_CODE_PREFIX.match(code)
+    return CHALLENGE_HANDLERS.get(prefix.group()) if prefix else None
+
+
+class DailyChallengeService:
+    """Service class to handle daily challenge selection and progress"""
+
+    DAILY_CHALLENGES_COUNT = 3
+
+    @staticmethod
+    def load_catalogue():
+        """All challenges as plain dicts, loaded once and shared by every selection"""
+        return list(DailyChallenge.objects.order_by('id').values('code', 'description', 'max_progress'))
+
+    @staticmethod
+    def select_challenges(catalogue, rng=random):
+        """Random daily challenges from catalogue in the format stored in User.daily_challenges"""
+        count = min(DailyChallengeService.DAILY_CHALLENGES_COUNT, len(catalogue))
+        return [
+            {
+                'code': challenge['code'],
+                'description': challenge['description'],
+                'progress': 0,
+                'max_progress': challenge['max_progress'],
+                'completed': False
+            }
+            for challenge in rng.sample(catalogue, k=count)
+        ]
+
+    @staticmethod
+    def select_challenges_batch(catalogue, users_count, seed=None):
+        """Selections for users_count users, reproducible when seed is given"""
+        rng = random.Random(seed)
+        return [DailyChallengeService.select_challenges(catalogue, rng) for _ in range(users_count)]
+
+    @staticmethod
+    def progress_challenges(daily_challenges, event):
+        """Progress challenges subscribed to the event, returns True if any challenge changed"""
+        changed = False
+        for challenge in daily_challenges:
+            if challenge['completed']:
+                continue
+
+            handler = parse_challenge_code(challenge['code'])
+            if handler is None or event.kind not in handler.events:
+                continue
+
+            progress = handler.progress(event)
+            if progress:
+                challenge['progress'] += progress
+                changed = True
+
+            if challenge['progress'] >= challenge['max_progress']:
+                challenge['completed'] = True
+                changed = True
+
+        return changed
@@ -1,3 +1,284 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+import random
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from base.models import User, UserKnowledge
+from .deck import PREBUILT_DECK_CACHE_KEY, DeckCache, decode_deck, encode_deck
+from .sampling import SamplingService
+from .scheduler import MIN_EASE, PRACTICE_ITEM_TYPES, ReviewScheduler
+from .services import (
+    ChallengeEvent, CompleteLessonsChallenge, DailyChallengeService, ExperienceChallenge, parse_challenge_code,
+)
+
+
+class SamplingServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='sampler', email='sampler@example.com')
+        self.learn(UserKnowledge.VOCABULARY, range(1, 6))
+        self.learn(UserKnowledge.SENTENCE, range(1, 4))
+
+    def tearDown(self):
+        SamplingService.invalidate(self.user.id)
+
+    def learn(self, item_type, item_ids):
+        UserKnowledge.objects.bulk_create([
+            UserKnowledge(user=self.user, item_type=item_type, item_id=item_id) for item_id in item_ids
+        ])
+
+    def test_sample_without_repeats_or_excluded(self):
+        item_types = (UserKnowledge.VOCABULARY, UserKnowledge.SENTENCE)
+        exclude = [(UserKnowledge.VOCABULARY, 1)]
+        sample = SamplingService.sample(self.user.id, item_types, 20, exclude=exclude, rng=random.Random(1))
+
+        self.assertEqual(len(sample), 7)
+        self.assertEqual(len(set(sample)), 7)
+        self.assertNotIn(exclude[0], sample)
+
+    def test_items_learned_without_invalidate(self):
+        item_types = (UserKnowledge.AUDIO,)
+        self.assertEqual(SamplingService.sample(self.user.id, item_types, 5), [])
+
+        # Like a lesson completed in another process, whose invalidate() never reaches this cache
+        self.learn(UserKnowledge.AUDIO, [7, 8])
+        self.assertEqual(
+            sorted(SamplingService.sample(self.user.id, item_types, 5)),
+            [(UserKnowledge.AUDIO, 7), (UserKnowledge.AUDIO, 8)],
+        )
+
+
+class ReviewSchedulerTests(SimpleTestCase):
+    now = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+    def test_grade(self):
+        self.assertEqual([ReviewScheduler.grade(mistakes) for mistakes in (0, 1, 2, 5)], [5, 3, 1, 1])
+
+    def test_correct_answers_grow_interval(self):
+        knowledge = UserKnowledge()
+        intervals = []
+        for _ in range(4):
+            ReviewScheduler.review(knowledge, 5, self.now)
+            intervals.append(knowledge.interval_days)
+
+        # 1 day, 6 days, then the previous interval times the ease, which grows by 0.1 per perfect answer
+        self.assertEqual(intervals, [1, 6, round(6 * 2.7), round(round(6 * 2.7) * 2.8)])
+        self.assertAlmostEqual(knowledge.ease, 2.9)
+        self.assertEqual(knowledge.repetitions, 4)
+        self.assertEqual(knowledge.due_at, self.now + timedelta(days=intervals[-1]))
+
+    def test_hard_answer_lowers_ease(self):
+        knowledge = UserKnowledge()
+        ReviewScheduler.review(knowledge, 3, self.now)
+        self.assertAlmostEqual(knowledge.ease, 2.36)
+        self.assertEqual(knowledge.interval_days, 1)
+        self.assertEqual(knowledge.repetitions, 1)
+
+    def test_forgotten_item_starts_over(self):
+        knowledge = UserKnowledge(ease=1.5, interval_days=20, repetitions=5)
+        ReviewScheduler.review(knowledge, 1, self.now)
+        self.assertEqual(knowledge.repetitions, 0)
+        self.assertEqual(knowledge.interval_days, 0)
+        self.assertEqual(knowledge.due_at, self.now)
+        # 1.5 - 0.54 is below the floor
+        self.assertEqual(knowledge.ease, MIN_EASE)
+
+
+# Most overdue first: vocabulary 3, sentence 1, vocabulary 2
+DUE_ITEMS = [(UserKnowledge.VOCABULARY, 3), (UserKnowledge.SENTENCE, 1), (UserKnowledge.VOCABULARY, 2)]
+NOT_DUE_ITEMS = [(UserKnowledge.VOCABULARY, 10), (UserKnowledge.VOCABULARY, 11), (UserKnowledge.AUDIO, 12)]
+
+
+def learn_items(user, due, not_due):
+    """Knowledge rows of due items, most overdue first, and of items due in 5 days"""
+    now = timezone.now()
+    UserKnowledge.objects.bulk_create(
+        [
+            UserKnowledge(user=user, item_type=item_type, item_id=item_id, due_at=now - timedelta(days=len(due) - i))
+            for i, (item_type, item_id) in enumerate(due)
+        ] + [
+            UserKnowledge(user=user, item_type=item_type, item_id=item_id, due_at=now + timedelta(days=5))
+            for item_type, item_id in not_due
+        ]
+    )
+
+
+class BuildDeckTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='deck', email='deck@example.com')
+        learn_items(self.user, DUE_ITEMS, NOT_DUE_ITEMS)
+        self.due = DUE_ITEMS
+        self.not_due = NOT_DUE_ITEMS
+
+    def tearDown(self):
+        SamplingService.invalidate(self.user.id)
+
+    def test_only_due_items_when_enough(self):
+        self.assertEqual(ReviewScheduler.build_deck(self.user.id, 'random', 2), self.due[:2])
+
+    def test_due_items_first_then_sampled(self):
+        deck = ReviewScheduler.build_deck(self.user.id, 'random', 5)
+        self.assertEqual(deck[:3], self.due)
+        self.assertEqual(len(set(deck)), 5)
+        self.assertTrue(set(deck[3:]) <= set(self.not_due))
+
+    def test_every_learned_item_once_when_count_is_larger(self):
+        deck = ReviewScheduler.build_deck(self.user.id, 'random', 20)
+        self.assertEqual(deck[:3], self.due)
+        self.assertEqual(sorted(deck[3:]), sorted(self.not_due))
+
+    def test_practice_type_limits_item_types(self):
+        deck = ReviewScheduler.build_deck(self.user.id, 'vocabulary', 10)
+        vocabulary_due = [item for item in self.due if item[0] == UserKnowledge.VOCABULARY]
+        self.assertEqual(deck[:2], vocabulary_due)
+        self.assertEqual(sorted(deck[2:]), [(UserKnowledge.VOCABULARY, 10), (UserKnowledge.VOCABULARY, 11)])
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True, PREBUILT_DECK_SIZE=4)
+class DeckCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='decks', email='decks@example.com')
+        learn_items(self.user, DUE_ITEMS, NOT_DUE_ITEMS)
+        self.decks = caches['practice_decks']
+        self.decks.clear()
+
+    def tearDown(self):
+        SamplingService.invalidate(self.user.id)
+
+    def prebuilt(self, practice_type):
+        token = self.decks.get(PREBUILT_DECK_CACHE_KEY.format(user_id=self.user.id, practice_type=practice_type))
+        return None if token is None else decode_deck(token)
+
+    def test_refill_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            DeckCache.schedule_refill(self.user.id)
+            self.assertIsNone(self.prebuilt('random'))
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.prebuilt('random')[:3], DUE_ITEMS)
+        self.assertEqual(len(self.prebuilt('random')), 4)
+        self.assertEqual(self.prebuilt('vocabulary')[:2], [DUE_ITEMS[0], DUE_ITEMS[2]])
+        self.assertEqual(self.prebuilt('sentence'), [(UserKnowledge.SENTENCE, 1)])
+        self.assertEqual(self.prebuilt('listening'), [(UserKnowledge.AUDIO, 12)])
+
+    def test_take_uses_prebuilt_deck_once(self):
+        DeckCache.refill(self.user.id)
+        prebuilt = self.prebuilt('random')
+
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(0):
+            deck = DeckCache.take(self.user.id, 'random', 3)
+
+        self.assertEqual(sorted(deck), sorted(prebuilt[:3]))
+        self.assertIsNone(self.prebuilt('random'))
+        # Refilled when the practice completes
+        self.assertEqual(callbacks, [])
+
+    def test_short_prebuilt_deck_serves_any_count(self):
+        DeckCache.refill(self.user.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(DeckCache.take(self.user.id, 'listening', 10), [(UserKnowledge.AUDIO, 12)])
+
+    def test_count_larger_than_prebuilt_deck_is_built(self):
+        DeckCache.refill(self.user.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            deck = DeckCache.take(self.user.id, 'random', 6)
+
+        self.assertEqual(sorted(deck), sorted(DUE_ITEMS + NOT_DUE_ITEMS))
+        self.assertEqual(len(self.prebuilt('random')), 4)
+        self.assertEqual(callbacks, [])
+
+    def test_missing_deck_is_built_and_refilled(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            deck = DeckCache.take(self.user.id, 'random', 3)
+            self.assertIsNone(self.prebuilt('random'))
+
+        self.assertEqual(sorted(deck), sorted(DUE_ITEMS))
+        self.assertEqual(len(callbacks), 1)
+        for practice_type in PRACTICE_ITEM_TYPES:
+            self.assertIsNotNone(self.prebuilt(practice_type))
+
+
+class DeckTokenTests(SimpleTestCase):
+    def test_round_trip(self):
+        deck = [(UserKnowledge.VOCABULARY, 12), (UserKnowledge.SENTENCE, 7), (UserKnowledge.AUDIO, 40),
+                (UserKnowledge.VOCABULARY, 2 ** 40)]
+        token = encode_deck(deck)
+        self.assertEqual(token, f'v12,s7,a40,v{2 ** 40}')
+        self.assertEqual(decode_deck(token), deck)
+
+    def test_empty_deck(self):
+        self.assertEqual(encode_deck([]), '')
+        self.assertEqual(decode_deck(''), [])
+        self.assertEqual(decode_deck(None), [])
+
+
+# Code, progress of a completed lesson and of each practice type
+CHALLENGE_PROGRESS = [
+    ('EX50', 100, {'random': 25, 'vocabulary': 25, 'sentence': 25, 'listening': 25}),
+    # Lessons only, practices used to progress lesson challenges too
+    ('C3L', 1, {'random': 0, 'vocabulary': 0, 'sentence': 0, 'listening': 0}),
+    ('P5', 0, {'random': 1, 'vocabulary': 1, 'sentence': 1, 'listening': 1}),
+    ('RP2', 0, {'random': 1, 'vocabulary': 0, 'sentence': 0, 'listening': 0}),
+    ('VP2', 0, {'random': 0, 'vocabulary': 1, 'sentence': 0, 'listening': 0}),
+    ('SP2', 0, {'random': 0, 'vocabulary': 0, 'sentence': 1, 'listening': 0}),
+    ('LP2', 0, {'random': 0, 'vocabulary': 0, 'sentence': 0, 'listening': 1}),
+    ('NW20', 4, {'random': 0, 'vocabulary': 0, 'sentence': 0, 'listening': 0}),
+    ('NS20', 2, {'random': 0, 'vocabulary': 0, 'sentence': 0, 'listening': 0}),
+    ('NA20', 1, {'random': 0, 'vocabulary': 0, 'sentence': 0, 'listening': 0}),
+]
+
+
+def challenge(code, progress=0, max_progress=1000):
+    return {'code': code, 'description': '', 'progress': progress, 'max_progress': max_progress, 'completed': False}
+
+
+class ChallengeProgressTests(SimpleTestCase):
+    def setUp(self):
+        # Only the denormalized counters of the lesson are read
+        lesson = SimpleNamespace(vocabularies_count=4, sentences_count=2, audios_count=1)
+        self.lesson_event = ChallengeEvent(lesson=lesson)
+
+    def progress(self, code, event):
+        challenges = [challenge(code)]
+        changed = DailyChallengeService.progress_challenges(challenges, event)
+        self.assertEqual(changed, challenges[0]['progress'] > 0)
+        return challenges[0]['progress']
+
+    def test_progress_of_every_code(self):
+        for code, lesson_progress, practice_progress in CHALLENGE_PROGRESS:
+            with self.subTest(code=code, event='lesson'):
+                self.assertEqual(self.progress(code, self.lesson_event), lesson_progress)
+            for practice_type, progress in practice_progress.items():
+                with self.subTest(code=code, event=practice_type):
+                    self.assertEqual(self.progress(code, ChallengeEvent(practice_type=practice_type)), progress)
+
+    def test_unknown_practice_type_progresses_nothing(self):
+        for code, _, _ in CHALLENGE_PROGRESS:
+            with self.subTest(code=code):
+                self.assertEqual(self.progress(code, ChallengeEvent(practice_type='writing')), 0)
+
+    def test_parse_challenge_code(self):
+        self.assertIsInstance(parse_challenge_code('EX150'), ExperienceChallenge)
+        self.assertIsInstance(parse_challenge_code('C3L'), CompleteLessonsChallenge)
+        self.assertIsNone(parse_challenge_code('P5').practice_type)
+        self.assertEqual(parse_challenge_code('LP3').practice_type, 'listening')
+        self.assertEqual(parse_challenge_code('NA5').item_type, 'audio')
+        # Handlers are shared by every code of a family
+        self.assertIs(parse_challenge_code('NW5'), parse_challenge_code('NW10'))
+        for code in ('XY3', '5', '', 'ex5'):
+            with self.subTest(code=code):
+                self.assertIsNone(parse_challenge_code(code))
+
+    def test_completed_challenges_stop_progressing(self):
+        challenges = [challenge('C3L', progress=2, max_progress=3), challenge('XY3'), challenge('P5')]
+
+        self.assertTrue(DailyChallengeService.progress_challenges(challenges, self.lesson_event))
+        self.assertEqual((challenges[0]['progress'], challenges[0]['completed']), (3, True))
+        # Unknown codes and codes not subscribed to lessons are left alone
+        self.assertEqual([challenges[1], challenges[2]], [challenge('XY3'), challenge('P5')])
+
+        self.assertFalse(DailyChallengeService.progress_challenges(challenges, self.lesson_event))
+        self.assertEqual(challenges[0]['progress'], 3)
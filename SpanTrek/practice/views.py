@@ -1,7 +1,18 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from lessons.models import Vocabulary, Sentence, Audio
-import random
+from .deck import DeckCache, decode_deck, encode_deck, practice_items
+from .scheduler import ReviewScheduler
+
+
+def record_mistakes(request, index):
+    """Keep wrong attempts at item index reported by the next page request, first report wins"""
+    mistakes = request.GET.get('mistakes')
+    if mistakes is None or not mistakes.isdigit() or index < 0:
+        return
+    practice_mistakes = request.session.get('practice_mistakes', {})
+    if str(index) not in practice_mistakes:
+        practice_mistakes[str(index)] = int(mistakes)
+        request.session['practice_mistakes'] = practice_mistakes
 
 
 @login_required(login_url='login_page')
@@ -13,57 +24,13 @@ def practice_intro(request, practice_type):
     
     request.session['question_count'] = question_count  
 
-    practice_set = []
-    learned_words = request.user.words_learned or []
-    learned_sentences = request.user.sentences_learned or []
-    learned_audios = request.user.audio_learned or []
-    all_vocabularies = Vocabulary.objects.filter(word__in=learned_words).distinct()
-    all_sentences = Sentence.objects.filter(sentence__in=learned_sentences).distinct()
-    all_audios = Audio.objects.filter(text__in=learned_audios).distinct()
-    match practice_type:
-        case 'random':
-            practice_set = random.sample(
-                list(all_vocabularies) + list(all_sentences) + list(all_audios), 
-                k=min(int(question_count), len(all_vocabularies) + len(all_sentences) + len(all_audios))
-            ) 
-        case 'vocabulary':
-            entire_set = all_vocabularies
-        case 'sentence':
-            entire_set = all_sentences
-        case 'listening':
-            entire_set = all_audios
-
-    practice_set = practice_set or random.sample(list(entire_set), k=min(int(question_count), len(entire_set)))
-
     # Store practice type and practice set in session for navigation
     if request.method == 'POST':
         request.session['practice_type'] = practice_type
-        practice_items = []
-        for item in practice_set:
-            item_data = {
-                'type': item.__class__.__name__.lower(),
-            }
-            # Vocabulary
-            if hasattr(item, 'word'):  
-                item_data.update({
-                    'word': item.word,
-                    'translation': item.translation,
-                })
-            # Sentence
-            elif hasattr(item, 'sentence'):
-                item_data.update({
-                    'sentence': item.sentence,
-                    'translation': item.translation,
-                })
-            # Audio
-            elif hasattr(item, 'audio_url'):  
-                item_data.update({
-                    'audio_url': item.audio_url,
-                    'text': item.text,
-                })
-            practice_items.append(item_data)
-        
-        request.session['practice_items'] = practice_items
+        # Only type codes and ids are kept, items are read when their page is shown
+        deck = DeckCache.take(request.user.id, practice_type, int(question_count))
+        request.session['practice_deck'] = encode_deck(deck)
+        request.session['practice_mistakes'] = {}
         return redirect('practice:practice_main', index=0)
 
     context = {
@@ -75,19 +42,27 @@ def practice_intro(request, practice_type):
 
 @login_required(login_url='login_page')
 def practice_main(request, index):
-    practice_items = request.session.get('practice_items', [])
+    deck = decode_deck(request.session.get('practice_deck', ''))
 
-    if not practice_items or index >= len(practice_items):
+    if not deck or index >= len(deck):
         return redirect('practice:practice_intro', practice_type='vocabulary')
+
+    # Previous item was answered when its page moved here
+    record_mistakes(request, index - 1)
     
-    current_exercise = practice_items[index]
+    current_exercise = practice_items.get(*deck[index])
+    if current_exercise is None:
+        # Item removed by a lesson import since the practice started
+        if index + 1 < len(deck):
+            return redirect('practice:practice_main', index=index + 1)
+        return redirect('practice:practice_complete')
     current_exercise = [current_exercise['type'], (current_exercise.get('word') or current_exercise.get('sentence') or current_exercise.get('audio_url')), (current_exercise.get('translation') or current_exercise.get('text'))]
     
     if current_exercise[0] == 'audio': 
         current_exercise.append('Write what you hear')
         current_exercise[2], current_exercise[3] = current_exercise[3], current_exercise[2]
     
-    total_count = len(practice_items)
+    total_count = len(deck)
     current_number = index + 1
 
     # Check if there's a next item
@@ -108,17 +83,26 @@ def practice_main(request, index):
 @login_required(login_url='login_page')
 def practice_complete(request):
     
-    practice_items = request.session.get('practice_items', [])
+    deck = decode_deck(request.session.get('practice_deck', ''))
     
-    if not practice_items:
+    if not deck:
         return redirect('practice:practice_intro', practice_type='vocabulary')
     
     # Determine practice type from the session or default to 'vocabulary'
     practice_type = request.session.get('practice_type', 'vocabulary')
-    total_count = len(practice_items)
+    total_count = len(deck)
+
+    # Schedule next reviews of all answered items at once, mistakes are dropped so a reload doesn't repeat it
+    record_mistakes(request, total_count - 1)
+    practice_mistakes = request.session.pop('practice_mistakes', {})
+    ReviewScheduler.record_results(request.user, {
+        deck[int(index)]: mistakes for index, mistakes in practice_mistakes.items() if int(index) < total_count
+    })
+    # Due items changed, the next practice starts from a fresh deck
+    DeckCache.schedule_refill(request.user.id)
     
+    # Progresses daily challenges as well
     request.user.update_progress_after_practice(practice_type=practice_type)
-    request.user.progress_daily_challenges(practice_type=practice_type)
 
     context = {
         'practice_type': practice_type,
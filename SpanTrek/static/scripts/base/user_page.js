@@ -3,7 +3,7 @@ class ActivityCalendar {
     constructor() {
         this.currentDate = new Date();
         this.today = new Date();
-        this.activeDays = window.userActivityDays || [];
+        this.activeDays = new Set(window.userActivityDays || []);
         this.init();
     }
 
@@ -103,7 +103,7 @@ class ActivityCalendar {
             }
 
             const dayDateISO = this.formatDateToISO(dayDate);
-            if (this.activeDays.includes(dayDateISO)) {
+            if (this.activeDays.has(dayDateISO)) {
                 dayElement.classList.add("active");
                 dayElement.title = "Completed lesson this day";
             }
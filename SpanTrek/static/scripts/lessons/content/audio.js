@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", function () {
+function initAudio(signal) {
     const playPauseBtn = document.getElementById("playPauseBtn");
     const playIcon = document.querySelector(".play-icon");
     const pauseIcon = document.querySelector(".pause-icon");
@@ -9,32 +9,67 @@ document.addEventListener("DOMContentLoaded", function () {
 
     let audio = null;
     let isPlaying = false;
+    // [start, duration] of the clip inside the lesson sprite, null when playing the clip file itself
+    let clip = null;
 
-    // Initialize audio when page loads
-    function initializeAudio() {
-        // Get audio URL from the content variable
-        const audioUrl = window.audioContentUrl;
+    function clipStart() {
+        return clip ? clip[0] : 0;
+    }
 
-        if (audioUrl && audioUrl !== "link_audio") {
-            audio = new Audio(audioUrl);
+    function clipDuration() {
+        return clip ? clip[1] : audio.duration;
+    }
+
+    function clipTime() {
+        return Math.max(0, audio.currentTime - clipStart());
+    }
 
-            audio.addEventListener("loadedmetadata", function () {
-                updateDuration();
-            });
+    function loadAudio(audioUrl, sprite) {
+        clip = sprite ? sprite.clips[audioUrl] : null;
+        audio = new Audio(clip ? sprite.url : audioUrl);
 
-            audio.addEventListener("timeupdate", function () {
-                updateProgress();
-            });
+        audio.addEventListener("loadedmetadata", function () {
+            if (clip) {
+                audio.currentTime = clipStart();
+            }
+            updateDuration();
+        });
 
-            audio.addEventListener("ended", function () {
+        audio.addEventListener("timeupdate", function () {
+            // Sprite keeps playing into the next clip, so the clip ends here
+            if (clip && audio.currentTime >= clipStart() + clipDuration()) {
                 stopAudio();
                 resetProgress();
-            });
+                return;
+            }
+            updateProgress();
+        });
 
-            audio.addEventListener("error", function () {
-                console.error("Error loading audio file:", audioUrl);
-                audioTitle.textContent = "Audio Error";
-            });
+        audio.addEventListener("ended", function () {
+            stopAudio();
+            resetProgress();
+        });
+
+        audio.addEventListener("error", function () {
+            if (clip) {
+                // Sprite unavailable, falling back to the clip file
+                console.warn("Error loading audio sprite, using clip file:", audioUrl);
+                loadAudio(audioUrl, null);
+                return;
+            }
+            console.error("Error loading audio file:", audioUrl);
+            audioTitle.textContent = "Audio Error";
+        });
+    }
+
+    // Initialize audio when page loads
+    function initializeAudio() {
+        // Get audio URL from the content variable
+        const audioUrl = window.audioContentUrl;
+
+        if (audioUrl && audioUrl !== "link_audio") {
+            const sprite = window.audioSprite;
+            loadAudio(audioUrl, sprite && sprite.clips[audioUrl] ? sprite : null);
         } else {
             audioTitle.textContent = "No Audio Available";
             playPauseBtn.disabled = true;
@@ -57,6 +92,9 @@ document.addEventListener("DOMContentLoaded", function () {
 
     function playAudio() {
         if (audio) {
+            if (clip && (audio.currentTime < clipStart() || audio.currentTime >= clipStart() + clipDuration())) {
+                audio.currentTime = clipStart();
+            }
             audio
                 .play()
                 .then(() => {
@@ -83,19 +121,19 @@ document.addEventListener("DOMContentLoaded", function () {
 
     function updateProgress() {
         if (audio && audio.duration) {
-            const percentage = (audio.currentTime / audio.duration) * 100;
+            const percentage = Math.min(100, (clipTime() / clipDuration()) * 100);
             progressFill.style.width = percentage + "%";
 
             // Update time display
-            const currentTime = formatTime(audio.currentTime);
-            const totalTime = formatTime(audio.duration);
+            const currentTime = formatTime(clipTime());
+            const totalTime = formatTime(clipDuration());
             audioDuration.textContent = `${currentTime} / ${totalTime}`;
         }
     }
 
     function updateDuration() {
         if (audio && audio.duration) {
-            const totalTime = formatTime(audio.duration);
+            const totalTime = formatTime(clipDuration());
             audioDuration.textContent = `0:00 / ${totalTime}`;
         }
     }
@@ -103,7 +141,7 @@ document.addEventListener("DOMContentLoaded", function () {
     function resetProgress() {
         progressFill.style.width = "0%";
         if (audio) {
-            audio.currentTime = 0;
+            audio.currentTime = clipStart();
         }
     }
 
@@ -122,11 +160,23 @@ document.addEventListener("DOMContentLoaded", function () {
             const width = rect.width;
             const percentage = clickX / width;
 
-            audio.currentTime = percentage * audio.duration;
+            audio.currentTime = clipStart() + percentage * clipDuration();
             updateProgress();
         }
     });
 
+    // Playback stops when the lesson player moves to another step
+    if (signal) {
+        signal.addEventListener("abort", stopAudio);
+    }
+
     // Initialize audio when page loads
     initializeAudio();
-});
+}
+
+// Steps of a lesson are initialized by the lesson player, other pages on load
+if (window.lessonPlayer) {
+    window.lessonPlayer.register("audio", initAudio);
+} else {
+    document.addEventListener("DOMContentLoaded", () => initAudio());
+}
@@ -0,0 +1,43 @@
+// One audio file per lesson, audio blocks seek into it instead of loading their own clip
+(function () {
+    const spriteData = document.getElementById("audio-sprite");
+    if (!spriteData) {
+        return;
+    }
+
+    const sprite = JSON.parse(spriteData.textContent);
+    if (!sprite || !sprite.original) {
+        return;
+    }
+
+    // Lowest bitrate variant on slow connections or with data saver on
+    function pickVariant() {
+        const connection = navigator.connection;
+        const slowConnection =
+            connection &&
+            (connection.saveData || ["slow-2g", "2g", "3g"].includes(connection.effectiveType));
+        const variants = Object.keys(sprite)
+            .filter((name) => name !== "original")
+            .sort((a, b) => parseInt(a) - parseInt(b));
+
+        if (slowConnection && variants.length) {
+            return sprite[variants[0]];
+        }
+        return sprite.original;
+    }
+
+    // Clips are a little longer in lower bitrate variants, so offsets come with the variant
+    const variant = pickVariant();
+
+    // Downloaded once, every following exercise of the lesson plays it from the browser cache
+    const preload = document.createElement("link");
+    preload.rel = "prefetch";
+    preload.as = "audio";
+    preload.href = variant.url;
+    document.head.appendChild(preload);
+
+    window.audioSprite = {
+        url: variant.url,
+        clips: variant.clips || {},
+    };
+})();
@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", function () {
+function initText() {
     const textContent = document.querySelector(".text-content");
 
     if (textContent) {
@@ -7,4 +7,11 @@ document.addEventListener("DOMContentLoaded", function () {
         const formattedText = originalText.replace(/\n/g, "<br>");
         textContent.innerHTML = formattedText;
     }
-});
+}
+
+// Steps of a lesson are initialized by the lesson player, other pages on load
+if (window.lessonPlayer) {
+    window.lessonPlayer.register("text", initText);
+} else {
+    document.addEventListener("DOMContentLoaded", () => initText());
+}
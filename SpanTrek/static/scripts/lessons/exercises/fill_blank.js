@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", function () {
+function initFillBlank(signal) {
     const checkBtn = document.querySelector(".check-btn-fill");
     const resetBtn = document.querySelector(".reset-btn-fill");
     const showAnswerBtn = document.querySelector(".show-answer-btn-fill");
@@ -29,7 +29,7 @@ document.addEventListener("DOMContentLoaded", function () {
         // Don't check if no choices are selected
         if (!userAnswered) return;
 
-        // Visual feedback
+        // Blanks are marked locally right away
         blankInputs.forEach((input) => {
             const userAnswer = input.value.trim();
             const correctAnswer = input.getAttribute("data-answer");
@@ -55,9 +55,25 @@ document.addEventListener("DOMContentLoaded", function () {
         const allCorrect = Array.from(blankInputs).every((input) =>
             input.classList.contains("correct")
         );
+        const answer = Array.from(blankInputs).map((input) => input.value.trim());
+
+        // Whether the exercise is done is decided by the server, which also records the answer
+        checkBtn.disabled = true;
+        const verdict = window.lessonPlayer
+            ? window.lessonPlayer.checkAnswer(answer, allCorrect)
+            : Promise.resolve(allCorrect);
+        verdict.then((isCorrect) => {
+            checkBtn.disabled = false;
+            showResult(isCorrect);
+        });
+    });
 
-        // Visual feedback
-        if (allCorrect) {
+    function showResult(isCorrect) {
+        if (isCorrect) {
+            blankInputs.forEach((input) => {
+                input.classList.remove("incorrect");
+                input.classList.add("correct");
+            });
             checkBtn.style.background = "rgba(76, 175, 80, 0.2)";
             checkBtn.style.borderColor = "#4caf50";
             checkBtn.style.color = "#4caf50";
@@ -90,26 +106,6 @@ document.addEventListener("DOMContentLoaded", function () {
                 checkBtn.textContent = "Check answer";
             }, 2000);
         }
-
-        sendAnswersToBackend(allCorrect);
-    });
-
-    // Send answers to backend
-    function sendAnswersToBackend(allCorrect) {
-        const form = document.querySelector("form");
-        const formData = new FormData(form);
-
-        // Add additional data
-        formData.append("exercise_completed", allCorrect);
-        formData.append("current_lesson_progress", current_lesson_progress);
-
-        fetch(form.action || window.location.href, {
-            method: "POST",
-            body: formData,
-            headers: {
-                "X-Requested-With": "XMLHttpRequest", // Mark as AJAX request
-            },
-        });
     }
 
     // Show answer
@@ -206,7 +202,7 @@ document.addEventListener("DOMContentLoaded", function () {
             }
             return;
         }
-    });
+    }, { signal });
 
     // Enter key navigation
     blankInputs.forEach((input) => {
@@ -219,4 +215,11 @@ document.addEventListener("DOMContentLoaded", function () {
             }
         });
     });
-});
+}
+
+// Steps of a lesson are initialized by the lesson player, other pages on load
+if (window.lessonPlayer) {
+    window.lessonPlayer.register("fill_blank", initFillBlank);
+} else {
+    document.addEventListener("DOMContentLoaded", () => initFillBlank());
+}
@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", function () {
+function initInputField(signal) {
     const userInput = document.getElementById("userInput");
     const checkBtn = document.querySelector(".check-btn-input");
     const resetBtn = document.querySelector(".reset-btn-input");
@@ -29,8 +29,21 @@ document.addEventListener("DOMContentLoaded", function () {
         const normalizedCorrectAnswer = normalizeSpanishText(
             correctAnswer.toLowerCase()
         );
+        const localResult = normalizedUserAnswer === normalizedCorrectAnswer;
+
+        // The server checks and records the answer, the local check is only its fallback
+        checkBtn.disabled = true;
+        const verdict = window.lessonPlayer
+            ? window.lessonPlayer.checkAnswer(userAnswer, localResult)
+            : Promise.resolve(localResult);
+        verdict.then((isCorrect) => {
+            checkBtn.disabled = false;
+            showResult(isCorrect);
+        });
+    });
 
-        if (normalizedUserAnswer === normalizedCorrectAnswer) {
+    function showResult(isCorrect) {
+        if (isCorrect) {
             userInput.classList.add("correct");
             checkBtn.style.background = "rgba(76, 175, 80, 0.2)";
             checkBtn.style.borderColor = "#4caf50";
@@ -64,7 +77,7 @@ document.addEventListener("DOMContentLoaded", function () {
                 checkBtn.textContent = "Check answer";
             }, 2000);
         }
-    });
+    }
 
     // Reset
     resetBtn.addEventListener("click", function () {
@@ -140,7 +153,7 @@ document.addEventListener("DOMContentLoaded", function () {
             }
             return;
         }
-    });
+    }, { signal });
 
     // Enter key specifically for input field
     userInput.addEventListener("keydown", function (event) {
@@ -154,4 +167,12 @@ document.addEventListener("DOMContentLoaded", function () {
 
     // Auto-focus on input when page loads
     userInput.focus();
-});
+}
+
+// Steps of a lesson are initialized by the lesson player, other pages on load
+if (window.lessonPlayer) {
+    window.lessonPlayer.register("input_field", initInputField);
+    window.lessonPlayer.register("translate_input_field", initInputField);
+} else {
+    document.addEventListener("DOMContentLoaded", () => initInputField());
+}
@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", function () {
+function initMatch(signal) {
     const matchItems = document.querySelectorAll(".match-item");
     const showAnswerBtn = document.querySelector(".show-answer-btn-match");
 
@@ -93,19 +93,13 @@ document.addEventListener("DOMContentLoaded", function () {
                 item.classList.contains("matched")
             );
 
-            // Show the next button when all matches are completed
+            // All pairs go to the server, which checks and records them
             if (allMatched) {
-                const nextBtn =
-                    document.getElementById("next-exercise-btn") ||
-                    document.getElementById("complete-lesson-btn");
-                if (nextBtn) {
-                    nextBtn.style.display = "inline-block";
-                    nextBtn.style.opacity = "0";
-                    nextBtn.style.transition = "opacity 0.5s ease-in-out";
-                    setTimeout(() => {
-                        nextBtn.style.opacity = "1";
-                    }, 500);
-                }
+                const answer = matches.map(({ item1, item2 }) => [position(item1), position(item2)]);
+                const verdict = window.lessonPlayer
+                    ? window.lessonPlayer.checkAnswer(answer, true)
+                    : Promise.resolve(true);
+                verdict.then((isCorrect) => (isCorrect ? showNextButton() : restart()));
             }
         } else {
             item1.classList.add("incorrect");
@@ -120,6 +114,32 @@ document.addEventListener("DOMContentLoaded", function () {
         selectedItems = [];
     }
 
+    // 0-based position of the item in the lesson content, its label is 1-based
+    function position(item) {
+        return parseInt(item.getAttribute("data-choice")) - 1;
+    }
+
+    // Show the next button when all matches are completed
+    function showNextButton() {
+        const nextBtn =
+            document.getElementById("next-exercise-btn") ||
+            document.getElementById("complete-lesson-btn");
+        if (nextBtn) {
+            nextBtn.style.display = "inline-block";
+            nextBtn.style.opacity = "0";
+            nextBtn.style.transition = "opacity 0.5s ease-in-out";
+            setTimeout(() => {
+                nextBtn.style.opacity = "1";
+            }, 500);
+        }
+    }
+
+    // Matches rejected by the server are done again
+    function restart() {
+        matches = [];
+        matchItems.forEach((item) => item.classList.remove("matched", "selected"));
+    }
+
     // Show answer
     showAnswerBtn.addEventListener("click", function () {
         // Clear selections
@@ -168,5 +188,12 @@ document.addEventListener("DOMContentLoaded", function () {
             }
             return;
         }
-    });
-});
+    }, { signal });
+}
+
+// Steps of a lesson are initialized by the lesson player, other pages on load
+if (window.lessonPlayer) {
+    window.lessonPlayer.register("match", initMatch);
+} else {
+    document.addEventListener("DOMContentLoaded", () => initMatch());
+}
@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", function () {
+function initMultipleChoice(signal) {
     const checkBtn = document.querySelector(".check-btn-multi");
     const resetBtn = document.querySelector(".reset-btn-multi");
     const showAnswerBtn = document.querySelector(".show-answer-btn-multi");
@@ -74,16 +74,31 @@ document.addEventListener("DOMContentLoaded", function () {
         const selectedArray = Array.from(selectedChoices);
         const correctArray = Array.from(correctAnswers);
 
-        const isCorrect =
+        const localResult =
             selectedArray.length === correctArray.length &&
             selectedArray.length > 0 &&
             selectedArray.every((index) => correctAnswers.has(index));
 
+        // The server checks and records the answer, the local check is only its fallback
+        checkBtn.disabled = true;
+        const verdict = window.lessonPlayer
+            ? window.lessonPlayer.checkAnswer(selectedArray, localResult)
+            : Promise.resolve(localResult);
+        verdict.then((isCorrect) => {
+            checkBtn.disabled = false;
+            showResult(isCorrect);
+        });
+    });
+
+    function showResult(isCorrect) {
+        // Reset while the answer was being checked
+        if (!isAnswered) return;
+
         // Mark each choice based on the result
         choiceItems.forEach((item, index) => {
             item.classList.remove("selected");
 
-            // Only show correct answers if user got them all right
+            // Only show correct answers if user got it right
             if (isCorrect && correctAnswers.has(index)) {
                 item.classList.add("correct");
             } else if (selectedChoices.has(index)) {
@@ -119,7 +134,7 @@ document.addEventListener("DOMContentLoaded", function () {
             checkBtn.style.color = "#f44336";
             checkBtn.textContent = "Try again";
         }
-    });
+    }
 
     // Show answer
     showAnswerBtn.addEventListener("click", function () {
@@ -240,5 +255,12 @@ document.addEventListener("DOMContentLoaded", function () {
             }
             return;
         }
-    });
-});
+    }, { signal });
+}
+
+// Steps of a lesson are initialized by the lesson player, other pages on load
+if (window.lessonPlayer) {
+    window.lessonPlayer.register("multiple_choice", initMultipleChoice);
+} else {
+    document.addEventListener("DOMContentLoaded", () => initMultipleChoice());
+}
@@ -1,4 +1,4 @@
-document.addEventListener("DOMContentLoaded", function () {
+function initSingleChoice(signal) {
     const checkBtn = document.querySelector(".check-btn-single");
     const resetBtn = document.querySelector(".reset-btn-single");
     const showAnswerBtn = document.querySelector(".show-answer-btn-single");
@@ -82,13 +82,28 @@ document.addEventListener("DOMContentLoaded", function () {
         });
 
         // Check if selected answer is correct
-        const isCorrect = correctAnswers.has(selectedChoice);
+        const localResult = correctAnswers.has(selectedChoice);
+
+        // The server checks and records the answer, the local check is only its fallback
+        checkBtn.disabled = true;
+        const verdict = window.lessonPlayer
+            ? window.lessonPlayer.checkAnswer(selectedChoice, localResult)
+            : Promise.resolve(localResult);
+        verdict.then((isCorrect) => {
+            checkBtn.disabled = false;
+            showResult(isCorrect);
+        });
+    });
+
+    function showResult(isCorrect) {
+        // Reset while the answer was being checked
+        if (!isAnswered) return;
 
         // Mark each choice based on the result
         choiceItems.forEach((item, index) => {
             item.classList.remove("selected");
 
-            // Only show correct answer if user got it right
+            // Only show correct answers if user got it right
             if (isCorrect && correctAnswers.has(index)) {
                 item.classList.add("correct");
             } else if (index === selectedChoice) {
@@ -110,7 +125,6 @@ document.addEventListener("DOMContentLoaded", function () {
             const nextBtn =
                 document.getElementById("next-exercise-btn") ||
                 document.getElementById("complete-lesson-btn");
-
             if (nextBtn) {
                 nextBtn.style.display = "inline-block";
                 nextBtn.style.opacity = "0";
@@ -125,7 +139,7 @@ document.addEventListener("DOMContentLoaded", function () {
             checkBtn.style.color = "#f44336";
             checkBtn.textContent = "Try again";
         }
-    });
+    }
 
     // Show answer
     showAnswerBtn.addEventListener("click", function () {
@@ -238,5 +252,12 @@ document.addEventListener("DOMContentLoaded", function () {
             }
             return;
         }
-    });
-});
+    }, { signal });
+}
+
+// Steps of a lesson are initialized by the lesson player, other pages on load
+if (window.lessonPlayer) {
+    window.lessonPlayer.register("single_choice", initSingleChoice);
+} else {
+    document.addEventListener("DOMContentLoaded", () => initSingleChoice());
+}
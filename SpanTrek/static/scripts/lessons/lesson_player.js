@@ -0,0 +1,230 @@
+// Lesson steps shown without page loads from the lesson player API
+// The first step comes with the page, the whole lesson is then fetched once with every
+// step rendered by its block template, and Back/Next swap steps in instead of loading pages
+(function () {
+    const configData = document.getElementById("lesson-player");
+    if (!configData) {
+        return;
+    }
+
+    const config = JSON.parse(configData.textContent);
+    const EXERCISE_BLOCKS = [
+        "fill_blank",
+        "input_field",
+        "translate_input_field",
+        "match",
+        "single_choice",
+        "multiple_choice",
+    ];
+
+    // Init functions of block scripts, registered when the scripts run
+    const blocks = {};
+    let lesson = null;
+    let currentNumber = config.exercise_number;
+    let currentStep = null;
+    // Increased by every step shown, a step still loading its scripts is dropped when it changed
+    let shownSteps = 0;
+    // Absolute URLs of the scripts run on this page, every script runs once
+    const loadedScripts = new Set();
+
+    // Block scripts register here instead of initializing on DOMContentLoaded
+    window.lessonPlayer = {
+        register(blockType, init) {
+            blocks[blockType] = init;
+        },
+
+        // Answer of the current exercise checked and recorded by the server, resolves to its verdict.
+        // The local check of the block script is used only when the server can't be reached
+        checkAnswer(answer, localResult) {
+            const number = currentNumber;
+            return fetch(config.answers_url, {
+                method: "POST",
+                headers: {
+                    "Content-Type": "application/json",
+                    "X-CSRFToken": config.csrf_token,
+                },
+                body: JSON.stringify({ answers: { [number]: answer } }),
+            })
+                .then((response) => (response.ok ? response.json() : Promise.reject(response.status)))
+                .then((data) => data.results[number])
+                .catch((error) => {
+                    console.warn("Answer not checked by the server:", error);
+                    return localResult;
+                });
+        },
+    };
+
+    function loadScript(original) {
+        return new Promise((resolve, reject) => {
+            const script = document.createElement("script");
+            for (const { name, value } of original.attributes) {
+                script.setAttribute(name, value);
+            }
+            script.onload = resolve;
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+
+    // Scripts of inserted html don't run, they are run here like on a page load:
+    // block scripts once per page, inline scripts every time the step is shown
+    async function runScripts(scripts) {
+        for (const original of scripts) {
+            if (original.src) {
+                if (!loadedScripts.has(original.src)) {
+                    loadedScripts.add(original.src);
+                    await loadScript(original);
+                }
+                continue;
+            }
+            const script = document.createElement("script");
+            script.textContent = original.textContent;
+            document.head.appendChild(script).remove();
+        }
+    }
+
+    // Step html of the API as nodes to insert and the scripts taken out of it.
+    // Stylesheets move to the head, so they stay loaded for the following steps
+    function parseStep(html) {
+        const template = document.createElement("template");
+        template.innerHTML = html;
+        template.content.querySelectorAll('link[rel="stylesheet"]').forEach((link) => {
+            if (document.head.querySelector(`link[href="${link.getAttribute("href")}"]`)) {
+                link.remove();
+            } else {
+                document.head.appendChild(link);
+            }
+        });
+        const scripts = Array.from(template.content.querySelectorAll("script"));
+        scripts.forEach((script) => script.remove());
+        return { nodes: template.content, scripts };
+    }
+
+    function exerciseUrl(number) {
+        return `${config.lesson_url}${number}/`;
+    }
+
+    // Same links as the exercise navigation of lesson_base.html
+    function renderNavigation(number, blockType) {
+        const navigation = document.querySelector(".exercise-navigation");
+        if (!navigation) {
+            return;
+        }
+        const hidden = EXERCISE_BLOCKS.includes(blockType) ? ' style="display: none;"' : "";
+        let links = "";
+        if (number > 1) {
+            links += `<a href="${exerciseUrl(number - 1)}" class="nav-button prev-exercise"><span class="arrow">←</span> Back</a>`;
+        }
+        if (number < lesson.total_exercises) {
+            links += `<a href="${exerciseUrl(number + 1)}" class="nav-button next-exercise" id="next-exercise-btn"${hidden}>Next<span class="arrow">→</span></a>`;
+        } else if (config.has_complete) {
+            links += `<a href="${lesson.complete_url}" class="nav-button next-lesson" id="complete-lesson-btn"${hidden}>Complete lesson <span class="arrow">→</span></a>`;
+        }
+        navigation.innerHTML = links;
+    }
+
+    // Progress bar of the lesson header shows finished steps
+    function updateProgress(number) {
+        const header = document.querySelector(".lesson-header");
+        const info = header && header.querySelector(".progress-bar-info");
+        const fill = header && header.querySelector(".progress-fill");
+        const text = header && header.querySelector(".progress-bar-text");
+        const percent = Math.round(((number - 1) / lesson.total_exercises) * 100) || 0;
+        if (info) {
+            info.textContent = `${number - 1} / ${lesson.total_exercises}`;
+        }
+        if (fill) {
+            fill.style.width = percent + "%";
+        }
+        if (text) {
+            text.textContent = percent + "%";
+        }
+    }
+
+    // Listeners of the previous step are removed with its abort signal
+    function initBlock(blockType) {
+        if (currentStep) {
+            currentStep.abort();
+        }
+        currentStep = new AbortController();
+        const init = blocks[blockType];
+        if (init) {
+            init(currentStep.signal);
+        }
+    }
+
+    async function showStep(number, pushHistory) {
+        const step = lesson.steps[number - 1];
+        if (!step) {
+            return;
+        }
+        if (step.html === null) {
+            // Unknown block, the exercise page shows the error
+            window.location.href = exerciseUrl(number);
+            return;
+        }
+
+        // Listeners of the previous step are gone before its elements are replaced
+        if (currentStep) {
+            currentStep.abort();
+            currentStep = null;
+        }
+        const shown = ++shownSteps;
+        const { nodes, scripts } = parseStep(step.html);
+        const container = document.createElement("div");
+        container.className = "single-content";
+        container.appendChild(nodes);
+        document.querySelector(".lesson-content").replaceChildren(container);
+
+        currentNumber = number;
+        renderNavigation(number, step.type);
+        updateProgress(number);
+        if (pushHistory) {
+            history.pushState({ exercise: number }, "", exerciseUrl(number));
+        }
+        window.scrollTo(0, 0);
+
+        await runScripts(scripts);
+        if (shown === shownSteps) {
+            initBlock(step.type);
+        }
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        document.querySelectorAll("script[src]").forEach((script) => loadedScripts.add(script.src));
+
+        // Step rendered by the server, its block scripts registered while the page loaded
+        const firstStep = document.querySelector(".single-content");
+        initBlock(firstStep ? config.current_block : null);
+        history.replaceState({ exercise: currentNumber }, "", window.location.href);
+
+        fetch(config.api_url, { headers: { Accept: "application/json" } })
+            .then((response) => (response.ok ? response.json() : null))
+            .then((data) => {
+                lesson = data;
+            })
+            .catch((error) => {
+                // Steps keep loading as pages
+                console.warn("Lesson player unavailable:", error);
+            });
+
+        // Back/Next swap steps in once the lesson is loaded
+        document.addEventListener("click", function (event) {
+            const link = event.target.closest(".prev-exercise, .next-exercise");
+            if (!link || !lesson) {
+                return;
+            }
+            event.preventDefault();
+            const number = link.classList.contains("next-exercise") ? currentNumber + 1 : currentNumber - 1;
+            showStep(number, true);
+        });
+
+        window.addEventListener("popstate", function (event) {
+            if (lesson && event.state && event.state.exercise) {
+                showStep(event.state.exercise, false);
+            } else {
+                window.location.reload();
+            }
+        });
+    });
+})();
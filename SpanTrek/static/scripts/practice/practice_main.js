@@ -6,6 +6,9 @@ document.addEventListener("DOMContentLoaded", function () {
     // Get correct answer
     const correctAnswer = userInput.getAttribute("data-answer") || "";
 
+    // Wrong attempts before the correct answer, sent with the next page to schedule the next review
+    let mistakes = 0;
+
     // Check answer
     checkBtn.addEventListener("click", function () {
         const userAnswer = userInput.value.trim();
@@ -27,12 +30,17 @@ document.addEventListener("DOMContentLoaded", function () {
             // Show the next button only when exercise is completed successfully
             const nextBtn = document.querySelector(".next-btn");
             if (nextBtn) {
+                const nextUrl = new URL(nextBtn.href, window.location.href);
+                nextUrl.searchParams.set("mistakes", mistakes);
+                nextBtn.href = nextUrl.toString();
+
                 // Auto-advance to next exercise after 2 seconds
                 setTimeout(() => {
                     nextBtn.click();
                 }, 500);
             }
         } else {
+            mistakes += 1;
             userInput.classList.add("incorrect");
             checkBtn.style.background = "rgba(244, 67, 54, 0.2)";
             checkBtn.style.borderColor = "#f44336";